@@ -1,12 +1,18 @@
-from flask import Flask, jsonify, request, redirect
-from flask_openapi3 import OpenAPI, Info, Tag
+from flask import Flask, Response, jsonify, make_response, request, redirect
+from flask_openapi3 import APIBlueprint, OpenAPI, Info, Tag
 from flask_cors import CORS
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
-from typing import List
-import requests
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from functools import wraps
+from typing import List, Optional, Tuple
+from datetime import date, datetime
+import os
+import click
 
 # ======================= Imports Internos =======================
-from model import Session
+from model import Session, configurar_banco, init_db
 from model.projeto import Projeto
 from model.historico import Historico
 from model.recurso import Recurso
@@ -14,12 +20,29 @@ from model.projeto_recurso import projeto_recurso
 
 from schema.projeto_schema import (
     ProjetoSchema, ProjetoIdSchema, ProjetoEditSchema,
-    ProjetoMsgSchema, ProjetoBuscaIdSchema, ListagemProjetoSchema
+    ProjetoMsgSchema, ProjetoBuscaIdSchema,
+    ProjetoMoedaSchema, ProjetoBuscaIdMoedaSchema, ProjetosOuAlteradosSchema
 )
 from schema.historico_schema import HistoricoSchema, HistoricoViewSchema, HistoricoIdSchema
-from schema.recurso_schema import RecursoSchema, RecursoEditSchema, RecursoViewSchema, ListagemRecursoSchema, RecursoBuscaIdSchema, RecursoMsgSchema
+from schema.recurso_schema import (
+    RecursoSchema, RecursoEditSchema, RecursoViewSchema, RecursoBuscaIdSchema, RecursoMsgSchema,
+    RecursoSincronizacaoSchema, RecursosOuAlteradosSchema
+)
+from schema.conversao_schema import ConversaoLoteSchema, ConversaoLoteViewSchema
+from schema.sincronizacao_schema import EventosSchema
 from schema.error_schema import ErrorSchema
-from logger import logger
+from service.cambio import cache_cambio, CambioIndisponivel, MoedaInvalida, MOEDA_CUSTO
+from service.cliente_cambio import cliente_cambio
+from service.serie_cambio import serie_cambio, DataInvalida
+from service.sincronizacao import alteracoes_desde, limpar_alteracoes, CursorExpirado
+from service.eventos import difusor, LimiteConexoes, EVENTOS_RETRY_MS
+from service.idempotencia import (
+    idempotencia, impressao_da_requisicao, limpar_chaves, ChaveEmAndamento, ChaveInvalida, ChaveReutilizada,
+    IDEMPOTENCIA_RETENCAO_HORAS
+)
+from middleware import request_id, instrumentacao, metricas, admissao, profiler, consultas_lentas, captura
+from middleware.instrumentacao import medir
+from logger import logger, configurar_logs
 
 
 # ======================= Configuração da API =======================
@@ -29,34 +52,72 @@ info = Info(
     description="API para gerenciar o portfólio de projetos, incluindo a criação, edição, histórico e alocação de recursos."
 )
 
-app = OpenAPI(__name__, info=info)
-CORS(app)
+
+
+class OpenAPICacheada(OpenAPI):
+    """
+    OpenAPI que monta o documento da especificação uma única vez.
+
+    O flask_openapi3 refaz o documento a partir dos schemas pydantic a cada
+    GET /openapi/openapi.json (5 a 9 ms); aqui ele é montado no primeiro
+    acesso e refeito apenas se outro APIBlueprint for registrado.
+    """
+
+    _documento: Optional[dict] = None
+
+    @property
+    def api_doc(self) -> dict:
+        if self._documento is None:
+            self._documento = super().api_doc
+        return self._documento
+
+    def register_api(self, api: APIBlueprint) -> None:
+        super().register_api(api)
+        self._documento = None
+
+
+# Rotas da aplicação, registradas em cada app criada por create_app()
+api = APIBlueprint("api", __name__, cli_group=None)
 
 '''
 Rotas criadas:
     
     PROJETO:
-    POST   /projeto              → Adicionar novo projeto
-    GET    /projetos             → Listar todos os projetos
-    GET    /projeto?id=1         → Buscar projeto por ID
-    PUT    /projeto              → Editar projeto existente
+    POST   /projeto              → Adicionar novo projeto (aceita Idempotency-Key)
+    GET    /projetos             → Listar todos os projetos (?moeda=USD converte os custos; ?since=cursor só os alterados)
+    GET    /projeto?id=1         → Buscar projeto por ID (?moeda=USD converte o custo)
+    PUT    /projeto              → Editar projeto existente (If-Match ou campo 'versao': só se não mudou)
     DELETE /projeto?id=1         → Deletar projeto
 
     HISTÓRICO:
-    POST   /historico?id=1       → Adicionar histórico a um projeto
+    POST   /historico?id=1       → Adicionar histórico a um projeto (aceita Idempotency-Key)
     GET    /historico?id=1       → Listar históricos de um projeto
 
     RECURSO:
     POST   /recurso              → Cadastrar recurso (com ou sem vínculo a projeto)
-    GET    /recurso              → Listar todos os recursos
-    PUT    /recurso              → Atualizar dados de um recurso
+    GET    /recursos             → Listar todos os recursos (?since=cursor só os alterados)
+    PUT    /recurso              → Atualizar dados de um recurso (If-Match ou campo 'versao': só se não mudou)
     DELETE /recurso?id=1         → Excluir recurso (caso não esteja vinculado a projetos)
 
     PROJETO_RECURSO:
-    POST   /projeto/recurso?id_projeto=1&id_recurso=2   → Vincular recurso a projeto
+    POST   /projeto/recurso?id_projeto=1&id_recurso=2   → Vincular recurso a projeto (aceita Idempotency-Key)
     DELETE /projeto/recurso?id_projeto=1&id_recurso=2   → Remover vínculo recurso ↔ projeto
     GET    /projeto/recursos?id=1                       → Listar recursos vinculados a um projeto
 
+    EVENTOS:
+    GET    /eventos              → Alterações em tempo real (Server-Sent Events; retoma com Last-Event-ID)
+
+    CONVERSÃO:
+    GET    /conversao?valor=1000&de=BRL&para=USD        → Converter um valor (&data=AAAA-MM-DD usa a cotação da data)
+    POST   /conversao/lote                              → Converter vários valores com uma única cotação
+    GET    /conversao/status                            → Métricas da API de câmbio e do cache
+
+    OPERAÇÃO:
+    GET    /healthz              → Prontidão do worker (verifica o banco de dados)
+    GET    /metrics              → Métricas no formato Prometheus (latência por rota, pool, cache de câmbio)
+    GET    /admin/profiles       → Perfis de execução recentes (exige X-Admin-Token)
+    GET    /admin/consultas-lentas → Consultas SQL lentas com plano de execução (exige X-Admin-Token)
+
 '''
 
 # ======================= Tags da Documentação =======================
@@ -64,98 +125,366 @@ projeto_tag = Tag(name="Projeto", description="Gerenciamento de Projetos")
 historico_tag = Tag(name="Histórico", description="Gerenciamento de Histórico")
 recurso_tag = Tag(name="Recurso", description="Gerenciamento de Recursos")
 projeto_recurso_tag = Tag(name="Projeto_Recurso", description="Vínculos entre Projetos e Recursos")
+conversao_tag = Tag(name="Conversão", description="Conversão de moedas via API externa")
+eventos_tag = Tag(name="Eventos", description="Alterações em tempo real (Server-Sent Events)")
+
+# ======================= Controle de Concorrência (versões) =======================
+# Projeto e recurso têm uma coluna 'versao' (version_id_col do SQLAlchemy): o
+# UPDATE só altera a linha se a versão ainda for a lida. O cliente informa a
+# versão em que baseou a edição pelo If-Match (ETag de GET /projeto e GET
+# /recurso) ou pelo campo 'versao' do corpo; sem nenhum dos dois, a edição
+# continua valendo sobre a versão atual (último a gravar vence).
+def cabecalho_etag(versao: int) -> dict:
+    """Cabeçalho ETag de uma versão do registro (também usado por asgi.py)."""
+    return {"ETag": f'"{versao}"'}
+
+
+def conflito_de_versao(atual: int, versao_corpo: Optional[int]) -> Optional[Tuple[dict, int]]:
+    """
+    Compara a versão atual com a esperada pelo cliente: 412 se o If-Match não
+    casar, 409 se o campo 'versao' for outro. None quando a edição pode seguir.
+    """
+    if request.if_match:
+        if not request.if_match.contains(str(atual)):
+            return {"mensagem": f"O registro foi alterado (versão atual: {atual}); releia e tente novamente.",
+                    "versao": atual}, 412
+    elif versao_corpo is not None and versao_corpo != atual:
+        return {"mensagem": f"O registro foi alterado (versão atual: {atual}); releia e tente novamente.",
+                "versao": atual}, 409
+    return None
+
+
+def conflito_concorrente() -> Tuple[dict, int]:
+    """Outra requisição gravou o registro entre a leitura e o UPDATE (StaleDataError)."""
+    return ({"mensagem": "O registro foi alterado por outra requisição durante a edição; releia e tente novamente."},
+            412 if request.if_match else 409)
+
+
+# ======================= Idempotência (Idempotency-Key) =======================
+def idempotente(rota):
+    """
+    Decorador das rotas POST que aceitam o cabeçalho Idempotency-Key.
+
+    Com o cabeçalho, a primeira requisição executa a rota e guarda a resposta
+    (service/idempotencia.py); as repetições com a mesma chave recebem a
+    resposta guardada, com 'Idempotent-Replayed: true', sem executar a rota;
+    as que chegam com a primeira em andamento aguardam a resposta dela (ou
+    recebem 409 com Retry-After ao fim da espera). Sem o cabeçalho, nada muda.
+    """
+    @wraps(rota)
+    def executar(*args, **kwargs):
+        chave = request.headers.get("Idempotency-Key")
+        if chave is None:
+            return rota(*args, **kwargs)
+
+        impressao = impressao_da_requisicao(request.method, request.path, request.query_string, request.get_data())
+        try:
+            guardada = idempotencia.reservar(request.path, chave, impressao)
+        except ChaveInvalida as e:
+            return {"mensagem": str(e)}, 400
+        except ChaveReutilizada as e:
+            return {"mensagem": str(e)}, 422
+        except ChaveEmAndamento as e:
+            return {"mensagem": str(e)}, 409, {"Retry-After": "1"}
+        if guardada is not None:
+            corpo, status = guardada
+            return Response(corpo, status, mimetype="application/json", headers={"Idempotent-Replayed": "true"})
+
+        try:
+            resposta = make_response(rota(*args, **kwargs))
+        except Exception:
+            idempotencia.liberar(request.path, chave)
+            raise
+        if resposta.status_code >= 500:
+            idempotencia.liberar(request.path, chave)
+        else:
+            idempotencia.concluir(request.path, chave, resposta.get_data(as_text=True), resposta.status_code)
+        return resposta
+
+    return executar
+
 
 # ======================= Rota Inicial =======================
-@app.route("/")
+@api.route("/")
 def home():
     return redirect("/openapi")
 
+
+@api.route("/healthz")
+def healthz():
+    """Prontidão para o balanceador: o worker responde e o banco aceita consultas."""
+    session = Session()
+    try:
+        session.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error("Healthcheck falhou: %s", e)
+        return jsonify({"status": "indisponivel", "banco": str(e), "pid": os.getpid()}), 503
+    finally:
+        session.close()
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
 # ======================= API Externa: Conversão de Moeda =======================
-@app.route("/conversao", methods=["GET"])
+@api.route("/conversao", methods=["GET"])
 def converter_moeda():
-    valor = request.args.get("valor")
-    de = request.args.get("de", "BRL")
-    para = request.args.get("para", "USD")
+    corpo, status = resposta_conversao(
+        request.args.get("valor"), request.args.get("de", "BRL"), request.args.get("para", "USD"),
+        request.args.get("data"),
+    )
+    return jsonify(corpo), status
+
 
+def resposta_conversao(valor, de: str, para: str, data=None, obter_tabela=None) -> Tuple[dict, int]:
+    """
+    Corpo e status de GET /conversao (também usado por asgi.py).
+
+    `obter_tabela(base)` substitui `cache_cambio.obter`: o servidor ASGI
+    obtém a tabela sem bloquear e a entrega pronta por essa função.
+    """
     if not valor:
-        return jsonify({"erro": "Parâmetro 'valor' é obrigatório."}), 400
+        return {"erro": "Parâmetro 'valor' é obrigatório."}, 400
 
     try:
         float(valor)
     except ValueError:
-        return jsonify({"erro": "O valor informado não é numérico."}), 400
-
-    url = f"https://api.frankfurter.app/latest?amount={valor}&from={de}&to={para}"
-    resposta = requests.get(url)
+        return {"erro": "O valor informado não é numérico."}, 400
 
-    if resposta.status_code == 200:
-        dados = resposta.json()
-        convertido = dados.get("rates", {}).get(para)
+    de, para = de.upper(), para.upper()
 
-        return jsonify({
-            "valor_original": float(valor),
-            "de": de,
-            "para": para,
-            "valor_convertido": convertido
-        })
+    try:
+        if data:
+            # Cotação de uma data específica, respondida pela série histórica local
+            try:
+                dia = date.fromisoformat(data)
+            except ValueError:
+                return {"erro": "A data deve estar no formato AAAA-MM-DD."}, 400
+            [(convertido, taxa, data_cotacao)], atualizada = serie_cambio.converter_lote([(float(valor), de, para, dia)])
+        else:
+            tabela, atualizada = (obter_tabela or cache_cambio.obter)(de)
+            convertido, taxa, data_cotacao = tabela.converter(float(valor), para), tabela.taxa(para), tabela.data_cotacao
+    except (MoedaInvalida, DataInvalida) as e:
+        return {"erro": str(e)}, 400
+    except CambioIndisponivel:
+        return {"erro": "Erro ao buscar taxa de câmbio."}, 500
+
+    return {
+        "valor_original": float(valor),
+        "de": de,
+        "para": para,
+        "valor_convertido": convertido,
+        "taxa": taxa,
+        "data_cotacao": data_cotacao.isoformat(),
+        "cotacao_atualizada": atualizada
+    }, 200
+
+
+@api.post("/conversao/lote", tags=[conversao_tag], responses={"200": ConversaoLoteViewSchema, "400": ErrorSchema, "500": ErrorSchema})
+def converter_moeda_lote(body: ConversaoLoteSchema):
+    """Converte vários valores, inclusive entre moedas cruzadas, com uma única tabela de câmbio."""
+    de = body.de.upper()
+    para = [moeda.upper() for moeda in body.para]
+
+    conversoes = [(valor, de, moeda) for valor in body.valores for moeda in para]
+    conversoes += [
+        (item.valor, (item.de or de).upper(), (item.para or para[0]).upper())
+        for item in body.itens
+    ]
 
-    return jsonify({"erro": "Erro ao buscar taxa de câmbio."}), 500
+    try:
+        tabela, atualizada = cache_cambio.obter(de)
+        resultados = tabela.converter_lote(conversoes)
+    except MoedaInvalida as e:
+        return {"mensagem": str(e)}, 400
+    except CambioIndisponivel:
+        return {"mensagem": "Erro ao buscar taxa de câmbio."}, 500
+
+    return jsonify({
+        "base": de,
+        "data_cotacao": tabela.data_cotacao.isoformat(),
+        "cotacao_atualizada": atualizada,
+        "resultados": [
+            {"valor_original": valor, "de": origem, "para": destino,
+             "valor_convertido": convertido, "taxa": taxa}
+            for (valor, origem, destino), (convertido, taxa) in zip(conversoes, resultados)
+        ]
+    }), 200
+
+
+@api.route("/conversao/status", methods=["GET"])
+def status_conversao():
+    """Métricas da API de câmbio (latência, erros, disjuntor) e do cache de taxas."""
+    return jsonify({
+        "api": cliente_cambio.estatisticas(),
+        "cache": cache_cambio.estatisticas()
+    })
 
 
 # ======================= ROTAS: Projetos =======================
-@app.post("/projeto", tags=[projeto_tag], responses={"200": ProjetoMsgSchema, "400": ErrorSchema, "409": ErrorSchema})
+@api.post("/projeto", tags=[projeto_tag], responses={"200": ProjetoMsgSchema, "400": ErrorSchema, "409": ErrorSchema})
+@idempotente
 def criar_projeto(body: ProjetoSchema):
-    """Adiciona um novo projeto na base de dados."""
+    """Adiciona um novo projeto na base de dados (repetições com o mesmo Idempotency-Key recebem a mesma resposta)."""
     session = Session()
     try:
         projeto = Projeto(**body.dict())
         session.add(projeto)
         session.commit()
-        logger.info(f"Projeto '{projeto.id}' criado com sucesso!")
+        logger.info("Projeto '%s' criado com sucesso!", projeto.id)
         return {"mensagem": "Projeto criado com sucesso!", "id": projeto.id}, 200
     except IntegrityError:
         session.rollback()
-        logger.warning(f"Erro ao criar o projeto '{body.nome}': Nome ou sigla já existentes.")
+        logger.warning("Erro ao criar o projeto '%s': Nome ou sigla já existentes.", body.nome)
         return {"mensagem": "Projeto com mesmo nome ou sigla já existe."}, 409
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro inesperado ao criar projeto: {e}")
+        logger.error("Erro inesperado ao criar projeto: %s", e)
         return {"mensagem": f"Erro ao criar projeto: {str(e)}"}, 400
 
 
-@app.get("/projetos", tags=[projeto_tag], responses={"200": ListagemProjetoSchema, "404": ErrorSchema})
-def listar_projetos():
-    """Lista todos os projetos cadastrados."""
+def converter_custos(projetos: List[dict], moeda: str, cotacao_em: str = "atual", obter_tabela=None) -> dict:
+    """
+    Converte o 'custo' dos projetos serializados para `moeda`.
+
+    Com `cotacao_em="atual"` usa uma única cotação (a mais recente) para todos;
+    com `cotacao_em="registro"` usa a série histórica local, na cotação da data
+    de registro de cada projeto. Mantém o valor original em 'custo_original' e
+    retorna os dados da cotação usada. Propaga MoedaInvalida, DataInvalida e
+    CambioIndisponivel para a rota tratar. `obter_tabela` substitui
+    `cache_cambio.obter` (ver `resposta_conversao`).
+    """
+    moeda = moeda.upper()
+
+    if cotacao_em == "registro":
+        convertidos, atualizada = serie_cambio.converter_lote([
+            (p["custo"], MOEDA_CUSTO, moeda, _dia(p["data_registro"])) for p in projetos
+        ])
+        for projeto, (custo, taxa, data_cotacao) in zip(projetos, convertidos):
+            projeto["custo_original"] = projeto["custo"]
+            projeto["custo"] = custo
+            projeto["taxa_cambio"] = taxa
+            projeto["data_cotacao"] = data_cotacao.isoformat()
+
+        return {"de": MOEDA_CUSTO, "para": moeda, "cotacao_em": cotacao_em, "cotacao_atualizada": atualizada}
+
+    tabela, atualizada = (obter_tabela or cache_cambio.obter)(MOEDA_CUSTO)
+    convertidos = tabela.converter_lote([(p["custo"], MOEDA_CUSTO, moeda) for p in projetos])
+
+    for projeto, (custo, _) in zip(projetos, convertidos):
+        projeto["custo_original"] = projeto["custo"]
+        projeto["custo"] = custo
+
+    return {
+        "de": MOEDA_CUSTO,
+        "para": moeda,
+        "cotacao_em": cotacao_em,
+        "taxa": tabela.taxa_cruzada(MOEDA_CUSTO, moeda),
+        "data_cotacao": tabela.data_cotacao.isoformat(),
+        "cotacao_atualizada": atualizada
+    }
+
+
+def _dia(valor) -> date:
+    """Normaliza datetime/date para date (o schema pode manter o datetime do ORM)."""
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+@api.get("/projetos", tags=[projeto_tag], responses={"200": ProjetosOuAlteradosSchema, "400": ErrorSchema, "404": ErrorSchema, "410": ErrorSchema})
+def listar_projetos(query: ProjetoMoedaSchema):
+    """
+    Lista todos os projetos cadastrados, com os custos opcionalmente convertidos para 'moeda'.
+
+    Com 'since' devolve só os projetos criados ou alterados e os IDs removidos
+    desde o cursor (ou data/hora) informado, no formato ProjetosAlteradosSchema.
+    """
+    corpo, status = resposta_listar_projetos(query)
+    return jsonify(corpo), status
+
+
+def resposta_listar_projetos(query: ProjetoMoedaSchema, obter_tabela=None) -> Tuple[object, int]:
+    """Corpo e status de GET /projetos (também usado por asgi.py)."""
     session = Session()
-    projetos = session.query(Projeto).all()
+    try:
+        # Os históricos de todos os projetos vêm em uma única consulta adicional (evita N+1)
+        if query.since is not None:
+            try:
+                projetos, removidos, cursor = alteracoes_desde(
+                    session, Projeto, "projeto", query.since, selectinload(Projeto.historico))
+            except CursorExpirado as e:
+                return {"mensagem": str(e)}, 410
+            logger.info("%s projeto(s) alterado(s) e %s removido(s) desde %s.", len(projetos), len(removidos), query.since)
+        else:
+            projetos = session.query(Projeto).options(selectinload(Projeto.historico)).all()
+
+            if not projetos:
+                logger.info("Nenhum projeto encontrado na base de dados.")
+                return {"mensagem": "Nenhum projeto encontrado."}, 200
+
+            logger.info("%s projeto(s) encontrados.", len(projetos))
+        with medir("pydantic"):
+            projetos_dict = [ProjetoIdSchema.from_orm(p).dict() for p in projetos]
+    finally:
+        session.close()
+
+    if query.since is not None:
+        corpo = {"projetos": projetos_dict, "removidos": removidos, "cursor": cursor}
+    elif not query.moeda:
+        return projetos_dict, 200
+    else:
+        corpo = {"projetos": projetos_dict}
+
+    if query.moeda:
+        try:
+            cotacao = converter_custos(projetos_dict, query.moeda, query.cotacao_em, obter_tabela)
+        except (MoedaInvalida, DataInvalida) as e:
+            return {"mensagem": str(e)}, 400
+        except CambioIndisponivel:
+            return {"mensagem": "Erro ao buscar taxa de câmbio."}, 500
+        corpo.update(moeda=cotacao["para"], cotacao=cotacao)
+
+    return corpo, 200
 
-    if not projetos:
-        logger.info("Nenhum projeto encontrado na base de dados.")
-        return jsonify({"mensagem": "Nenhum projeto encontrado."}), 200
 
-    logger.info(f"{len(projetos)} projeto(s) encontrados.")
-    return jsonify([ProjetoIdSchema.from_orm(p).dict() for p in projetos]), 200
+@api.get("/projeto", tags=[projeto_tag], responses={"200": ProjetoIdSchema, "400": ErrorSchema, "500": ErrorSchema})
+def buscar_projeto(query: ProjetoBuscaIdMoedaSchema):
+    """
+    Buscar um projeto pelo ID fornecido, com o custo opcionalmente convertido para 'moeda'.
 
+    Sem 'moeda', o ETag da resposta é a versão do projeto, para o If-Match do PUT /projeto.
+    """
+    corpo, status = resposta_buscar_projeto(query)
+    cabecalhos = cabecalho_etag(corpo["versao"]) if status == 200 and not query.moeda else {}
+    return jsonify(corpo), status, cabecalhos
 
-@app.get("/projeto", tags=[projeto_tag], responses={"200": ProjetoIdSchema, "500": ErrorSchema})
-def buscar_projeto(query: ProjetoBuscaIdSchema):
-    """Buscar um projeto pelo ID fornecido."""
+
+def resposta_buscar_projeto(query: ProjetoBuscaIdMoedaSchema, obter_tabela=None) -> Tuple[dict, int]:
+    """Corpo e status de GET /projeto (também usado por asgi.py)."""
     session = Session()
     try:
         projeto = session.query(Projeto).filter(Projeto.id == query.id).first()
 
         if not projeto:
-            return jsonify({"mensagem": "Projeto não encontrado"}), 404
+            return {"mensagem": "Projeto não encontrado"}, 404
+
+        with medir("pydantic"):
+            projeto_dict = ProjetoIdSchema.from_orm(projeto).dict()
+        if query.moeda:
+            projeto_dict["cotacao"] = converter_custos([projeto_dict], query.moeda, query.cotacao_em, obter_tabela)
+        return projeto_dict, 200
 
-        projeto_dict = ProjetoIdSchema.from_orm(projeto).dict()
-        return jsonify(projeto_dict), 200
+    except (MoedaInvalida, DataInvalida) as e:
+        return {"mensagem": str(e)}, 400
+
+    except CambioIndisponivel:
+        return {"mensagem": "Erro ao buscar taxa de câmbio."}, 500
 
     except Exception as e:
-        logger.error(f"Erro ao buscar projeto: {e}")
+        logger.error("Erro ao buscar projeto: %s", e)
         return {"mensagem": f"Erro ao buscar projeto: {str(e)}"}, 500
 
+    finally:
+        session.close()
+
 
-@app.delete("/projeto", tags=[projeto_tag], responses={"200": ProjetoMsgSchema, "404": ErrorSchema, "500": ErrorSchema})
+@api.delete("/projeto", tags=[projeto_tag], responses={"200": ProjetoMsgSchema, "404": ErrorSchema, "500": ErrorSchema})
 def deletar_projeto(query: ProjetoBuscaIdSchema):
     """Remove um projeto da base de dados pelo ID."""
     session = Session()
@@ -166,26 +495,40 @@ def deletar_projeto(query: ProjetoBuscaIdSchema):
 
         session.delete(projeto)
         session.commit()
-        logger.info(f"Projeto com ID {query.id} deletado.")
+        logger.info("Projeto com ID %s deletado.", query.id)
         return {"mensagem": "Projeto removido", "id": query.id}, 200
 
+    except StaleDataError:
+        session.rollback()
+        return conflito_concorrente()
+
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao deletar projeto: {e}")
+        logger.error("Erro ao deletar projeto: %s", e)
         return {"mensagem": f"Erro ao deletar projeto: {str(e)}"}, 500
 
 
-@app.put("/projeto", tags=[projeto_tag], responses={"200": ProjetoSchema, "404": ErrorSchema, "400": ErrorSchema})
+@api.put("/projeto", tags=[projeto_tag],
+         responses={"200": ProjetoSchema, "404": ErrorSchema, "400": ErrorSchema, "409": ErrorSchema, "412": ErrorSchema})
 def editar_projeto(body: ProjetoEditSchema):
-    """Edita um projeto existente com base no ID e nos novos dados enviados."""
+    """
+    Edita um projeto existente com base no ID e nos novos dados enviados.
+
+    Com If-Match (ETag de GET /projeto) ou o campo 'versao', a edição só é
+    gravada se o projeto não mudou desde a leitura: 412 ou 409, respectivamente.
+    """
     session = Session()
     try:
         projeto = session.query(Projeto).filter_by(id=body.id).first()
         if not projeto:
             return {"mensagem": f"Projeto com ID {body.id} não encontrado."}, 404
 
+        conflito = conflito_de_versao(projeto.versao, body.versao)
+        if conflito:
+            return conflito
+
         for campo, valor in body.dict(exclude_unset=True).items():
-            if campo != "id" and hasattr(projeto, campo):
+            if campo not in ("id", "versao") and hasattr(projeto, campo):
                 setattr(projeto, campo, valor)
 
         projeto.validar_nome()
@@ -193,7 +536,12 @@ def editar_projeto(body: ProjetoEditSchema):
         projeto.validar_custo()
 
         session.commit()
-        return jsonify({"mensagem": "Projeto atualizado com sucesso!", "projeto": ProjetoSchema.from_orm(projeto).dict()}), 200
+        return jsonify({"mensagem": "Projeto atualizado com sucesso!", "projeto": ProjetoSchema.from_orm(projeto).dict(),
+                        "versao": projeto.versao}), 200, cabecalho_etag(projeto.versao)
+
+    except StaleDataError:
+        session.rollback()
+        return conflito_concorrente()
 
     except IntegrityError as e:
         session.rollback()
@@ -212,9 +560,10 @@ def editar_projeto(body: ProjetoEditSchema):
 
 
 # ======================= ROTAS: Histórico =======================
-@app.post("/historico", tags=[historico_tag], responses={"201": HistoricoViewSchema, "400": ErrorSchema, "404": ErrorSchema})
+@api.post("/historico", tags=[historico_tag], responses={"201": HistoricoViewSchema, "400": ErrorSchema, "404": ErrorSchema})
+@idempotente
 def adicionar_historico(body: HistoricoSchema):
-    """Adiciona um novo registro histórico a um projeto existente."""
+    """Adiciona um novo registro histórico a um projeto existente (aceita Idempotency-Key)."""
     session = Session()
     projeto_id = request.args.get("id")
 
@@ -229,7 +578,7 @@ def adicionar_historico(body: HistoricoSchema):
         historico = Historico(descricao=body.descricao, projeto_id=projeto_id)
         session.add(historico)
         session.commit()
-        logger.info(f"Histórico adicionado ao projeto ID {projeto_id}.")
+        logger.info("Histórico adicionado ao projeto ID %s.", projeto_id)
         return {
             "mensagem": "Histórico adicionado com sucesso!",
             "projeto": projeto_id,
@@ -237,24 +586,31 @@ def adicionar_historico(body: HistoricoSchema):
         }, 200
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao adicionar histórico: {e}")
+        logger.error("Erro ao adicionar histórico: %s", e)
         return {"mensagem": f"Erro ao adicionar histórico: {str(e)}"}, 500
     
 
-@app.get("/historico", tags=[historico_tag], responses={"200": HistoricoViewSchema, "404": ErrorSchema})
+@api.get("/historico", tags=[historico_tag], responses={"200": HistoricoViewSchema, "404": ErrorSchema})
 def listar_historico():
     """Lista todos os registros históricos de um projeto com base no ID."""
-    session = Session()
-    projeto_id = request.args.get("id")
+    corpo, status = resposta_listar_historico(request.args.get("id"))
+    return jsonify(corpo), status
+
 
+def resposta_listar_historico(projeto_id) -> Tuple[dict, int]:
+    """Corpo e status de GET /historico (também usado por asgi.py)."""
     if not projeto_id:
         return {"mensagem": "ID do projeto não fornecido."}, 400
 
-    projeto = session.query(Projeto).filter_by(id=projeto_id).first()
-    if not projeto:
-        return {"mensagem": f"Projeto com ID {projeto_id} não encontrado."}, 404
+    session = Session()
+    try:
+        projeto = session.query(Projeto).filter_by(id=projeto_id).first()
+        if not projeto:
+            return {"mensagem": f"Projeto com ID {projeto_id} não encontrado."}, 404
 
-    historicos = session.query(Historico).filter_by(projeto_id=projeto_id).all()
+        historicos = session.query(Historico).filter_by(projeto_id=projeto_id).all()
+    finally:
+        session.close()
 
     historico_formatado = [
         {
@@ -264,12 +620,12 @@ def listar_historico():
         } for h in historicos
     ]
 
-    logger.info(f"{len(historicos)} histórico(s) retornado(s) para projeto ID {projeto_id}.")
+    logger.info("%s histórico(s) retornado(s) para projeto ID %s.", len(historicos), projeto_id)
     return {"projeto_id": projeto_id, "historico": historico_formatado}, 200
 
 
 # ======================= ROTAS: Recursos =======================
-@app.post("/recurso", tags=[recurso_tag], responses={"201": RecursoViewSchema, "400": ErrorSchema, "404": ErrorSchema})
+@api.post("/recurso", tags=[recurso_tag], responses={"201": RecursoViewSchema, "400": ErrorSchema, "404": ErrorSchema})
 def adicionar_recurso(body: RecursoSchema):
     """Adiciona um novo recurso, e opcionalmente o vincula a um projeto."""
     session = Session()
@@ -295,49 +651,90 @@ def adicionar_recurso(body: RecursoSchema):
 
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao adicionar recurso: {e}")
+        logger.error("Erro ao adicionar recurso: %s", e)
         return {"mensagem": f"Erro ao adicionar recurso: {str(e)}"}, 500
 
 
-@app.get("/recursos", tags=[recurso_tag], responses={"200": ListagemRecursoSchema})
-def listar_recursos():
-    """Lista todos os recursos cadastrados."""
-    session = Session()
-    recursos = session.query(Recurso).all()
+@api.get("/recursos", tags=[recurso_tag], responses={"200": RecursosOuAlteradosSchema, "410": ErrorSchema})
+def listar_recursos(query: RecursoSincronizacaoSchema):
+    """
+    Lista todos os recursos cadastrados.
 
-    if not recursos:
-        return jsonify({"mensagem": "Nenhum recurso encontrado."}), 200
+    Com 'since' devolve só os recursos criados ou alterados e os IDs removidos
+    desde o cursor (ou data/hora) informado, no formato RecursosAlteradosSchema.
+    """
+    corpo, status = resposta_listar_recursos(query)
+    return jsonify(corpo), status
 
-    logger.info(f"{len(recursos)} recurso(s) encontrado(s).")
-    return jsonify([RecursoViewSchema.from_orm(r).dict() for r in recursos]), 200
+
+def resposta_listar_recursos(query: Optional[RecursoSincronizacaoSchema] = None) -> Tuple[object, int]:
+    """Corpo e status de GET /recursos (também usado por asgi.py)."""
+    session = Session()
+    try:
+        if query is not None and query.since is not None:
+            try:
+                recursos, removidos, cursor = alteracoes_desde(session, Recurso, "recurso", query.since)
+            except CursorExpirado as e:
+                return {"mensagem": str(e)}, 410
+            logger.info("%s recurso(s) alterado(s) e %s removido(s) desde %s.", len(recursos), len(removidos), query.since)
+            with medir("pydantic"):
+                lista = [RecursoViewSchema.from_orm(r).dict() for r in recursos]
+            return {"recursos": lista, "removidos": removidos, "cursor": cursor}, 200
+
+        recursos = session.query(Recurso).all()
+
+        if not recursos:
+            return {"mensagem": "Nenhum recurso encontrado."}, 200
+
+        logger.info("%s recurso(s) encontrado(s).", len(recursos))
+        with medir("pydantic"):
+            return [RecursoViewSchema.from_orm(r).dict() for r in recursos], 200
+    finally:
+        session.close()
 
 
-@app.get("/recurso", tags=[recurso_tag], responses={"200": RecursoSchema, "404": ErrorSchema, "500": ErrorSchema})
+@api.get("/recurso", tags=[recurso_tag], responses={"200": RecursoSchema, "404": ErrorSchema, "500": ErrorSchema})
 def buscar_recurso(query: RecursoBuscaIdSchema):
-    """Retorna um recurso com base no ID."""
+    """Retorna um recurso com base no ID; o ETag da resposta é a versão, para o If-Match do PUT /recurso."""
+    corpo, status = resposta_buscar_recurso(query)
+    return jsonify(corpo), status, cabecalho_etag(corpo["versao"]) if status == 200 else {}
+
+
+def resposta_buscar_recurso(query: RecursoBuscaIdSchema) -> Tuple[dict, int]:
+    """Corpo e status de GET /recurso (também usado por asgi.py)."""
     session = Session()
 
     try:
         recurso = session.query(Recurso).filter_by(id=query.id).first()
 
         if not recurso:
-            return jsonify({"mensagem": "Recurso não encontrado."}), 404
+            return {"mensagem": "Recurso não encontrado."}, 404
 
-        return jsonify({
+        return {
             "id": recurso.id,
             "nome": recurso.nome,
             "papel": recurso.papel,
-            "alocacao": recurso.alocacao
-        }), 200
+            "alocacao": recurso.alocacao,
+            "versao": recurso.versao
+        }, 200
 
     except Exception as e:
-        logger.error(f"Erro ao buscar recurso: {e}")
-        return jsonify({"mensagem": f"Erro interno: {str(e)}"}), 500
+        logger.error("Erro ao buscar recurso: %s", e)
+        return {"mensagem": f"Erro interno: {str(e)}"}, 500
+
+    finally:
+        session.close()
 
 
-@app.get("/recursos-disponiveis", tags=[recurso_tag])
+@api.get("/recursos-disponiveis", tags=[recurso_tag])
 def listar_recursos_disponiveis(query: ProjetoBuscaIdSchema):
     """Retorna os recursos que ainda não estão vinculados ao projeto."""
+    corpo, status = resposta_listar_recursos_disponiveis(query)
+    return jsonify(corpo), status
+
+
+def resposta_listar_recursos_disponiveis(query: ProjetoBuscaIdSchema) -> Tuple[dict, int]:
+    """Corpo e status de GET /recursos-disponiveis (também usado por asgi.py)."""
     session = Session()
 
     try:
@@ -351,34 +748,49 @@ def listar_recursos_disponiveis(query: ProjetoBuscaIdSchema):
             "alocacao": r.alocacao
         } for r in recursos_disponiveis]
 
-        return jsonify({"recursos": recursos}), 200
+        return {"recursos": recursos}, 200
     except Exception as e:
-        logger.error(f"Erro ao listar recursos disponíveis: {e}")
-        return jsonify({"mensagem": f"Erro ao buscar recursos disponíveis: {str(e)}"}), 500
+        logger.error("Erro ao listar recursos disponíveis: %s", e)
+        return {"mensagem": f"Erro ao buscar recursos disponíveis: {str(e)}"}, 500
+    finally:
+        session.close()
 
 
-@app.put("/recurso", tags=[recurso_tag], responses={"200": RecursoMsgSchema, "404": ErrorSchema, "400": ErrorSchema})
+@api.put("/recurso", tags=[recurso_tag],
+         responses={"200": RecursoMsgSchema, "404": ErrorSchema, "400": ErrorSchema, "409": ErrorSchema, "412": ErrorSchema})
 def atualizar_recurso(body: RecursoEditSchema):
-    """Atualiza os dados de um recurso existente."""
+    """
+    Atualiza os dados de um recurso existente.
+
+    Com If-Match (ETag de GET /recurso) ou o campo 'versao', a edição só é
+    gravada se o recurso não mudou desde a leitura: 412 ou 409, respectivamente.
+    """
     session = Session()
 
     recurso = session.query(Recurso).filter_by(id=body.id).first()
     if not recurso:
         return {"mensagem": "Recurso não encontrado."}, 404
 
+    conflito = conflito_de_versao(recurso.versao, body.versao)
+    if conflito:
+        return conflito
+
     try:
         recurso.nome = body.nome
         recurso.papel = body.papel
         recurso.alocacao = body.alocacao
         session.commit()
-        return {"mensagem": "Recurso atualizado com sucesso."}, 200
+        return {"mensagem": "Recurso atualizado com sucesso.", "versao": recurso.versao}, 200, cabecalho_etag(recurso.versao)
+    except StaleDataError:
+        session.rollback()
+        return conflito_concorrente()
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao atualizar recurso: {e}")
+        logger.error("Erro ao atualizar recurso: %s", e)
         return {"mensagem": f"Erro ao atualizar recurso: {str(e)}"}, 500
 
 
-@app.delete("/recurso", tags=[recurso_tag], responses={"200": RecursoMsgSchema, "404": ErrorSchema, "500": ErrorSchema})
+@api.delete("/recurso", tags=[recurso_tag], responses={"200": RecursoMsgSchema, "404": ErrorSchema, "500": ErrorSchema})
 def deletar_recurso(query: RecursoBuscaIdSchema):
     """Remove um recurso, se ele não estiver vinculado a nenhum projeto."""
     session = Session()
@@ -399,17 +811,21 @@ def deletar_recurso(query: RecursoBuscaIdSchema):
         session.delete(recurso)
         session.commit()
         return {"mensagem": "Recurso removido com sucesso."}, 200
+    except StaleDataError:
+        session.rollback()
+        return conflito_concorrente()
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao remover recurso: {e}")
+        logger.error("Erro ao remover recurso: %s", e)
         return {"mensagem": f"Erro ao remover recurso: {str(e)}"}, 500
 
 
 # ======================= ROTAS: Projeto_Recurso =======================
 
-@app.post("/projeto/recurso", tags=[projeto_recurso_tag])
+@api.post("/projeto/recurso", tags=[projeto_recurso_tag])
+@idempotente
 def vincular_recurso_projeto():
-    """Vincula um recurso existente a um projeto existente."""
+    """Vincula um recurso existente a um projeto existente (aceita Idempotency-Key)."""
     session = Session()
     projeto_id = request.args.get("id_projeto")
     recurso_id = request.args.get("id_recurso")
@@ -432,11 +848,11 @@ def vincular_recurso_projeto():
         return {"mensagem": "Recurso vinculado ao projeto com sucesso."}, 200
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao vincular recurso: {e}")
+        logger.error("Erro ao vincular recurso: %s", e)
         return {"mensagem": f"Erro ao vincular recurso: {str(e)}"}, 500
 
 
-@app.delete("/projeto/recurso", tags=[projeto_recurso_tag])
+@api.delete("/projeto/recurso", tags=[projeto_recurso_tag])
 def desvincular_recurso_projeto():
     """Remove o vínculo entre um recurso e um projeto."""
     session = Session()
@@ -461,37 +877,152 @@ def desvincular_recurso_projeto():
         return {"mensagem": "Recurso desvinculado do projeto com sucesso."}, 200
     except Exception as e:
         session.rollback()
-        logger.error(f"Erro ao desvincular recurso: {e}")
+        logger.error("Erro ao desvincular recurso: %s", e)
         return {"mensagem": f"Erro ao desvincular recurso: {str(e)}"}, 500
 
 
-@app.get("/projeto/recursos", tags=[projeto_tag])
+@api.get("/projeto/recursos", tags=[projeto_tag])
 def listar_recursos_por_projeto():
     """Lista os recursos vinculados a um projeto."""
-    session = Session()
-    projeto_id = request.args.get("id")
+    corpo, status = resposta_listar_recursos_por_projeto(request.args.get("id"))
+    return jsonify(corpo), status
+
 
+def resposta_listar_recursos_por_projeto(projeto_id) -> Tuple[dict, int]:
+    """Corpo e status de GET /projeto/recursos (também usado por asgi.py)."""
     if not projeto_id:
         return {"mensagem": "ID do projeto não fornecido."}, 400
 
-    projeto = session.query(Projeto).filter_by(id=projeto_id).first()
-
-    if not projeto:
-        return {"mensagem": "Projeto não encontrado."}, 404
+    session = Session()
+    try:
+        projeto = session.query(Projeto).filter_by(id=projeto_id).first()
 
-    recursos = projeto.recursos
-    lista_recursos = [
-        {
-            "id": r.id,
-            "nome": r.nome,
-            "papel": r.papel,
-            "alocacao": r.alocacao
-        } for r in recursos
-    ]
+        if not projeto:
+            return {"mensagem": "Projeto não encontrado."}, 404
+
+        lista_recursos = [
+            {
+                "id": r.id,
+                "nome": r.nome,
+                "papel": r.papel,
+                "alocacao": r.alocacao
+            } for r in projeto.recursos
+        ]
+    finally:
+        session.close()
 
-    logger.info(f"{len(lista_recursos)} recurso(s) retornado(s) para o projeto ID {projeto_id}.")
+    logger.info("%s recurso(s) retornado(s) para o projeto ID %s.", len(lista_recursos), projeto_id)
     return {"projeto_id": projeto_id, "recursos": lista_recursos}, 200
 
 
+# ======================= Eventos (Server-Sent Events) =======================
+@api.get("/eventos", tags=[eventos_tag], responses={"400": ErrorSchema, "503": ErrorSchema})
+def transmitir_eventos(query: EventosSchema):
+    """
+    Transmite as alterações de projetos, históricos, recursos e vínculos como Server-Sent Events.
+
+    Cada evento traz o ID da alteração (o mesmo 'cursor' de ?since=), o tipo
+    (ex: historico.criado, vinculo.removido) e os IDs envolvidos. Na
+    reconexão, o cabeçalho Last-Event-ID retoma do último evento recebido.
+    """
+    ultimo_id = query.ultimo_id
+    cabecalho = request.headers.get("Last-Event-ID")
+    if cabecalho:
+        # Enviado pelo EventSource na reconexão: vale mais que o parâmetro da primeira conexão
+        if not cabecalho.isdigit():
+            return jsonify({"mensagem": "Last-Event-ID deve ser um inteiro maior ou igual a zero."}), 400
+        ultimo_id = int(cabecalho)
+
+    try:
+        corpo = difusor.fluxo(ultimo_id, tuple(query.tipos.split(",")) if query.tipos else None)
+    except LimiteConexoes as e:
+        logger.warning("GET /eventos recusado: %s", e)
+        return jsonify({"mensagem": str(e)}), 503, {"Retry-After": str(max(1, EVENTOS_RETRY_MS // 1000))}
+
+    logger.info("Cliente de eventos conectado (último ID: %s).", ultimo_id)
+    return Response(corpo, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ======================= Comandos de Linha de Comando =======================
+@api.cli.command("cambio-preencher")
+@click.option("--inicio", required=True, help="Primeira data da série (AAAA-MM-DD).")
+@click.option("--fim", default=None, help="Última data da série (AAAA-MM-DD); padrão: hoje.")
+def preencher_serie_cambio(inicio, fim):
+    """Baixa em bloco a série histórica de câmbio para o período informado."""
+    dias = serie_cambio.preencher(date.fromisoformat(inicio), date.fromisoformat(fim) if fim else None)
+    click.echo(f"Série de câmbio cobre {dias} dia(s).")
+
+
+@api.cli.command("alteracoes-limpar")
+@click.option("--dias", default=int(os.getenv("ALTERACOES_RETENCAO_DIAS", "30")), show_default=True,
+              help="Mantém as alterações (e lápides) dos últimos N dias.")
+def limpar_registro_alteracoes(dias):
+    """Descarta alterações antigas; cursores anteriores passam a receber 410 (refazer a carga)."""
+    session = Session()
+    try:
+        removidas = limpar_alteracoes(session, dias)
+    finally:
+        session.close()
+    click.echo(f"{removidas} alteração(ões) descartada(s).")
+
+
+@api.cli.command("idempotencia-limpar")
+@click.option("--horas", default=IDEMPOTENCIA_RETENCAO_HORAS, show_default=True,
+              help="Mantém as chaves de idempotência das últimas N horas.")
+def limpar_chaves_idempotencia(horas):
+    """Descarta as respostas guardadas por Idempotency-Key; repetições posteriores executam a rota de novo."""
+    session = Session()
+    try:
+        removidas = limpar_chaves(session, horas)
+    finally:
+        session.close()
+    click.echo(f"{removidas} chave(s) de idempotência descartada(s).")
+
+
+@api.cli.command("init-db")
+def inicializar_banco():
+    """Cria o banco de dados e as tabelas que ainda não existem."""
+    init_db()
+    click.echo("Banco de dados pronto.")
+
+
+# ======================= Fábrica da Aplicação =======================
+def create_app(config: Optional[dict] = None) -> OpenAPI:
+    """
+    Cria e configura a aplicação.
+
+    `config` complementa a configuração do Flask, por exemplo
+    {"TESTING": True, "DATABASE_URL": "sqlite:///teste.sqlite3"}. Nada aqui
+    toca no banco: o engine só conecta na primeira consulta e as tabelas são
+    criadas por `flask init-db` (init_db).
+    """
+    configurar_logs()
+    app = OpenAPICacheada(__name__, info=info)
+    app.config.from_mapping(config or {})
+    engine = configurar_banco(app.config.get("DATABASE_URL"))
+
+    CORS(app)
+    request_id.init_app(app)
+    instrumentacao.init_app(app)
+    metricas.init_app(app, engine)
+    admissao.init_app(app)
+    profiler.init_app(app)
+    consultas_lentas.init_app(app)
+    captura.init_app(app)
+    app.register_api(api)
+    return app
+
+
+def __getattr__(nome: str):
+    # `from app import app` (asgi.py, `flask run`, testes e scripts) cria a instância no primeiro acesso:
+    # importar o módulo não configura os logs, não inicia as threads de log nem cria o engine
+    if nome == "app":
+        instancia = globals()["app"] = create_app()
+        return instancia
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    init_db()
+    create_app().run(debug=True)
\ No newline at end of file
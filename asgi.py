@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from pydantic import ValidationError
+
+import app as app_module
+from app import app
+from logger import logger, request_id_atual
+from model import init_db
+from middleware.admissao import Sobrecarga, recusar
+from middleware.instrumentacao import Medicao, medicao_atual, registrar_acesso
+from middleware.metricas import registro
+from middleware.request_id import CABECALHO
+from schema.projeto_schema import ProjetoBuscaIdSchema, ProjetoBuscaIdMoedaSchema, ProjetoMoedaSchema
+from schema.recurso_schema import RecursoBuscaIdSchema, RecursoSincronizacaoSchema
+from service.cambio import CambioIndisponivel, MOEDA_CUSTO, TabelaCambio
+from service.cliente_cambio import MoedaInvalida
+from service.cliente_cambio_async import ClienteCambioAsync
+
+# ==============================================
+# Servidor ASGI (rotas de leitura assíncronas)
+# ==============================================
+# Uso: uvicorn asgi:aplicacao --host 0.0.0.0 --port 5000
+#
+# As rotas mais sensíveis a espera de I/O (GET /conversao e as leituras de
+# projetos e recursos) são atendidas por corrotinas: a API de câmbio é
+# consultada com httpx sem ocupar thread, e o acesso ao banco (SQLite, sem
+# driver assíncrono) roda em um pool limitado de ASGI_DB_THREADS threads.
+# Todas as demais rotas (escritas, /openapi, /metrics, /admin, /healthz...)
+# seguem para a aplicação Flask de app.py, executada em outro pool limitado.
+#
+# app.py continua sendo a fonte da verdade: os schemas de query são os mesmos
+# das rotas do flask_openapi3 (mesmo 422 em caso de erro) e o corpo das
+# respostas vem das mesmas funções resposta_* usadas pelas rotas Flask.
+# O banco e as tabelas que faltarem são criados no startup (lifespan).
+# ==============================================
+
+ASGI_DB_THREADS = int(os.getenv("ASGI_DB_THREADS", "8"))  # acesso ao banco nas rotas assíncronas
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "8"))  # rotas atendidas pela aplicação Flask
+
+_executor_db = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix="asgi-db")
+_flask = WSGIMiddleware(app, workers=ASGI_WSGI_THREADS)
+_cliente_async: Optional[ClienteCambioAsync] = None
+
+Resposta = Tuple[object, int]  # ou (corpo, status, cabeçalhos extras)
+_rotas: Dict[Tuple[str, str], Callable[[Dict[str, str]], Awaitable[Resposta]]] = {}
+
+
+async def em_thread(funcao: Callable, *args):
+    """Executa `funcao` no pool do banco, levando o contexto da requisição (ID e medição)."""
+    contexto = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor_db, partial(contexto.run, funcao, *args))
+
+
+# ========== Câmbio sem bloqueio ==========
+def cliente_async() -> ClienteCambioAsync:
+    """Cliente httpx ligado ao ClienteCambio atual da aplicação (mesmo disjuntor e métricas)."""
+    global _cliente_async
+    if _cliente_async is None or _cliente_async.cliente is not app_module.cliente_cambio:
+        _cliente_async = ClienteCambioAsync(app_module.cliente_cambio)
+    return _cliente_async
+
+
+async def tabela_pronta(base: str) -> Callable[[str], Tuple[TabelaCambio, bool]]:
+    """
+    Obtém a tabela de `base` sem bloquear o loop e devolve uma função no
+    formato de `cache_cambio.obter`, para as funções resposta_* de app.py.
+    O erro, se houver, só é levantado quando a tabela for de fato usada.
+    """
+    try:
+        resultado = await app_module.cache_cambio.obter_async(base, cliente_async().ultimas_taxas, em_thread)
+    except (MoedaInvalida, CambioIndisponivel) as e:
+        erro = e
+
+        def obter(_base):
+            raise erro
+        return obter
+    return lambda _base: resultado
+
+
+# ========== Rotas assíncronas ==========
+def rota(metodo: str, caminho: str):
+    def registrar(funcao):
+        _rotas[(metodo, caminho)] = funcao
+        return funcao
+    return registrar
+
+
+def _query(schema, parametros: Dict[str, str]):
+    """Valida a query como o flask_openapi3 (só os campos do schema); levanta ValidationError."""
+    return schema(**{campo: valor for campo, valor in parametros.items() if campo in schema.__fields__})
+
+
+def _numerico(valor: Optional[str]) -> bool:
+    try:
+        float(valor)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+@rota("GET", "/conversao")
+async def conversao(parametros: Dict[str, str]) -> Resposta:
+    valor, de, para, data = (parametros.get("valor"), parametros.get("de", "BRL"),
+                             parametros.get("para", "USD"), parametros.get("data"))
+    if data:
+        # Série histórica local (banco)
+        return await em_thread(app_module.resposta_conversao, valor, de, para, data)
+    obter = await tabela_pronta(de.upper()) if _numerico(valor) else None
+    return app_module.resposta_conversao(valor, de, para, obter_tabela=obter)
+
+
+@rota("GET", "/projetos")
+async def projetos(parametros: Dict[str, str]) -> Resposta:
+    query = _query(ProjetoMoedaSchema, parametros)
+    obter = await tabela_pronta(MOEDA_CUSTO) if query.moeda and query.cotacao_em == "atual" else None
+    return await em_thread(app_module.resposta_listar_projetos, query, obter)
+
+
+@rota("GET", "/projeto")
+async def projeto(parametros: Dict[str, str]) -> Resposta:
+    query = _query(ProjetoBuscaIdMoedaSchema, parametros)
+    obter = await tabela_pronta(MOEDA_CUSTO) if query.moeda and query.cotacao_em == "atual" else None
+    corpo, status = await em_thread(app_module.resposta_buscar_projeto, query, obter)
+    return corpo, status, app_module.cabecalho_etag(corpo["versao"]) if status == 200 and not query.moeda else {}
+
+
+@rota("GET", "/historico")
+async def historico(parametros: Dict[str, str]) -> Resposta:
+    return await em_thread(app_module.resposta_listar_historico, parametros.get("id"))
+
+
+@rota("GET", "/recursos")
+async def recursos(parametros: Dict[str, str]) -> Resposta:
+    return await em_thread(app_module.resposta_listar_recursos, _query(RecursoSincronizacaoSchema, parametros))
+
+
+@rota("GET", "/recurso")
+async def recurso(parametros: Dict[str, str]) -> Resposta:
+    corpo, status = await em_thread(app_module.resposta_buscar_recurso, _query(RecursoBuscaIdSchema, parametros))
+    return corpo, status, app_module.cabecalho_etag(corpo["versao"]) if status == 200 else {}
+
+
+@rota("GET", "/recursos-disponiveis")
+async def recursos_disponiveis(parametros: Dict[str, str]) -> Resposta:
+    return await em_thread(app_module.resposta_listar_recursos_disponiveis, _query(ProjetoBuscaIdSchema, parametros))
+
+
+@rota("GET", "/projeto/recursos")
+async def recursos_do_projeto(parametros: Dict[str, str]) -> Resposta:
+    return await em_thread(app_module.resposta_listar_recursos_por_projeto, parametros.get("id"))
+
+
+# ========== Aplicação ASGI ==========
+def _json(corpo) -> bytes:
+    """Serializa como o jsonify do Flask (mesmo encoder, ordenação e formato)."""
+    texto = json.dumps(corpo, cls=app.json_encoder, ensure_ascii=app.config["JSON_AS_ASCII"],
+                       sort_keys=app.config["JSON_SORT_KEYS"], separators=(",", ":"))
+    return (texto + "\n").encode()
+
+
+async def _atender(manipulador, scope, send):
+    cabecalhos = {nome.decode("latin-1").lower(): valor.decode("latin-1") for nome, valor in scope["headers"]}
+    request_id = cabecalhos.get(CABECALHO.lower()) or uuid.uuid4().hex
+    token_id = request_id_atual.set(request_id)
+    medicao = Medicao()
+    token_medicao = medicao_atual.set(medicao)
+    registro.ajustar("http_requisicoes_em_andamento", 1)
+    metodo, caminho = scope["method"], scope["path"]
+    try:
+        parametros: Dict[str, str] = {}
+        for nome, valor in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True):
+            parametros.setdefault(nome, valor)
+
+        extras: Dict[str, str] = {}
+        try:
+            corpo, status, *resto = await manipulador(parametros)
+            extras = resto[0] if resto else {}
+            dados = _json(corpo)
+        except ValidationError as e:
+            dados, status = e.json().encode(), 422
+        except Exception as e:
+            logger.exception("Erro não tratado em %s %s: %s", metodo, caminho, e)
+            dados, status = _json({"mensagem": "Erro interno do servidor."}), 500
+
+        resposta = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(dados)).encode()),
+            (b"server-timing", registrar_acesso(medicao, metodo, caminho, status, caminho, len(dados)).encode()),
+            (CABECALHO.lower().encode(), request_id.encode("latin-1")),
+        ]
+        resposta += [(nome.lower().encode("latin-1"), valor.encode("latin-1")) for nome, valor in extras.items()]
+        # Mesmo comportamento do flask_cors com as opções padrão
+        origem = cabecalhos.get("origin")
+        if origem:
+            resposta += [(b"access-control-allow-origin", origem.encode("latin-1")), (b"vary", b"Origin")]
+        else:
+            resposta.append((b"access-control-allow-origin", b"*"))
+
+        registro.somar("http_requisicoes_total", metodo=metodo, rota=caminho, status=status)
+        registro.observar("http_requisicao_duracao_segundos", time.perf_counter() - medicao.inicio,
+                          metodo=metodo, rota=caminho)
+        await send({"type": "http.response.start", "status": status, "headers": resposta})
+        await send({"type": "http.response.body", "body": dados})
+    finally:
+        registro.ajustar("http_requisicoes_em_andamento", -1)
+        medicao_atual.reset(token_medicao)
+        request_id_atual.reset(token_id)
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            await em_thread(init_db)
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            if _cliente_async is not None:
+                await _cliente_async.fechar()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def aplicacao(scope, receive, send):
+    """Ponto de entrada ASGI: rotas assíncronas próprias ou, para as demais, a aplicação Flask."""
+    if scope["type"] == "lifespan":
+        return await _ciclo_de_vida(receive, send)
+    manipulador = _rotas.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if manipulador is None:
+        return await _flask(scope, receive, send)
+    # As rotas assíncronas são leituras limitadas pelo pool do banco; do
+    # controle de admissão (middleware/admissao.py) vale o limite de taxa
+    try:
+        controle = app_module.admissao.controle
+        encaminhado = b",".join(v for k, v in scope.get("headers", []) if k == b"x-forwarded-for").decode("latin-1")
+        controle.verificar_taxa(controle.cliente(scope["client"][0] if scope.get("client") else None, encaminhado))
+    except Sobrecarga as e:
+        manipulador = partial(_recusada, e, scope["method"], scope["path"])
+    return await _atender(manipulador, scope, send)
+
+
+async def _recusada(erro: Sobrecarga, metodo: str, caminho: str, parametros: Dict[str, str]) -> Resposta:
+    return recusar(erro, metodo, caminho, "leitura")
@@ -0,0 +1,87 @@
+import itertools
+import multiprocessing
+import os
+import random
+import shutil
+
+# ==============================================
+# Configuração do Gunicorn (servidor de produção)
+# ==============================================
+# Uso: gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# Cada worker é um processo com GUNICORN_THREADS threads (worker 'gthread').
+# A aplicação é carregada uma vez no processo mestre (preload) e herdada
+# pelos workers no fork; por isso o post_fork descarta as conexões do
+# SQLAlchemy herdadas e recria as threads de log em cada worker, que grava os
+# próprios arquivos de log (log/gunicorn.detailed.w1.log, ...). O banco e as
+# tabelas são criados uma vez, no mestre (on_starting), e não a cada import.
+# Os workers são reciclados após max_requests (± jitter) requisições, sem
+# derrubar as requisições em andamento.
+# ==============================================
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))  # worker sem resposta por mais que isso é reiniciado
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))  # prazo para concluir requisições ao reciclar
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+# Reciclagem gradual: o jitter evita que todos os workers reiniciem ao mesmo tempo
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# O log de acesso é gerado pela própria aplicação (logger 'instrumentacao')
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+
+# Cada cliente de GET /eventos ocupa uma thread enquanto está conectado:
+# no máximo metade das threads do worker, para as demais rotas seguirem atendidas
+os.environ.setdefault("EVENTOS_MAX_CONEXOES", str(max(1, threads // 2)))
+
+# Uma escrita na fila do controle de admissão (middleware/admissao.py) também
+# ocupa uma thread: escritas em execução e na fila ficam com até metade delas
+os.environ.setdefault("ADMISSAO_FILA_ESCRITAS",
+                      str(max(1, threads // 2 - int(os.getenv("ADMISSAO_ESCRITAS", "1")))))
+
+# Métricas agregadas entre workers (middleware/metricas.py)
+os.environ.setdefault("METRICAS_DIR", os.path.join(os.getenv("LOG_DIR", "log/"), "metricas"))
+
+
+def on_starting(server):
+    # Snapshots de execuções anteriores somariam contadores de processos que não existem mais
+    # (com preload a aplicação já foi importada aqui, então o diretório é recriado)
+    shutil.rmtree(os.environ["METRICAS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICAS_DIR"], exist_ok=True)
+
+    from model import init_db
+    init_db()
+    if server.cfg.preload_app:
+        # Monta o documento OpenAPI no mestre: os workers já o herdam pronto
+        server.app.wsgi().api_doc
+
+
+def pre_fork(server, worker):
+    # Vaga do worker nos nomes dos arquivos de log: o substituto de um worker
+    # reciclado reaproveita a vaga, e os arquivos não se multiplicam a cada reciclagem
+    ocupadas = {getattr(w, "vaga", None) for w in server.WORKERS.values()}
+    worker.vaga = next(n for n in itertools.count(1) if n not in ocupadas)
+
+
+def post_fork(server, worker):
+    from logger import reiniciar_logs_apos_fork, separar_arquivos_por_processo
+    from model import engine
+
+    # Cada RotatingFileHandler rotaciona sozinho: um arquivo por worker, nunca compartilhado
+    separar_arquivos_por_processo(f"w{worker.vaga}")
+    reiniciar_logs_apos_fork()
+    # Conexões abertas no mestre não podem ser usadas por dois processos:
+    # descarta as referências herdadas sem fechá-las (o mestre ainda as possui).
+    engine.dispose(close=False)
+    # Sem isso todos os workers herdariam a mesma sequência (amostragens do profiler e da captura)
+    random.seed()
+    server.log.info("Worker %s pronto.", worker.pid)
+
+
+def worker_abort(worker):
+    worker.log.warning("Worker %s interrompido por timeout (%ss).", worker.pid, timeout)
@@ -1,71 +1,228 @@
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from contextvars import ContextVar
+import atexit
+import json
 import logging
 import os
+import queue
+from typing import Optional
 
 
-log_path = "log/"
-# Verifica se o diretorio para armezenar os logs não existe
-if not os.path.exists(log_path):
-   # então cria o diretorio
-   os.makedirs(log_path)
+log_path = os.getenv("LOG_DIR", "log/")
 
+# ========== Configuração por variáveis de ambiente ==========
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "texto")  # 'texto' ou 'json' (uma linha JSON por registro)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # tamanho de cada arquivo antes da rotação
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "10"))  # quantidade de arquivos rotacionados mantidos
+LOG_SQL = os.getenv("LOG_SQL", "WARNING")  # 'INFO' registra cada comando SQL; 'DEBUG' inclui as linhas retornadas
 
-dictConfig({
-    "version": 1,
-    "disable_existing_loggers": True,
-    "formatters": {
-        "default": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
-        },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
+# Identificador da requisição em andamento, anexado a cada registro de log
+request_id_atual: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class FiltroRequestId(logging.Filter):
+    """Anexa o ID da requisição atual ao registro (executa na thread da requisição)."""
+
+    def filter(self, record):
+        record.request_id = request_id_atual.get()
+        return True
+
+
+class FormatadorJson(logging.Formatter):
+    """Formata cada registro como uma linha JSON."""
+
+    def format(self, record):
+        dados = {
+            "ts": self.formatTime(record),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "funcao": record.funcName,
+            "linha": record.lineno,
+            "mensagem": record.getMessage(),
         }
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
+        # Campos estruturados passados com extra={"dados": {...}}
+        dados.update(getattr(record, "dados", None) or {})
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False)
+
+
+# ========== Pipeline assíncrono ==========
+# Os handlers instalados por configurar_logs() (console e arquivos com
+# rotação) passam a rodar em uma thread própria: a thread da requisição só
+# enfileira o registro.
+_listeners = []  # pares (QueueHandler, QueueListener)
+
+
+def tornar_assincrono(log: logging.Logger):
+    """Troca os handlers do logger por um QueueHandler servido por um QueueListener."""
+    handlers = list(log.handlers)
+    if not handlers:
+        return
+    fila = queue.SimpleQueue()
+    handler_fila = QueueHandler(fila)
+    handler_fila.addFilter(FiltroRequestId())
+    for handler in handlers:
+        log.removeHandler(handler)
+    log.addHandler(handler_fila)
+
+    listener = QueueListener(fila, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append((handler_fila, listener))
+
+
+def reiniciar_logs_apos_fork():
+    """
+    Recria as filas e as threads de log no processo filho (ex: post_fork do gunicorn).
+
+    Threads não sobrevivem ao fork e a fila herdada pode estar com o lock
+    interno preso; por isso cada par handler/listener recebe uma fila nova.
+    """
+    for handler_fila, listener in _listeners:
+        fila = queue.SimpleQueue()
+        handler_fila.queue = fila
+        listener.queue = fila
+        listener._thread = None
+        listener.start()
+
+
+def encerrar_logs():
+    """Esvazia as filas e encerra as threads de log (chamado na saída do processo)."""
+    while _listeners:
+        _, listener = _listeners.pop()
+        listener.stop()
+
+
+# ========== Arquivos por processo ==========
+# Cada RotatingFileHandler decide sozinho quando rotacionar, olhando só o que
+# ele mesmo escreveu: com vários workers do gunicorn no mesmo arquivo, um
+# rotaciona por cima do outro e o histórico se perde. Por isso cada worker
+# grava os próprios arquivos (ex: gunicorn.detailed.w2.log), com o tamanho e
+# a quantidade de backups de sempre.
+_sufixo_processo: Optional[str] = None
+
+
+def arquivo_do_processo(caminho: str) -> str:
+    """`caminho` com o sufixo do worker antes da extensão; fora do gunicorn, inalterado."""
+    if not _sufixo_processo:
+        return caminho
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}.{_sufixo_processo}{extensao}"
+
+
+def separar_arquivos_por_processo(sufixo: str):
+    """
+    Passa os arquivos de log deste processo para nomes com `sufixo` (post_fork do gunicorn).
+
+    Vale para os handlers já instalados (aplicação carregada no mestre) e para
+    os criados depois por configurar_logs() e pela captura de tráfego.
+    """
+    global _sufixo_processo
+    _sufixo_processo = sufixo
+    for _, listener in _listeners:
+        for handler in listener.handlers:
+            if isinstance(handler, logging.FileHandler):
+                if handler.stream is not None:
+                    # Descritor herdado do mestre, que continua com o arquivo sem sufixo
+                    handler.stream.close()
+                    handler.stream = None
+                handler.baseFilename = arquivo_do_processo(handler.baseFilename)
+
+
+# ========== Configuração (sob demanda) ==========
+_configurado = False
+
+
+def configurar_logs():
+    """
+    Cria o diretório de logs e instala os handlers (console e arquivos com rotação).
+
+    Chamado pelo create_app, e não no import: testes e ferramentas de linha de
+    comando que só importam módulos não criam arquivos nem threads de log.
+    Chamadas repetidas não têm efeito.
+    """
+    global _configurado
+    if _configurado:
+        return
+    _configurado = True
+    # Verifica se o diretorio para armezenar os logs não existe
+    if not os.path.exists(log_path):
+        # então cria o diretorio
+        os.makedirs(log_path)
+
+    formatador_texto = "json" if LOG_FORMATO == "json" else "default"
+    formatador_arquivo = "json" if LOG_FORMATO == "json" else "detailed"
+
+    dictConfig({
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "default": {
+                "format": "[%(asctime)s] %(levelname)-4s [%(request_id)s] %(funcName)s() L%(lineno)-4d %(message)s",
+            },
+            "detailed": {
+                "format": "[%(asctime)s] %(levelname)-4s [%(request_id)s] %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
+            },
+            "json": {
+                "()": FormatadorJson,
+            }
         },
-        # "email": {
-        #     "class": "logging.handlers.SMTPHandler",
-        #     "formatter": "default",
-        #     "level": "ERROR",
-        #     "mailhost": ("smtp.example.com", 587),
-        #     "fromaddr": "devops@example.com",
-        #     "toaddrs": ["receiver@example.com", "receiver2@example.com"],
-        #     "subject": "Error Logs",
-        #     "credentials": ("username", "password"),
-        # },
-        "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
+        "handlers": {
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": formatador_texto,
+                "stream": "ext://sys.stdout",
+            },
+            # "email": {
+            #     "class": "logging.handlers.SMTPHandler",
+            #     "formatter": "default",
+            #     "level": "ERROR",
+            #     "mailhost": ("smtp.example.com", 587),
+            #     "fromaddr": "devops@example.com",
+            #     "toaddrs": ["receiver@example.com", "receiver2@example.com"],
+            #     "subject": "Error Logs",
+            #     "credentials": ("username", "password"),
+            # },
+            "error_file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "formatter": formatador_arquivo,
+                "filename": arquivo_do_processo(os.path.join(log_path, "gunicorn.error.log")),
+                "maxBytes": LOG_MAX_BYTES,
+                "backupCount": LOG_BACKUPS,
+                "delay": "True",
+            },
+            "detailed_file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "formatter": formatador_arquivo,
+                "filename": arquivo_do_processo(os.path.join(log_path, "gunicorn.detailed.log")),
+                "maxBytes": LOG_MAX_BYTES,
+                "backupCount": LOG_BACKUPS,
+                "delay": "True",
+            }
         },
-        "detailed_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        }
-    },
-    "loggers": {
-        "gunicorn.error": {
-            "handlers": ["console", "error_file"],  #, email],
-            "level": "INFO",
-            "propagate": False,
+        "loggers": {
+            "gunicorn.error": {
+                "handlers": ["console", "error_file"],  #, email],
+                "level": LOG_NIVEL,
+                "propagate": False,
+            },
+            # Comandos SQL do SQLAlchemy (substitui o echo=True do engine)
+            "sqlalchemy.engine": {
+                "level": LOG_SQL,
+            }
+        },
+        "root": {
+            "handlers": ["console", "detailed_file"],
+            "level": LOG_NIVEL,
         }
-    },
-    "root": {
-        "handlers": ["console", "detailed_file"],
-        "level": "INFO",
-    }
-})
+    })
+
+    tornar_assincrono(logging.getLogger())
+    tornar_assincrono(logging.getLogger("gunicorn.error"))
+    atexit.register(encerrar_logs)
 
 
 logger = logging.getLogger(__name__)
@@ -0,0 +1,35 @@
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, request
+
+# ==============================================
+# Middleware: Acesso às Rotas Administrativas
+# ==============================================
+# As rotas em /admin expõem detalhes internos (perfis de execução, comandos
+# SQL) e só respondem a quem enviar o cabeçalho X-Admin-Token com o valor de
+# ADMIN_TOKEN. Sem ADMIN_TOKEN definido, essas rotas ficam desativadas (404).
+# ==============================================
+
+CABECALHO = "X-Admin-Token"
+
+
+def token_valido(token: str, esperado: str) -> bool:
+    """Compara tokens em tempo constante; token vazio nunca é válido."""
+    return bool(token) and bool(esperado) and hmac.compare_digest(token.encode(), esperado.encode())
+
+
+def exigir_admin(view):
+    """Decorador que restringe a rota a requisições com o token administrativo."""
+
+    @wraps(view)
+    def protegida(*args, **kwargs):
+        esperado = os.getenv("ADMIN_TOKEN")
+        if not esperado:
+            return jsonify({"mensagem": "Rota administrativa desativada."}), 404
+        if not token_valido(request.headers.get(CABECALHO, ""), esperado):
+            return jsonify({"mensagem": "Token administrativo inválido."}), 401
+        return view(*args, **kwargs)
+
+    return protegida
@@ -0,0 +1,220 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import Flask, g, request
+
+from logger import logger
+from middleware.metricas import registro
+
+# ==============================================
+# Middleware: Controle de Admissão (descarte de carga)
+# ==============================================
+# Protege o escritor único do SQLite e as leituras em rajadas de tráfego.
+# Cada requisição passa por duas etapas antes de chegar à rota:
+#
+#   1. Limite de taxa por cliente (token bucket): cada endereço pode fazer
+#      ADMISSAO_RAJADA requisições seguidas e depois ADMISSAO_TAXA por
+#      segundo. Acima disso: 429 com Retry-After. Atrás de um balanceador,
+#      o endereço vem do X-Forwarded-For, contando ADMISSAO_PROXIES proxies
+#      confiáveis a partir da direita (como o ProxyFix do Werkzeug). Desligado
+#      por padrão: sem essa configuração, todos os clientes chegariam com o
+#      endereço do balanceador e dividiriam um único balde.
+#   2. Compartimentos separados para leituras e escritas (POST, PUT e
+#      DELETE), cada um com um limite de requisições simultâneas e uma fila
+#      limitada. Com a fila cheia, ou após ADMISSAO_ESPERA_MAXIMA segundos
+#      na fila: 503 com Retry-After.
+#
+# Assim, escritas acumuladas atrás do bloqueio de escrita do SQLite esperam
+# em uma fila curta, e não em threads presas até o timeout, e as leituras
+# continuam sendo atendidas. O excedente recebe uma resposta rápida e o
+# cliente tenta de novo depois. O tempo na fila vai para a métrica
+# admissao_espera_segundos.
+#
+# Ficam de fora as rotas de operação e GET /eventos, que tem limite próprio
+# (EVENTOS_MAX_CONEXOES). Os limites valem por processo.
+# ==============================================
+
+ADMISSAO_ESCRITAS = int(os.getenv("ADMISSAO_ESCRITAS", "1"))  # escritas simultâneas por processo (0: sem limite)
+ADMISSAO_FILA_ESCRITAS = int(os.getenv("ADMISSAO_FILA_ESCRITAS", "4"))  # escritas aguardando a vez
+ADMISSAO_LEITURAS = int(os.getenv("ADMISSAO_LEITURAS", "8"))  # leituras simultâneas por processo (0: sem limite)
+ADMISSAO_FILA_LEITURAS = int(os.getenv("ADMISSAO_FILA_LEITURAS", "16"))  # leituras aguardando a vez
+ADMISSAO_ESPERA_MAXIMA = float(os.getenv("ADMISSAO_ESPERA_MAXIMA", "2"))  # segundos na fila até o 503
+ADMISSAO_TAXA = float(os.getenv("ADMISSAO_TAXA", "0"))  # requisições por segundo por cliente (0: sem limite)
+ADMISSAO_RAJADA = int(os.getenv("ADMISSAO_RAJADA", "100"))  # requisições seguidas antes do limite de taxa
+ADMISSAO_PROXIES = int(os.getenv("ADMISSAO_PROXIES", "0"))  # proxies confiáveis que acrescentam ao X-Forwarded-For
+ADMISSAO_MAX_CLIENTES = 10000  # clientes acompanhados pelo limite de taxa (os inativos há mais tempo saem primeiro)
+
+ISENTAS = ("/eventos", "/metrics", "/healthz", "/openapi", "/admin")
+METODOS_ESCRITA = {"POST", "PUT", "PATCH", "DELETE"}
+LEITURAS_POST = {"/conversao/lote"}  # POST que não escreve no banco
+
+
+class Sobrecarga(Exception):
+    """A requisição foi recusada pelo controle de admissão."""
+
+    def __init__(self, mensagem: str, motivo: str, retry_after: float):
+        super().__init__(mensagem)
+        self.motivo = motivo  # taxa, fila ou espera
+        self.retry_after = max(1, math.ceil(retry_after))  # segundos (inteiro, como pede o cabeçalho)
+
+
+class Compartimento:
+    """Limite de requisições simultâneas de uma classe (leitura ou escrita), com fila limitada."""
+
+    def __init__(self, nome: str, limite: int, fila: int, espera_maxima: float):
+        self.nome = nome
+        self.limite = limite
+        self.fila = fila
+        self.espera_maxima = espera_maxima
+        self.em_andamento = 0
+        self.na_fila = 0
+        self._condicao = threading.Condition()
+
+    def entrar(self) -> float:
+        """Ocupa uma vaga, aguardando na fila se preciso; devolve os segundos de espera."""
+        with self._condicao:
+            # Quem chega não passa na frente de quem já está na fila
+            if self.limite <= 0 or (self.em_andamento < self.limite and not self.na_fila):
+                self.em_andamento += 1
+                return 0.0
+            if self.na_fila >= self.fila:
+                raise Sobrecarga("Servidor sobrecarregado; tente novamente em instantes.", "fila", self.espera_maxima)
+
+            inicio = time.monotonic()
+            self.na_fila += 1
+            try:
+                while self.em_andamento >= self.limite:
+                    restante = inicio + self.espera_maxima - time.monotonic()
+                    if restante <= 0:
+                        # Um aviso recebido junto com o fim do prazo passa para o próximo da fila
+                        self._condicao.notify()
+                        raise Sobrecarga("Servidor sobrecarregado; tente novamente em instantes.", "espera",
+                                         self.espera_maxima)
+                    self._condicao.wait(restante)
+                self.em_andamento += 1
+            finally:
+                self.na_fila -= 1
+            return time.monotonic() - inicio
+
+    def sair(self):
+        with self._condicao:
+            self.em_andamento -= 1
+            self._condicao.notify()
+
+    def estatisticas(self) -> dict:
+        return {"em_andamento": self.em_andamento, "na_fila": self.na_fila}
+
+
+class LimiteTaxa:
+    """Token bucket por cliente: `rajada` fichas, repostas à razão de `taxa` por segundo."""
+
+    def __init__(self, taxa: float, rajada: int, max_clientes: int = ADMISSAO_MAX_CLIENTES):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.max_clientes = max_clientes
+        self._baldes: "OrderedDict[str, list]" = OrderedDict()  # cliente -> [fichas, instante da última reposição]
+        self._lock = threading.Lock()
+
+    def consumir(self, cliente: str) -> float:
+        """Gasta uma ficha do cliente: 0 se havia, senão os segundos até a próxima."""
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.pop(cliente, None)
+            if balde is None:
+                # Um cliente esquecido voltaria com o balde cheio de qualquer forma
+                balde = [float(self.rajada), agora]
+                if len(self._baldes) >= self.max_clientes:
+                    self._baldes.popitem(last=False)
+            self._baldes[cliente] = balde
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+            if balde[0] >= 1:
+                balde[0] -= 1
+                return 0.0
+            return (1 - balde[0]) / self.taxa
+
+
+class ControleAdmissao:
+    """Compartimentos de leitura e escrita e o limite de taxa por cliente de um processo."""
+
+    def __init__(self, leituras: int = ADMISSAO_LEITURAS, fila_leituras: int = ADMISSAO_FILA_LEITURAS,
+                 escritas: int = ADMISSAO_ESCRITAS, fila_escritas: int = ADMISSAO_FILA_ESCRITAS,
+                 espera_maxima: float = ADMISSAO_ESPERA_MAXIMA, taxa: float = ADMISSAO_TAXA,
+                 rajada: int = ADMISSAO_RAJADA, proxies: int = ADMISSAO_PROXIES):
+        self.leituras = Compartimento("leitura", leituras, fila_leituras, espera_maxima)
+        self.escritas = Compartimento("escrita", escritas, fila_escritas, espera_maxima)
+        self.limite_taxa: Optional[LimiteTaxa] = LimiteTaxa(taxa, rajada) if taxa > 0 else None
+        self.proxies = proxies
+
+    def compartimento(self, metodo: str, caminho: str) -> Compartimento:
+        if metodo in METODOS_ESCRITA and caminho not in LEITURAS_POST:
+            return self.escritas
+        return self.leituras
+
+    def cliente(self, remoto: Optional[str], encaminhado: Optional[str]) -> str:
+        """
+        Endereço do cliente para o limite de taxa. Com `proxies` confiáveis, é
+        o valor que o mais externo deles acrescentou ao X-Forwarded-For; os
+        anteriores vêm do próprio cliente e podem ser forjados. Um cabeçalho
+        com menos valores que proxies não veio pelos proxies: é ignorado.
+        """
+        if self.proxies > 0 and encaminhado:
+            enderecos = [e.strip() for e in encaminhado.split(",")]
+            if len(enderecos) >= self.proxies and enderecos[-self.proxies]:
+                return enderecos[-self.proxies]
+        return remoto or "-"
+
+    def verificar_taxa(self, cliente: str):
+        """Levanta Sobrecarga (motivo 'taxa') se o cliente passou do limite."""
+        if self.limite_taxa is None:
+            return
+        espera = self.limite_taxa.consumir(cliente)
+        if espera:
+            raise Sobrecarga("Limite de requisições excedido; aguarde para tentar novamente.", "taxa", espera)
+
+    def estatisticas(self) -> dict:
+        return {"leitura": self.leituras.estatisticas(), "escrita": self.escritas.estatisticas()}
+
+
+def isenta(caminho: str) -> bool:
+    return caminho.startswith(ISENTAS)
+
+
+def recusar(erro: Sobrecarga, metodo: str, caminho: str, classe: str) -> Tuple[dict, int, dict]:
+    """Resposta da requisição recusada (429 pelo limite de taxa, 503 pela fila) e registro nas métricas."""
+    registro.somar("admissao_rejeicoes_total", classe=classe, motivo=erro.motivo)
+    if erro.motivo != "taxa":
+        logger.warning("%s %s recusada pelo controle de admissão (%s: %s).", metodo, caminho, classe, erro.motivo)
+    return {"mensagem": str(erro)}, 429 if erro.motivo == "taxa" else 503, {"Retry-After": str(erro.retry_after)}
+
+
+# Instância única do processo (usada pelos hooks, por asgi.py e pelas métricas)
+controle = ControleAdmissao()
+
+
+def init_app(app: Flask):
+    """Registra o controle de admissão antes das rotas da aplicação."""
+
+    @app.before_request
+    def admitir():
+        if isenta(request.path) or request.method == "OPTIONS":
+            return None
+        compartimento = controle.compartimento(request.method, request.path)
+        try:
+            controle.verificar_taxa(controle.cliente(request.remote_addr, request.headers.get("X-Forwarded-For")))
+            espera = compartimento.entrar()
+        except Sobrecarga as e:
+            return recusar(e, request.method, request.path, compartimento.nome)
+        g.admissao = compartimento
+        registro.observar("admissao_espera_segundos", espera, classe=compartimento.nome)
+        return None
+
+    @app.teardown_request
+    def liberar_vaga(exc):
+        compartimento = g.pop("admissao", None)
+        if compartimento is not None:
+            compartimento.sair()
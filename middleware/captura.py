@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import Flask, g, request
+
+from logger import arquivo_do_processo, log_path, tornar_assincrono
+
+# ==============================================
+# Middleware: Captura de Tráfego
+# ==============================================
+# Grava uma amostra das requisições (CAPTURA_AMOSTRAGEM, de 0 a 1; 0 desliga)
+# em um arquivo JSONL: método, caminho, query, corpo, status, duração e a
+# resposta, para reprodução posterior com scripts/replay.py. Campos sensíveis
+# listados em CAPTURA_REDACAO são substituídos por "***" na query, no corpo
+# e nos cabeçalhos. A escrita usa o mesmo pipeline assíncrono dos logs, com
+# rotação por tamanho.
+# ==============================================
+
+CAPTURA_AMOSTRAGEM = float(os.getenv("CAPTURA_AMOSTRAGEM", "0"))
+CAPTURA_ARQUIVO = os.getenv("CAPTURA_ARQUIVO", os.path.join(log_path, "captura.jsonl"))
+CAPTURA_REDACAO = {
+    campo.strip().lower()
+    for campo in os.getenv("CAPTURA_REDACAO", "senha,password,token,authorization,cookie,x-admin-token,x-profile").split(",")
+    if campo.strip()
+}
+CAPTURA_CORPO_MAX = int(os.getenv("CAPTURA_CORPO_MAX", str(64 * 1024)))  # corpos maiores não são gravados
+CAPTURA_MAX_BYTES = int(os.getenv("CAPTURA_MAX_BYTES", str(50 * 1024 * 1024)))
+CAPTURA_BACKUPS = int(os.getenv("CAPTURA_BACKUPS", "5"))
+
+# Rotas operacionais não são capturadas
+PREFIXOS_IGNORADOS = ("/metrics", "/admin", "/openapi", "/healthz")
+CABECALHOS_GRAVADOS = ("Content-Type", "Accept", "If-Match", "Idempotency-Key", "Last-Event-ID")
+
+OCULTO = "***"
+
+logger_captura = logging.getLogger("captura")
+_configuracao = threading.Lock()
+
+
+def redigir(valor, campos=None):
+    """Substitui, recursivamente, os valores das chaves sensíveis de dicionários e listas."""
+    campos = CAPTURA_REDACAO if campos is None else campos
+    if isinstance(valor, dict):
+        return {chave: OCULTO if str(chave).lower() in campos else redigir(item, campos) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [redigir(item, campos) for item in valor]
+    return valor
+
+
+def _query() -> dict:
+    return {chave: (OCULTO if chave.lower() in CAPTURA_REDACAO else valores if len(valores) > 1 else valores[0])
+            for chave, valores in request.args.lists()}
+
+
+def _corpo():
+    if not request.content_length:
+        return None
+    if request.content_length > CAPTURA_CORPO_MAX:
+        return {"_omitido": f"corpo de {request.content_length} bytes"}
+    dados = request.get_json(silent=True)
+    if dados is not None:
+        return redigir(dados)
+    return request.get_data(as_text=True)
+
+
+def _configurar_arquivo():
+    """Abre o arquivo de captura na primeira requisição amostrada."""
+    with _configuracao:
+        if logger_captura.handlers:
+            return
+        os.makedirs(os.path.dirname(CAPTURA_ARQUIVO) or ".", exist_ok=True)
+        handler = RotatingFileHandler(arquivo_do_processo(CAPTURA_ARQUIVO), maxBytes=CAPTURA_MAX_BYTES, backupCount=CAPTURA_BACKUPS,
+                                      encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger_captura.addHandler(handler)
+        logger_captura.setLevel(logging.INFO)
+        logger_captura.propagate = False
+        tornar_assincrono(logger_captura)
+
+
+def init_app(app: Flask):
+    """Registra os hooks de captura (sem efeito enquanto CAPTURA_AMOSTRAGEM for 0)."""
+
+    @app.before_request
+    def iniciar_captura():
+        if CAPTURA_AMOSTRAGEM <= 0 or request.path.startswith(PREFIXOS_IGNORADOS):
+            return
+        if random.random() >= CAPTURA_AMOSTRAGEM:
+            return
+        g.captura = {"ts": time.time(), "inicio": time.perf_counter()}
+
+    @app.after_request
+    def gravar_captura(response):
+        captura = g.pop("captura", None)
+        if captura is None:
+            return response
+        _configurar_arquivo()
+
+        conteudo = None if response.is_streamed else response.get_data()
+        resposta = None
+        if conteudo is not None and len(conteudo) <= CAPTURA_CORPO_MAX and response.is_json:
+            resposta = redigir(response.get_json(silent=True))
+        cabecalhos = {nome: request.headers[nome] for nome in CABECALHOS_GRAVADOS if nome in request.headers}
+
+        registro = {
+            "ts": round(captura["ts"], 6),
+            "request_id": g.get("request_id"),
+            "metodo": request.method,
+            "caminho": request.path,
+            "rota": request.url_rule.rule if request.url_rule else None,
+            "query": _query(),
+            "cabecalhos": redigir(cabecalhos),
+            "corpo": _corpo(),
+            "status": response.status_code,
+            "duracao_ms": round((time.perf_counter() - captura["inicio"]) * 1000, 2),
+            "tamanho": len(conteudo) if conteudo is not None else None,
+            "resposta": resposta,
+            "resposta_sha1": hashlib.sha1(conteudo).hexdigest() if conteudo is not None else None,
+        }
+        logger_captura.info(json.dumps(registro, ensure_ascii=False, default=str))
+        return response
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from flask import Flask, has_request_context, jsonify, request
+
+from middleware.admin import exigir_admin
+from middleware.instrumentacao import observar_consultas
+
+# ==============================================
+# Middleware: Log de Consultas Lentas
+# ==============================================
+# Todo comando SQL que passar de SQL_LENTO_MS milissegundos é registrado com
+# os parâmetros, a rota que o executou e, para SELECTs no SQLite, a saída do
+# EXPLAIN QUERY PLAN. Os comandos são agrupados por "impressão digital" (o
+# SQL sem literais e com listas IN colapsadas), de modo que a mesma consulta
+# com valores diferentes gera um único plano e uma única linha no relatório
+# de GET /admin/consultas-lentas.
+# ==============================================
+
+SQL_LENTO_MS = float(os.getenv("SQL_LENTO_MS", "100"))
+SQL_LENTO_MAX_CONSULTAS = int(os.getenv("SQL_LENTO_MAX_CONSULTAS", "500"))  # impressões digitais guardadas
+SQL_LENTO_INTERVALO_LOG = float(os.getenv("SQL_LENTO_INTERVALO_LOG", "60"))  # segundos entre logs da mesma consulta
+
+logger = logging.getLogger("consultas_lentas")
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS_IN = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_ESPACOS = re.compile(r"\s+")
+_ORDENACOES = ("tempo_total_ms", "execucoes", "tempo_maximo_ms")
+
+
+def impressao_digital(statement: str) -> str:
+    """Normaliza o SQL (literais viram ?, listas IN viram uma só) e devolve um hash curto."""
+    normalizado = _ESPACOS.sub(" ", _LISTAS_IN.sub("IN (?)", _LITERAIS.sub("?", statement))).strip()
+    return hashlib.sha1(normalizado.encode()).hexdigest()[:12]
+
+
+def _resumir_parametros(parameters, limite: int = 200) -> str:
+    texto = repr(parameters)
+    return texto if len(texto) <= limite else texto[:limite] + "..."
+
+
+def _plano(conn, statement: str, parameters) -> Optional[List[str]]:
+    """Executa EXPLAIN QUERY PLAN em um cursor do DBAPI (não passa pelos eventos do SQLAlchemy)."""
+    if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        return [linha[-1] for linha in cursor.fetchall()]
+    except Exception as e:
+        logger.debug("EXPLAIN QUERY PLAN falhou: %s", e)
+        return None
+    finally:
+        cursor.close()
+
+
+class RegistroConsultasLentas:
+    """Agrega as consultas lentas por impressão digital."""
+
+    def __init__(self, maximo: int = SQL_LENTO_MAX_CONSULTAS):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._consultas: Dict[str, dict] = {}
+        self.descartadas = 0  # ocorrências não agregadas por já haver `maximo` impressões digitais
+
+    def registrar(self, conn, statement: str, parameters, executemany: bool, duracao: float):
+        duracao_ms = duracao * 1000
+        if duracao_ms < SQL_LENTO_MS:
+            return
+        chave = impressao_digital(statement)
+        rota = request.url_rule.rule if has_request_context() and request.url_rule else "-"
+        parametros = _resumir_parametros(parameters)
+
+        with self._lock:
+            consulta = self._consultas.get(chave)
+            nova = consulta is None
+            if nova:
+                if len(self._consultas) >= self.maximo:
+                    self.descartadas += 1
+                    return
+                consulta = self._consultas[chave] = {
+                    "impressao_digital": chave,
+                    "sql": _ESPACOS.sub(" ", statement).strip(),
+                    "plano": None,
+                    "execucoes": 0,
+                    "tempo_total_ms": 0.0,
+                    "tempo_maximo_ms": 0.0,
+                    "rotas": {},
+                    "ultimos_parametros": None,
+                    "logado_em": float("-inf"),
+                    "execucoes_desde_log": 0,
+                }
+            consulta["execucoes"] += 1
+            consulta["execucoes_desde_log"] += 1
+            consulta["tempo_total_ms"] += duracao_ms
+            consulta["tempo_maximo_ms"] = max(consulta["tempo_maximo_ms"], duracao_ms)
+            consulta["rotas"][rota] = consulta["rotas"].get(rota, 0) + 1
+            consulta["ultimos_parametros"] = parametros
+            logar = time.monotonic() - consulta["logado_em"] >= SQL_LENTO_INTERVALO_LOG
+            if logar:
+                consulta["logado_em"] = time.monotonic()
+                execucoes, consulta["execucoes_desde_log"] = consulta["execucoes_desde_log"], 0
+
+        # O plano é obtido uma vez por impressão digital, fora do lock
+        if nova and not executemany:
+            consulta["plano"] = _plano(conn, statement, parameters)
+
+        if logar:
+            logger.warning(
+                "Consulta lenta (%.2f ms, %d ocorrência(s)) em %s [%s]: %s | parâmetros=%s | plano=%s",
+                duracao_ms, execucoes, rota, chave, consulta["sql"], parametros, consulta["plano"],
+                extra={"dados": {
+                    "impressao_digital": chave,
+                    "duracao_ms": round(duracao_ms, 2),
+                    "ocorrencias": execucoes,
+                    "rota": rota,
+                    "sql": consulta["sql"],
+                    "parametros": parametros,
+                    "plano": consulta["plano"],
+                }},
+            )
+
+    def relatorio(self, top: int = 20, ordenar: str = "tempo_total_ms") -> List[dict]:
+        """As `top` consultas lentas, da pior para a melhor segundo `ordenar`."""
+        with self._lock:
+            consultas = [dict(c, rotas=dict(c["rotas"])) for c in self._consultas.values()]
+        consultas.sort(key=lambda c: c[ordenar], reverse=True)
+        resultado = []
+        for consulta in consultas[:top]:
+            consulta.pop("logado_em")
+            consulta.pop("execucoes_desde_log")
+            consulta["tempo_medio_ms"] = round(consulta["tempo_total_ms"] / consulta["execucoes"], 2)
+            consulta["tempo_total_ms"] = round(consulta["tempo_total_ms"], 2)
+            consulta["tempo_maximo_ms"] = round(consulta["tempo_maximo_ms"], 2)
+            resultado.append(consulta)
+        return resultado
+
+    def limpar(self):
+        with self._lock:
+            self._consultas.clear()
+            self.descartadas = 0
+
+
+# Registro compartilhado pela aplicação
+consultas_lentas = RegistroConsultasLentas()
+observar_consultas(
+    lambda conn, cursor, statement, parameters, executemany, duracao:
+    consultas_lentas.registrar(conn, statement, parameters, executemany, duracao)
+)
+
+
+def init_app(app: Flask):
+    """Registra a rota GET /admin/consultas-lentas."""
+
+    @app.route("/admin/consultas-lentas", methods=["GET"])
+    @exigir_admin
+    def listar_consultas_lentas():
+        """Relatório das consultas mais lentas agrupadas por impressão digital."""
+        ordenar = request.args.get("ordenar", "tempo_total_ms")
+        if ordenar not in _ORDENACOES:
+            return jsonify({"mensagem": f"'ordenar' deve ser um de: {', '.join(_ORDENACOES)}."}), 400
+        return jsonify({
+            "limite_ms": SQL_LENTO_MS,
+            "descartadas": consultas_lentas.descartadas,
+            "consultas": consultas_lentas.relatorio(request.args.get("top", 20, type=int), ordenar),
+        }), 200
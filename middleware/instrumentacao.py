@@ -0,0 +1,204 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from flask import Flask, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ==============================================
+# Middleware: Instrumentação por Requisição
+# ==============================================
+# Mede, para cada requisição, quantos comandos SQL foram executados, o tempo
+# gasto no banco, na serialização (pydantic e JSON) e o tempo total. Os
+# valores vão no cabeçalho Server-Timing da resposta e em uma linha de log
+# de acesso estruturada, com duração e tamanho da resposta. Os eventos de
+# cursor do SQLAlchemy valem para qualquer engine, inclusive os criados
+# pelos testes.
+# ==============================================
+
+logger = logging.getLogger("instrumentacao")
+
+
+class Medicao:
+    """Acumula os tempos de uma requisição."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.etapas = {}  # nome -> segundos (ex: 'pydantic', 'json')
+
+    def somar(self, etapa: str, duracao: float):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + duracao
+
+
+class ContadorConsultas:
+    """Conta os comandos SQL executados enquanto está ativo (usado pelos testes)."""
+
+    def __init__(self):
+        self.comandos: List[str] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.comandos)
+
+
+# Medição da requisição em andamento (definida pelos hooks do Flask ou por asgi.py)
+medicao_atual: ContextVar[Optional[Medicao]] = ContextVar("medicao", default=None)
+_contadores: List[ContadorConsultas] = []
+# Funções (conn, cursor, statement, parameters, executemany, duracao) chamadas após cada comando
+_observadores: List[Callable] = []
+
+
+# ========== Eventos do SQLAlchemy ==========
+# O início de cada comando fica no contexto de execução, que é descartado junto
+# com o comando, mesmo quando ele falha. Sem contexto, vai para uma pilha na
+# conexão, esvaziada por _erro_no_cursor: um início órfão seria somado à
+# duração do próximo comando da mesma conexão.
+def _antes_do_cursor(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_consulta = time.perf_counter()
+    else:
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _depois_do_cursor(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_inicio_consulta", None)
+    if inicio is None:
+        inicios = conn.info.get("inicio_consulta")
+        if not inicios:
+            return
+        inicio = inicios.pop()
+    duracao = time.perf_counter() - inicio
+
+    medicao = medicao_atual.get()
+    if medicao is not None:
+        medicao.consultas += 1
+        medicao.tempo_db += duracao
+    for contador in _contadores:
+        contador.comandos.append(statement)
+    for observador in _observadores:
+        observador(conn, cursor, statement, parameters, executemany, duracao)
+
+
+def _erro_no_cursor(contexto_excecao):
+    # O comando falhou: after_cursor_execute não vem, o início é descartado
+    if contexto_excecao.execution_context is None and contexto_excecao.connection is not None:
+        inicios = contexto_excecao.connection.info.get("inicio_consulta")
+        if inicios:
+            inicios.pop()
+
+
+if not event.contains(Engine, "before_cursor_execute", _antes_do_cursor):
+    event.listen(Engine, "before_cursor_execute", _antes_do_cursor)
+    event.listen(Engine, "after_cursor_execute", _depois_do_cursor)
+    event.listen(Engine, "handle_error", _erro_no_cursor)
+
+
+# ========== API pública ==========
+def observar_consultas(funcao: Callable):
+    """Registra `funcao` para ser chamada com a duração de cada comando SQL executado."""
+    if funcao not in _observadores:
+        _observadores.append(funcao)
+    return funcao
+
+
+@contextmanager
+def medir(etapa: str):
+    """Soma à requisição atual o tempo gasto no bloco, sob o nome `etapa`."""
+    medicao = medicao_atual.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.somar(etapa, time.perf_counter() - inicio)
+
+
+@contextmanager
+def limite_consultas(maximo: int):
+    """
+    Falha (AssertionError) se o bloco executar mais de `maximo` comandos SQL.
+
+    Uso nos testes:
+        with limite_consultas(2):
+            client.get("/projetos")
+    """
+    contador = ContadorConsultas()
+    _contadores.append(contador)
+    try:
+        yield contador
+    finally:
+        _contadores.remove(contador)
+    assert contador.total <= maximo, (
+        f"{contador.total} comandos SQL executados (limite: {maximo}):\n" + "\n".join(contador.comandos)
+    )
+
+
+def registrar_acesso(medicao: Medicao, metodo: str, caminho: str, status: int, rota: str,
+                     tamanho: Optional[int]) -> str:
+    """Grava a linha de acesso da requisição e devolve o valor do cabeçalho Server-Timing."""
+    total = time.perf_counter() - medicao.inicio
+    serializacao = sum(medicao.etapas.values())
+
+    partes = [f'db;dur={medicao.tempo_db * 1000:.2f};desc="{medicao.consultas} consulta(s)"']
+    partes += [f"{etapa};dur={duracao * 1000:.2f}" for etapa, duracao in medicao.etapas.items()]
+    partes.append(f"total;dur={total * 1000:.2f}")
+
+    # Linha de acesso: lida por scripts/analisar_log.py (campos chave=valor após método, caminho e status)
+    logger.info(
+        "%s %s %s total_ms=%.2f bytes=%s consultas=%d db_ms=%.2f serializacao_ms=%.2f rota=%s",
+        metodo, caminho, status, total * 1000, "-" if tamanho is None else tamanho,
+        medicao.consultas, medicao.tempo_db * 1000, serializacao * 1000, rota,
+        extra={"dados": {
+            "metodo": metodo,
+            "caminho": caminho,
+            "rota": rota,
+            "status": status,
+            "bytes": tamanho,
+            "consultas": medicao.consultas,
+            "db_ms": round(medicao.tempo_db * 1000, 2),
+            "serializacao_ms": round(serializacao * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+        }},
+    )
+    return ", ".join(partes)
+
+
+def init_app(app: Flask):
+    """Registra os hooks de instrumentação e a medição da serialização JSON."""
+
+    class EncoderMedido(app.json_encoder):
+        def encode(self, o):
+            with medir("json"):
+                return super().encode(o)
+
+    app.json_encoder = EncoderMedido
+
+    @app.before_request
+    def iniciar_medicao():
+        g.medicao = Medicao()
+        g._medicao_token = medicao_atual.set(g.medicao)
+
+    @app.after_request
+    def registrar_medicao(response):
+        medicao = g.get("medicao")
+        if medicao is None:
+            return response
+        rota = request.url_rule.rule if request.url_rule else request.path
+        # Em respostas em fluxo (ex: GET /eventos) o tamanho só existiria após consumir o corpo inteiro
+        tamanho = None if response.is_streamed else response.calculate_content_length()
+        response.headers["Server-Timing"] = registrar_acesso(
+            medicao, request.method, request.path, response.status_code, rota, tamanho)
+        return response
+
+    @app.teardown_request
+    def encerrar_medicao(exc):
+        token = g.pop("_medicao_token", None)
+        if token is not None:
+            medicao_atual.reset(token)
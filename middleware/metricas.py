@@ -0,0 +1,412 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, g, request
+
+from logger import logger
+
+# ==============================================
+# Middleware: Métricas no Formato Prometheus
+# ==============================================
+# Expõe GET /metrics no formato texto do Prometheus com contagem de
+# requisições por rota e status, histogramas de latência, requisições em
+# andamento, estado do pool do SQLAlchemy, acertos do cache de câmbio e
+# latência da API de câmbio.
+#
+# A coleta não usa lock no caminho da requisição: cada thread escreve em um
+# fragmento próprio e o /metrics soma os fragmentos. Com vários workers
+# (gunicorn), defina METRICAS_DIR: cada processo grava periodicamente um
+# snapshot nesse diretório e o /metrics agrega os snapshots de todos.
+# ==============================================
+
+METRICAS_DIR = os.getenv("METRICAS_DIR")
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "5"))  # segundos entre snapshots de cada processo
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _rotulos(valores: dict) -> Rotulos:
+    return tuple(sorted((k, str(v)) for k, v in valores.items()))
+
+
+class _Fragmento:
+    """Valores escritos por uma única thread (sem lock)."""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.valores: Dict[Tuple[str, Rotulos], float] = {}
+        self.ajustes: Dict[Tuple[str, Rotulos], float] = {}  # gauges do processo (ver Registro.ajustar)
+        self.histogramas: Dict[Tuple[str, Rotulos], list] = {}  # [contagens por bucket, soma, total]
+
+
+class Registro:
+    """Registro de métricas do processo, somando os fragmentos de cada thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._fragmentos: List[_Fragmento] = []
+        self._aposentado = _Fragmento()  # valores de threads já encerradas
+        self.tipos: Dict[str, str] = {}
+        self.ajudas: Dict[str, str] = {}
+        self.buckets: Dict[str, Tuple[float, ...]] = {}
+        self._coletores: List[Callable[[], Iterable[Tuple[str, dict, float]]]] = []
+
+    # ========== Declaração ==========
+    def declarar(self, nome: str, tipo: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        self.tipos[nome] = tipo
+        self.ajudas[nome] = ajuda
+        if tipo == "histogram":
+            self.buckets[nome] = buckets
+
+    def coletor(self, funcao: Callable[[], Iterable[Tuple[str, dict, float]]]):
+        """Registra uma função que devolve (nome, rótulos, valor) no momento da coleta."""
+        self._coletores.append(funcao)
+        return funcao
+
+    # ========== Escrita (caminho da requisição) ==========
+    def _fragmento(self) -> _Fragmento:
+        fragmento = getattr(self._local, "fragmento", None)
+        if fragmento is None:
+            fragmento = self._local.fragmento = _Fragmento()
+            with self._lock:
+                self._fragmentos.append(fragmento)
+        return fragmento
+
+    def somar(self, nome: str, valor: float = 1.0, **rotulos):
+        """Incrementa um contador (ou um gauge, com valor negativo para decrementar)."""
+        valores = self._fragmento().valores
+        chave = (nome, _rotulos(rotulos))
+        valores[chave] = valores.get(chave, 0.0) + valor
+
+    def ajustar(self, nome: str, valor: float, **rotulos):
+        """
+        Soma `valor` a um gauge que vale só enquanto o processo existe (ex:
+        requisições em andamento). Publicado entre os instantâneos: o +1 de um
+        worker encerrado no meio de uma requisição não fica para sempre no total.
+        """
+        ajustes = self._fragmento().ajustes
+        chave = (nome, _rotulos(rotulos))
+        ajustes[chave] = ajustes.get(chave, 0.0) + valor
+
+    def observar(self, nome: str, valor: float, **rotulos):
+        """Registra uma observação em um histograma."""
+        histogramas = self._fragmento().histogramas
+        chave = (nome, _rotulos(rotulos))
+        dados = histogramas.get(chave)
+        if dados is None:
+            dados = histogramas[chave] = [[0] * (len(self.buckets[nome]) + 1), 0.0, 0]
+        dados[0][bisect_left(self.buckets[nome], valor)] += 1
+        dados[1] += valor
+        dados[2] += 1
+
+    # ========== Coleta ==========
+    def snapshot(self) -> dict:
+        """Soma os fragmentos de todas as threads em um snapshot serializável."""
+        with self._lock:
+            vivos = []
+            for fragmento in self._fragmentos:
+                if fragmento.thread.is_alive():
+                    vivos.append(fragmento)
+                else:
+                    _mesclar_fragmento(self._aposentado, fragmento)
+            self._fragmentos = vivos
+            fragmentos = [self._aposentado] + vivos
+
+        valores: Dict[str, float] = {}
+        histogramas: Dict[str, list] = {}
+        for fragmento in fragmentos:
+            for (nome, rotulos), valor in fragmento.valores.copy().items():
+                chave = json.dumps([nome, rotulos])
+                valores[chave] = valores.get(chave, 0.0) + valor
+            for (nome, rotulos), (contagens, soma, total) in fragmento.histogramas.copy().items():
+                _somar_histograma(histogramas, json.dumps([nome, rotulos]), list(contagens), soma, total)
+
+        instantaneos: Dict[str, float] = {}
+        for fragmento in fragmentos:
+            for (nome, rotulos), valor in fragmento.ajustes.copy().items():
+                chave = json.dumps([nome, rotulos])
+                instantaneos[chave] = instantaneos.get(chave, 0.0) + valor
+        for coletor in self._coletores:
+            try:
+                for nome, rotulos, valor in coletor():
+                    instantaneos[json.dumps([nome, _rotulos(rotulos)])] = valor
+            except Exception as e:
+                logger.warning("Falha em coletor de métricas: %s", e)
+
+        return {"pid": os.getpid(), "valores": valores, "histogramas": histogramas, "instantaneos": instantaneos}
+
+
+def _mesclar_fragmento(destino: _Fragmento, origem: _Fragmento):
+    for chave, valor in origem.valores.items():
+        destino.valores[chave] = destino.valores.get(chave, 0.0) + valor
+    for chave, valor in origem.ajustes.items():
+        destino.ajustes[chave] = destino.ajustes.get(chave, 0.0) + valor
+    for chave, (contagens, soma, total) in origem.histogramas.items():
+        atual = destino.histogramas.setdefault(chave, [[0] * len(contagens), 0.0, 0])
+        atual[0] = [a + b for a, b in zip(atual[0], contagens)]
+        atual[1] += soma
+        atual[2] += total
+
+
+def _somar_histograma(destino: Dict[str, list], chave: str, contagens: list, soma: float, total: int):
+    atual = destino.get(chave)
+    if atual is None:
+        destino[chave] = [contagens, soma, total]
+    else:
+        atual[0] = [a + b for a, b in zip(atual[0], contagens)]
+        atual[1] += soma
+        atual[2] += total
+
+
+def agregar(snapshots: List[dict]) -> dict:
+    """
+    Agrega snapshots de vários processos.
+
+    Contadores e histogramas são somados (inclusive de workers já encerrados,
+    para que os totais nunca diminuam); valores instantâneos (gauges como o
+    pool e as requisições em andamento) só são somados para processos vivos.
+    Por isso todo contador é registrado com somar(), nunca por um coletor.
+    """
+    total = {"valores": {}, "histogramas": {}, "instantaneos": {}}
+    for snapshot in snapshots:
+        for chave, valor in snapshot["valores"].items():
+            total["valores"][chave] = total["valores"].get(chave, 0.0) + valor
+        for chave, (contagens, soma, n) in snapshot["histogramas"].items():
+            _somar_histograma(total["histogramas"], chave, list(contagens), soma, n)
+        if _processo_vivo(snapshot["pid"]):
+            for chave, valor in snapshot["instantaneos"].items():
+                total["instantaneos"][chave] = total["instantaneos"].get(chave, 0.0) + valor
+    return total
+
+
+def _processo_vivo(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _formatar_rotulos(rotulos, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = [tuple(par) for par in rotulos] + ([extra] if extra else [])
+    if not pares:
+        return ""
+    texto = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pares)
+    return "{" + texto + "}"
+
+
+def exposicao(registro: Registro, dados: dict) -> str:
+    """Gera o texto no formato de exposição do Prometheus (versão 0.0.4)."""
+    por_nome: Dict[str, List[str]] = {}
+
+    for origem in ("valores", "instantaneos"):
+        for chave, valor in sorted(dados[origem].items()):
+            nome, rotulos = json.loads(chave)
+            por_nome.setdefault(nome, []).append(f"{nome}{_formatar_rotulos(rotulos)} {valor:g}")
+
+    for chave, (contagens, soma, total) in sorted(dados["histogramas"].items()):
+        nome, rotulos = json.loads(chave)
+        linhas = por_nome.setdefault(nome, [])
+        acumulado = 0
+        for limite, contagem in zip(registro.buckets[nome] + (float("inf"),), contagens):
+            acumulado += contagem
+            le = "+Inf" if limite == float("inf") else f"{limite:g}"
+            linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, ('le', le))} {acumulado}")
+        linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {soma:g}")
+        linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {total}")
+
+    saida = []
+    for nome in sorted(por_nome):
+        saida.append(f"# HELP {nome} {registro.ajudas.get(nome, nome)}")
+        saida.append(f"# TYPE {nome} {registro.tipos.get(nome, 'untyped')}")
+        saida.extend(por_nome[nome])
+    return "\n".join(saida) + "\n"
+
+
+# ========== Persistência entre workers ==========
+class _Exportador:
+    """Grava o snapshot deste processo em METRICAS_DIR no máximo a cada METRICAS_INTERVALO segundos."""
+
+    def __init__(self, registro: Registro, diretorio: str):
+        self.registro = registro
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        self._ultimo = 0.0
+        os.makedirs(diretorio, exist_ok=True)
+
+    def talvez_gravar(self):
+        if time.monotonic() - self._ultimo < METRICAS_INTERVALO:
+            return
+        # Apenas uma thread grava; as demais seguem sem esperar
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.gravar()
+        finally:
+            self._lock.release()
+
+    def gravar(self) -> dict:
+        snapshot = self.registro.snapshot()
+        caminho = os.path.join(self.diretorio, f"metricas_{snapshot['pid']}.json")
+        temporario = caminho + ".tmp"
+        with open(temporario, "w") as arquivo:
+            json.dump(snapshot, arquivo)
+        os.replace(temporario, caminho)
+        self._ultimo = time.monotonic()
+        return snapshot
+
+    def ler_todos(self) -> List[dict]:
+        proprio = self.gravar()
+        snapshots = [proprio]
+        for caminho in glob.glob(os.path.join(self.diretorio, "metricas_*.json")):
+            if caminho.endswith(f"metricas_{proprio['pid']}.json"):
+                continue
+            try:
+                with open(caminho) as arquivo:
+                    snapshots.append(json.load(arquivo))
+            except (OSError, ValueError) as e:
+                logger.warning("Snapshot de métricas ilegível (%s): %s", caminho, e)
+        return snapshots
+
+
+# Registro compartilhado pela aplicação
+registro = Registro()
+registro.declarar("http_requisicoes_total", "counter", "Requisições HTTP atendidas, por método, rota e status.")
+registro.declarar("http_requisicao_duracao_segundos", "histogram", "Latência das requisições HTTP, por método e rota.")
+registro.declarar("http_requisicoes_em_andamento", "gauge", "Requisições HTTP sendo processadas.")
+registro.declarar("sqlalchemy_pool_conexoes", "gauge", "Conexões do pool do SQLAlchemy, por estado.")
+registro.declarar("cambio_cache_total", "counter", "Uso do cache de câmbio, por resultado (acerto, consulta, obsoleta).")
+registro.declarar("cambio_cache_taxa_acerto", "gauge", "Fração das obtenções de câmbio atendidas pelo cache.")
+registro.declarar("cambio_api_requisicoes_total", "counter", "Chamadas HTTP à API de câmbio, por resultado.")
+registro.declarar("cambio_api_duracao_segundos", "histogram", "Latência das chamadas à API de câmbio.")
+registro.declarar("cambio_api_disjuntor_aberto", "gauge", "1 quando o disjuntor da API de câmbio está aberto.")
+registro.declarar("eventos_conexoes", "gauge", "Clientes conectados a GET /eventos.")
+registro.declarar("eventos_enviados_total", "counter", "Eventos enviados aos clientes de GET /eventos.")
+registro.declarar("eventos_clientes_descartados_total", "counter", "Clientes de eventos desconectados por encher a fila.")
+registro.declarar("idempotencia_respostas_reproduzidas_total", "counter",
+                  "Repetições de POST com Idempotency-Key atendidas pela resposta guardada.")
+registro.declarar("idempotencia_esperas_total", "counter",
+                  "Repetições que aguardaram a primeira requisição com a mesma chave.")
+registro.declarar("idempotencia_em_andamento_total", "counter",
+                  "Repetições recusadas com 409 porque a primeira requisição não terminou durante a espera.")
+registro.declarar("admissao_espera_segundos", "histogram",
+                  "Tempo na fila do controle de admissão até a requisição ser atendida, por classe.",
+                  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0))
+registro.declarar("admissao_rejeicoes_total", "counter",
+                  "Requisições recusadas pelo controle de admissão, por classe e motivo (taxa, fila, espera).")
+registro.declarar("admissao_em_andamento", "gauge", "Requisições admitidas e em execução, por classe.")
+registro.declarar("admissao_fila", "gauge", "Requisições aguardando na fila do controle de admissão, por classe.")
+
+
+_engine = None  # engine do pool observado (o da aplicação criada por último)
+
+
+def _observar_api_cambio(duracao: float, falhou: bool):
+    registro.somar("cambio_api_requisicoes_total", resultado="erro" if falhou else "sucesso")
+    registro.observar("cambio_api_duracao_segundos", duracao)
+
+
+def _observar_cache_cambio(resultado: str):
+    registro.somar("cambio_cache_total", resultado=resultado)
+
+
+def _observar_eventos(ocorrencia: str):
+    registro.somar("eventos_enviados_total" if ocorrencia == "enviado" else "eventos_clientes_descartados_total")
+
+
+_METRICAS_IDEMPOTENCIA = {
+    "reproduzida": "idempotencia_respostas_reproduzidas_total",
+    "aguardada": "idempotencia_esperas_total",
+    "em_andamento": "idempotencia_em_andamento_total",
+}
+
+
+def _observar_idempotencia(ocorrencia: str):
+    registro.somar(_METRICAS_IDEMPOTENCIA[ocorrencia])
+
+
+def _coletar_instantaneos():
+    """Gauges do processo; os contadores vêm dos observadores acima (ver agregar)."""
+    from service.cambio import cache_cambio
+    from service.cliente_cambio import cliente_cambio
+    from service.eventos import difusor
+    from middleware.admissao import controle
+
+    estatisticas = cache_cambio.estatisticas()
+    obtencoes = estatisticas["acertos"] + estatisticas["consultas"]
+    yield "cambio_cache_taxa_acerto", {}, estatisticas["acertos"] / obtencoes if obtencoes else 0.0
+    yield "cambio_api_disjuntor_aberto", {}, 1.0 if cliente_cambio.disjuntor.estado == "aberto" else 0.0
+
+    yield "eventos_conexoes", {}, difusor.estatisticas()["conexoes"]
+
+    for classe, compartimento in controle.estatisticas().items():
+        yield "admissao_em_andamento", {"classe": classe}, compartimento["em_andamento"]
+        yield "admissao_fila", {"classe": classe}, compartimento["na_fila"]
+
+    pool = _engine.pool if _engine is not None else None
+    if pool is not None and hasattr(pool, "checkedout"):
+        yield "sqlalchemy_pool_conexoes", {"estado": "em_uso"}, pool.checkedout()
+        yield "sqlalchemy_pool_conexoes", {"estado": "ociosas"}, pool.checkedin()
+        yield "sqlalchemy_pool_conexoes", {"estado": "overflow"}, max(0, pool.overflow())
+
+
+def init_app(app: Flask, engine=None):
+    """Registra a coleta de métricas das requisições e a rota GET /metrics."""
+    from service.cambio import cache_cambio
+    from service.cliente_cambio import cliente_cambio
+    from service.eventos import difusor
+    from service.idempotencia import idempotencia
+    global _engine
+
+    exportador = _Exportador(registro, METRICAS_DIR) if METRICAS_DIR else None
+
+    # O registro é do processo: observador e coletor entram uma única vez,
+    # mesmo que create_app seja chamado mais de uma vez (ex: testes)
+    _engine = engine
+    for servico, observador in ((cliente_cambio, _observar_api_cambio), (cache_cambio, _observar_cache_cambio),
+                                (difusor, _observar_eventos), (idempotencia, _observar_idempotencia)):
+        if observador not in servico.observadores:
+            servico.observadores.append(observador)
+    if _coletar_instantaneos not in registro._coletores:
+        registro.coletor(_coletar_instantaneos)
+
+    @app.before_request
+    def iniciar_metricas():
+        g.metricas_inicio = time.perf_counter()
+        registro.ajustar("http_requisicoes_em_andamento", 1)
+
+    @app.after_request
+    def registrar_metricas(response):
+        inicio = g.pop("metricas_inicio", None)
+        if inicio is None:
+            return response
+        rota = request.url_rule.rule if request.url_rule else "<nao_encontrada>"
+        registro.somar("http_requisicoes_total", metodo=request.method, rota=rota, status=response.status_code)
+        registro.observar("http_requisicao_duracao_segundos", time.perf_counter() - inicio,
+                          metodo=request.method, rota=rota)
+        return response
+
+    @app.teardown_request
+    def encerrar_metricas(exc):
+        registro.ajustar("http_requisicoes_em_andamento", -1)
+        if exportador is not None:
+            exportador.talvez_gravar()
+
+    @app.route("/metrics", methods=["GET"])
+    def metricas():
+        """Métricas da aplicação no formato de exposição do Prometheus."""
+        if exportador is not None:
+            dados = agregar(exportador.ler_todos())
+        else:
+            dados = registro.snapshot()
+        return Response(exposicao(registro, dados), mimetype="text/plain; version=0.0.4")
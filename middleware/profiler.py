@@ -0,0 +1,143 @@
+import cProfile
+import glob
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import Flask, g, jsonify, request
+
+from logger import logger, log_path
+from middleware.admin import exigir_admin, token_valido
+
+# ==============================================
+# Middleware: Profiler sob Demanda
+# ==============================================
+# Executa o cProfile em requisições escolhidas: as que trazem o cabeçalho
+# X-Profile com o valor de PROFILER_TOKEN, ou uma fração aleatória definida
+# por PROFILER_AMOSTRAGEM (0 a 1). Cada perfil é salvo como arquivo .prof
+# (formato do pstats, abre no snakeviz) em log/profiles/, mantendo apenas os
+# PROFILER_MAX_ARQUIVOS mais recentes. Fora dessas requisições o custo é uma
+# comparação de cabeçalho.
+# ==============================================
+
+PROFILER_DIR = os.getenv("PROFILER_DIR", os.path.join(log_path, "profiles"))
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILER_AMOSTRAGEM = float(os.getenv("PROFILER_AMOSTRAGEM", "0"))
+PROFILER_MAX_ARQUIVOS = int(os.getenv("PROFILER_MAX_ARQUIVOS", "50"))
+
+CABECALHO = "X-Profile"
+
+# Só uma requisição é perfilada por vez em cada processo: perfis simultâneos
+# dobrariam o custo e disputariam o mesmo arquivo de saída.
+_em_uso = threading.Lock()
+_gravacao = threading.Lock()
+
+
+def _deve_perfilar() -> bool:
+    if request.path.startswith("/admin"):
+        return False
+    if PROFILER_TOKEN and token_valido(request.headers.get(CABECALHO, ""), PROFILER_TOKEN):
+        return True
+    return PROFILER_AMOSTRAGEM > 0 and random.random() < PROFILER_AMOSTRAGEM
+
+
+def _nome_arquivo(rota: str) -> str:
+    momento = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    rota = re.sub(r"[^A-Za-z0-9]+", "-", rota).strip("-") or "raiz"
+    # O ID pode vir do cliente (X-Request-ID): só caracteres seguros no nome do arquivo
+    request_id = re.sub(r"[^A-Za-z0-9-]+", "", g.get("request_id", ""))[:64] or "-"
+    return f"{momento}_{request.method}_{rota}_{request_id}.prof"
+
+
+def salvar(profiler: cProfile.Profile, nome: str) -> str:
+    """Grava o perfil em PROFILER_DIR e remove os mais antigos além do limite."""
+    os.makedirs(PROFILER_DIR, exist_ok=True)
+    caminho = os.path.join(PROFILER_DIR, nome)
+    profiler.dump_stats(caminho)
+    with _gravacao:
+        arquivos = sorted(glob.glob(os.path.join(PROFILER_DIR, "*.prof")))
+        for antigo in arquivos[:max(0, len(arquivos) - PROFILER_MAX_ARQUIVOS)]:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+    return caminho
+
+
+def resumir(caminho: str, top: int = 10) -> dict:
+    """Lê um arquivo .prof e devolve as `top` funções com mais tempo próprio."""
+    stats = pstats.Stats(caminho)
+    funcoes = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    momento, metodo, rota, request_id = (os.path.basename(caminho)[:-len(".prof")].split("_", 3) + ["-"] * 4)[:4]
+    return {
+        "arquivo": os.path.basename(caminho),
+        "criado_em": datetime.strptime(momento, "%Y%m%dT%H%M%S%f").isoformat(timespec="seconds"),
+        "metodo": metodo,
+        "rota": rota,
+        "request_id": request_id,
+        "tempo_total_ms": round(stats.total_tt * 1000, 2),
+        "funcoes": [
+            {
+                "funcao": f"{arquivo}:{linha}({nome})",
+                "chamadas": chamadas_totais,
+                "tempo_proprio_ms": round(tempo_proprio * 1000, 3),
+                "tempo_acumulado_ms": round(tempo_acumulado * 1000, 3),
+            }
+            for (arquivo, linha, nome), (_, chamadas_totais, tempo_proprio, tempo_acumulado, _) in funcoes
+        ],
+    }
+
+
+def init_app(app: Flask):
+    """Registra os hooks do profiler e a rota GET /admin/profiles."""
+
+    @app.before_request
+    def iniciar_profiler():
+        if not _deve_perfilar() or not _em_uso.acquire(blocking=False):
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler_inicio = time.perf_counter()
+        g.profiler.enable()
+
+    @app.after_request
+    def salvar_profiler(response):
+        profiler = g.get("profiler")
+        if profiler is None:
+            return response
+        profiler.disable()
+        rota = request.url_rule.rule if request.url_rule else request.path
+        try:
+            caminho = salvar(profiler, _nome_arquivo(rota))
+        except OSError as e:
+            logger.warning("Não foi possível salvar o perfil da requisição: %s", e)
+        else:
+            response.headers["X-Profile-Arquivo"] = os.path.basename(caminho)
+            logger.info("Perfil de %s %s salvo em %s (%.2f ms).", request.method, rota, caminho,
+                        (time.perf_counter() - g.profiler_inicio) * 1000)
+        return response
+
+    @app.teardown_request
+    def liberar_profiler(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _em_uso.release()
+
+    @app.route("/admin/profiles", methods=["GET"])
+    @exigir_admin
+    def listar_profiles():
+        """Lista os perfis mais recentes com as funções de maior tempo próprio."""
+        limite = request.args.get("limite", 10, type=int)
+        top = request.args.get("top", 10, type=int)
+        arquivos = sorted(glob.glob(os.path.join(PROFILER_DIR, "*.prof")), reverse=True)[:max(0, limite)]
+        perfis = []
+        for caminho in arquivos:
+            try:
+                perfis.append(resumir(caminho, top))
+            except (OSError, ValueError, TypeError, EOFError) as e:
+                logger.warning("Perfil ilegível (%s): %s", caminho, e)
+        return jsonify({"diretorio": PROFILER_DIR, "perfis": perfis}), 200
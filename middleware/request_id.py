@@ -0,0 +1,36 @@
+import uuid
+
+from flask import Flask, g, request
+
+from logger import request_id_atual
+
+# ==============================================
+# Middleware: ID da Requisição
+# ==============================================
+# Cada requisição recebe um identificador (o do cabeçalho X-Request-ID, se o
+# cliente ou o balanceador enviar, ou um novo UUID). Ele é anexado a todos os
+# registros de log da requisição e devolvido no cabeçalho da resposta.
+# ==============================================
+
+CABECALHO = "X-Request-ID"
+
+
+def init_app(app: Flask):
+    """Registra os hooks de ID da requisição na aplicação."""
+
+    @app.before_request
+    def definir_request_id():
+        g.request_id = request.headers.get(CABECALHO) or uuid.uuid4().hex
+        g._request_id_token = request_id_atual.set(g.request_id)
+
+    @app.after_request
+    def devolver_request_id(response):
+        if "request_id" in g:
+            response.headers[CABECALHO] = g.request_id
+        return response
+
+    @app.teardown_request
+    def limpar_request_id(exc):
+        token = g.pop("_request_id_token", None)
+        if token is not None:
+            request_id_atual.reset(token)
@@ -1,36 +1,107 @@
 import os
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy_utils import database_exists, create_database
 
 # Importando as classes de modelo
 from model.base import Base
 from model.projeto import Projeto
 from model.historico import Historico
-from model.recurso import Recurso  
+from model.recurso import Recurso
+from model.taxa_cambio import TaxaCambio
+from model.cotacao_diaria import CotacaoDiaria
+from model.cobertura_serie import CoberturaSerie
+from model.alteracao import Alteracao
+from model.idempotencia import ChaveIdempotencia
+
+# ==============================================
+# Banco de dados: engine sob demanda, criação explícita
+# ==============================================
+# Importar este pacote não toca no disco: o engine só é criado por
+# configurar_banco() (chamado pelo create_app) ou no primeiro acesso a
+# `model.engine`, e ele só abre conexões na primeira consulta. A criação do
+# diretório, do banco e das tabelas fica em init_db(), executado uma vez pelo
+# comando `flask init-db`, pelo mestre do gunicorn ou pelo startup do ASGI.
+# ==============================================
 
 # Definindo o caminho do banco de dados
 db_path = "database/"
 
-# Criando o diretório para armazenar o banco de dados, caso não exista
-if not os.path.exists(db_path):
-    os.makedirs(db_path)
+# Definindo a URL de conexão com o banco de dados (SQLite por padrão)
+db_url = os.getenv("DATABASE_URL", f"sqlite:///{db_path}/db.sqlite3")
+
+# Criando a fábrica de sessões (ligada ao engine em configurar_banco)
+Session = sessionmaker()
+
+_engine: Optional[Engine] = None
+
+
+def configurar_banco(url: Optional[str] = None) -> Engine:
+    """
+    Cria o engine de `url` (padrão: DATABASE_URL) e liga a fábrica de sessões a ele.
+
+    Não abre conexão. Chamadas seguintes com a mesma URL devolvem o mesmo engine.
+    (os comandos SQL são registrados pelo logger 'sqlalchemy.engine', configurável via LOG_SQL)
+    """
+    global _engine
+    url = url or db_url
+    if _engine is None or _engine.url.render_as_string(hide_password=False) != url:
+        _engine = create_engine(url)
+        Session.configure(bind=_engine)
+    return _engine
+
 
-# Definindo a URL de conexão com o banco de dados SQLite
-db_url = f"sqlite:///{db_path}/db.sqlite3"
+def init_db(engine: Optional[Engine] = None):
+    """Cria o diretório do SQLite, o banco (se o servidor permitir) e as tabelas e colunas que ainda não existem."""
+    engine = engine or (_engine if _engine is not None else configurar_banco())
+    if engine.url.get_backend_name() == "sqlite":
+        diretorio = os.path.dirname(engine.url.database or "")
+        if diretorio and not os.path.exists(diretorio):
+            os.makedirs(diretorio)
+    else:
+        # Importado só aqui: o sqlalchemy_utils pesa ~45 ms no import e só é útil nesse momento
+        from sqlalchemy_utils import database_exists, create_database
+        if not database_exists(engine.url):
+            create_database(engine.url)
 
-# Criando o engine de conexão com o banco de dados
-engine = create_engine(db_url, echo=True)
+    # Criando as tabelas no banco de dados, se ainda não existirem
+    Base.metadata.create_all(engine)
+    _adicionar_colunas_novas(engine)
 
-# Verificando se o banco de dados já existe, caso contrário, criando-o
-if not database_exists(engine.url):
-    create_database(engine.url)
 
-# Criando as tabelas no banco de dados, se ainda não existirem
-Base.metadata.create_all(engine)
+def _adicionar_colunas_novas(engine: Engine):
+    """
+    Migração mínima para bancos criados por versões anteriores: adiciona as
+    colunas que faltam nas tabelas existentes (preenchendo as linhas com o
+    default da coluna) e os índices que ainda não existem.
+    """
+    existentes = inspect(engine)
+    with engine.begin() as conexao:
+        for tabela in Base.metadata.sorted_tables:
+            colunas = {coluna["name"] for coluna in existentes.get_columns(tabela.name)}
+            indices = {indice["name"] for indice in existentes.get_indexes(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in colunas:
+                    continue
+                tipo = coluna.type.compile(dialect=engine.dialect)
+                padrao = coluna.server_default.arg if coluna.server_default is not None else None
+                if isinstance(padrao, str):
+                    # O default do banco também preenche as linhas existentes e as inserções por SQL direto
+                    conexao.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo} DEFAULT {padrao}"))
+                    continue
+                conexao.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}"))
+                if coluna.default is not None:
+                    valor = coluna.default.arg(None) if coluna.default.is_callable else coluna.default.arg
+                    conexao.execute(tabela.update().values({coluna.name: valor}))
+            for indice in tabela.indexes:
+                if indice.name not in indices:
+                    indice.create(conexao)
 
-# Criando a fábrica de sessões
-Session = sessionmaker(bind=engine)
 
-# Opcional: criando uma sessão para uso imediato (em testes)
-# session = Session()
+def __getattr__(nome: str):
+    # `from model import engine` continua funcionando: cria o engine no primeiro acesso
+    if nome == "engine":
+        return configurar_banco() if _engine is None else _engine
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
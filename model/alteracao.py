@@ -0,0 +1,157 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from model.base import Base
+from model.historico import Historico
+from model.projeto import Projeto
+from model.recurso import Recurso
+
+# ==============================================
+# Modelo: Alteracao (registro de alterações)
+# ==============================================
+# Uma linha por alteração em projeto, recurso, histórico ou vínculo
+# projeto ↔ recurso. O `id` (AUTOINCREMENT, nunca reutilizado) é a sequência
+# global usada como cursor da sincronização incremental (?since=); as linhas
+# com operacao 'removido' são as lápides dos registros excluídos.
+#
+# Mantido pelos eventos de flush de *toda* sessão do SQLAlchemy, e não pelas
+# rotas: qualquer caminho de escrita pelo ORM (rotas, scripts, testes)
+# atualiza `data_atualizacao` e grava o registro na mesma transação.
+# ==============================================
+
+CRIADO, ATUALIZADO, REMOVIDO = "criado", "atualizado", "removido"
+
+
+class Alteracao(Base):
+    __tablename__ = "alteracao"
+
+    # ========== Colunas ==========
+    id = Column(Integer, primary_key=True)  # Sequência global (cursor)
+    tabela = Column(String(30), nullable=False)  # projeto, recurso, historico ou projeto_recurso
+    registro_id = Column(Integer, nullable=False)  # ID do registro alterado (no vínculo, o do projeto)
+    operacao = Column(String(10), nullable=False)  # criado, atualizado ou removido
+    momento = Column(DateTime, nullable=False, default=datetime.now)  # Data e hora da alteração
+    dados = Column(Text, nullable=True)  # JSON compacto com as chaves relacionadas (ex: recurso_id do vínculo)
+
+    __table_args__ = (
+        Index("ix_alteracao_tabela_id", "tabela", "id"),
+        Index("ix_alteracao_tabela_momento", "tabela", "momento"),
+        {"sqlite_autoincrement": True},
+    )
+
+    def __repr__(self):
+        return f"<Alteracao(id={self.id}, tabela={self.tabela}, registro_id={self.registro_id}, operacao={self.operacao})>"
+
+
+# ========== Rastreamento pelos eventos de flush ==========
+_TABELAS = {Projeto: "projeto", Recurso: "recurso", Historico: "historico"}
+_PENDENTES = "alteracoes_pendentes"
+GRAVADAS = "alteracoes_gravadas"  # marcado na sessão até o commit (service/eventos.py avisa os assinantes)
+
+
+@event.listens_for(Session, "before_flush")
+def _antes_do_flush(session: Session, contexto, instancias):
+    """Atualiza `data_atualizacao` e anota as alterações (os IDs novos só existem após o flush)."""
+    agora = datetime.now()
+    pendentes = []  # (objeto, tabela, operacao, objeto relacionado)
+    anotados = {}  # objeto -> operacao; cada objeto entra uma única vez por flush
+
+    tocados = []  # projetos e recursos alterados só por meio de outro registro
+
+    def anotar(obj, operacao, direto=True):
+        if obj in anotados:
+            return
+        anotados[obj] = operacao
+        if operacao != REMOVIDO and isinstance(obj, (Projeto, Recurso)):
+            if direto:
+                obj.data_atualizacao = agora
+            else:
+                tocados.append(obj)
+        pendentes.append((obj, _TABELAS[type(obj)], operacao, None))
+
+    def tocar(obj):
+        """Marca como atualizado um registro cuja representação mudou por causa de outro."""
+        if obj is not None and obj not in session.new and obj not in session.deleted:
+            anotar(obj, ATUALIZADO, direto=False)
+
+    with session.no_autoflush:
+        for obj in list(session.new):
+            if type(obj) in _TABELAS:
+                anotar(obj, CRIADO)
+        for obj in list(session.deleted):
+            if type(obj) in _TABELAS:
+                anotar(obj, REMOVIDO)
+        for obj in list(session.dirty):
+            if type(obj) in _TABELAS and session.is_modified(obj, include_collections=False):
+                anotar(obj, ATUALIZADO)
+
+        # O histórico faz parte da representação do projeto em GET /projetos
+        for obj in list(anotados):
+            if isinstance(obj, Historico):
+                tocar(obj.projeto or session.get(Projeto, obj.projeto_id))
+
+        # Vínculos projeto ↔ recurso: os dois lados do relacionamento mudam
+        # juntos, então cada par é anotado uma vez, a partir de qualquer lado
+        vinculos = {}
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, (Projeto, Recurso)):
+                continue
+            historico = inspect(obj).attrs["recursos" if isinstance(obj, Projeto) else "projetos"].history
+            for outro, operacao in ([(o, CRIADO) for o in historico.added or ()] +
+                                    [(o, REMOVIDO) for o in historico.deleted or ()]):
+                vinculos[(obj, outro) if isinstance(obj, Projeto) else (outro, obj)] = operacao
+        for obj in list(session.deleted):
+            # A exclusão de um projeto apaga também os seus vínculos
+            if isinstance(obj, Projeto):
+                for recurso in obj.recursos:
+                    vinculos[(obj, recurso)] = REMOVIDO
+
+    for (projeto, recurso), operacao in vinculos.items():
+        pendentes.append((projeto, "projeto_recurso", operacao, recurso))
+        tocar(projeto)
+        tocar(recurso)
+
+    session.info[_PENDENTES] = (agora, pendentes, tocados)
+
+
+@event.listens_for(Session, "after_flush")
+def _depois_do_flush(session: Session, contexto):
+    """Grava as alterações anotadas, já com os IDs, na mesma transação do flush."""
+    agora, pendentes, tocados = session.info.pop(_PENDENTES, (None, [], []))
+
+    # Um histórico ou vínculo novo muda a data de atualização do projeto (e do
+    # recurso), mas não a versão dos seus campos: o UPDATE é feito fora do ORM,
+    # sem a condição de versão, para não gerar conflito entre inclusões simultâneas
+    for modelo in (Projeto, Recurso):
+        ids = [obj.id for obj in tocados if isinstance(obj, modelo)]
+        if ids:
+            tabela = modelo.__table__
+            session.connection().execute(tabela.update().where(tabela.c.id.in_(ids)).values(data_atualizacao=agora))
+    for obj in tocados:
+        set_committed_value(obj, "data_atualizacao", agora)
+
+    linhas = []
+    for obj, tabela, operacao, relacionado in pendentes:
+        if tabela == "projeto_recurso":
+            dados = {"recurso_id": relacionado.id}
+        elif tabela == "historico":
+            dados = {"projeto_id": int(obj.projeto_id)}
+        else:
+            dados = None
+        linhas.append({
+            "tabela": tabela, "registro_id": obj.id, "operacao": operacao, "momento": agora,
+            "dados": json.dumps(dados, separators=(",", ":")) if dados else None,
+        })
+    if linhas:
+        session.connection().execute(Alteracao.__table__.insert(), linhas)
+        session.info[GRAVADAS] = True
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _depois_do_rollback(session: Session, transacao):
+    session.info.pop(_PENDENTES, None)
+    session.info.pop(GRAVADAS, None)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Date
+from model.base import Base
+
+# ==============================================
+# Modelo: CoberturaSerie
+# ==============================================
+# Períodos já baixados da série histórica do BCE (ver
+# service/serie_cambio.py), uma linha por consulta por intervalo à API. Como
+# fins de semana e feriados não têm publicação, as datas de 'cotacao_diaria'
+# não dizem o que já foi consultado: só estes períodos dizem. Workers
+# diferentes podem baixar trechos distantes; o intervalo entre eles continua
+# descoberto até ser baixado.
+# ==============================================
+
+class CoberturaSerie(Base):
+    __tablename__ = "cobertura_serie"  # Nome da tabela no banco de dados
+
+    # ========== Colunas ==========
+    inicio = Column(Date, primary_key=True)  # Primeiro dia consultado
+    fim = Column(Date, primary_key=True)  # Último dia consultado (nunca o dia corrente)
+
+    # ========== Representação ==========
+    def __repr__(self):
+        """Representação do objeto para debug e logs."""
+        return f"<CoberturaSerie(inicio={self.inicio}, fim={self.fim})>"
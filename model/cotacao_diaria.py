@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Float, Date
+from model.base import Base
+
+# ==============================================
+# Modelo: CotacaoDiaria
+# ==============================================
+# Série histórica das taxas diárias publicadas pelo BCE, sempre na base EUR.
+# A chave primária (data, moeda) serve de índice para as consultas por
+# período; qualquer par de moedas é obtido por taxa cruzada.
+# ==============================================
+
+class CotacaoDiaria(Base):
+    __tablename__ = "cotacao_diaria"  # Nome da tabela no banco de dados
+
+    # ========== Colunas ==========
+    data = Column(Date, primary_key=True)  # Dia útil da publicação do BCE
+    moeda = Column(String(3), primary_key=True)  # Moeda cotada (ex: USD)
+    taxa = Column(Float, nullable=False)  # Quanto 1 EUR vale na moeda cotada
+
+    # ========== Representação ==========
+    def __repr__(self):
+        """Representação do objeto para debug e logs."""
+        return f"<CotacaoDiaria(data={self.data}, moeda={self.moeda}, taxa={self.taxa})>"
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from model.base import Base
+
+# ==============================================
+# Modelo: ChaveIdempotencia
+# ==============================================
+# Uma linha por cabeçalho Idempotency-Key recebido nas rotas POST que
+# aceitam repetição (ver service/idempotencia.py). Enquanto a primeira
+# requisição com a chave está em andamento, `status` é nulo; depois guarda a
+# resposta, que é reproduzida para as repetições sem tocar nas tabelas do
+# domínio. As linhas são descartadas após IDEMPOTENCIA_RETENCAO_HORAS.
+# ==============================================
+
+
+class ChaveIdempotencia(Base):
+    __tablename__ = "idempotencia"
+
+    # ========== Colunas ==========
+    rota = Column(String(50), primary_key=True)  # Rota da requisição (a mesma chave vale em rotas diferentes)
+    chave = Column(String(255), primary_key=True)  # Valor do cabeçalho Idempotency-Key
+    impressao = Column(String(64), nullable=False)  # SHA-256 da requisição (parâmetros e corpo)
+    status = Column(Integer, nullable=True)  # Status da resposta; nulo enquanto a requisição está em andamento
+    corpo = Column(Text, nullable=True)  # Corpo da resposta (JSON)
+    criado_em = Column(DateTime, nullable=False, default=datetime.now)  # Início da primeira requisição
+
+    __table_args__ = (
+        Index("ix_idempotencia_criado_em", "criado_em"),
+    )
+
+    def __repr__(self):
+        return f"<ChaveIdempotencia(rota={self.rota}, chave={self.chave}, status={self.status})>"
@@ -29,6 +29,8 @@ class Projeto(Base):
     custo = Column(Float, nullable=False)  # Custo financeiro do projeto
     status = Column(String(50), nullable=False)  # Status atual
     data_registro = Column(DateTime, default=datetime.now)  # Data de criação
+    data_atualizacao = Column(DateTime, default=datetime.now, index=True)  # Última alteração (mantida pelo model/alteracao.py)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")  # Versão dos campos (controle de concorrência otimista)
 
     # ========== Relacionamentos ==========
     # Histórico de alterações do projeto
@@ -37,6 +39,10 @@ class Projeto(Base):
     # Recursos vinculados ao projeto (N:N)
     recursos = relationship("Recurso", secondary=projeto_recurso, back_populates="projetos")
 
+    # Todo UPDATE do ORM vira "UPDATE ... WHERE id = ? AND versao = ?" e incrementa a versão;
+    # se outra transação alterou o projeto antes, nenhuma linha casa e o flush levanta StaleDataError
+    __mapper_args__ = {"version_id_col": versao}
+
     # ========== Construtor ==========
     def __init__(self, nome: str, sigla: str, descricao: str, tipo: str, custo: float, status: str, data_registro: Union[DateTime, None] = None):
         """
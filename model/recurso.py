@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.orm import relationship
 from model.base import Base
 from model.projeto_recurso import projeto_recurso
@@ -18,11 +20,16 @@ class Recurso(Base):
     nome = Column(String(100), nullable=False)  # Nome completo do recurso
     papel = Column(String(50), nullable=False)  # Papel ou função (ex: Dev, Analista, QA)
     alocacao = Column(String(50), nullable=True)  # Tipo de alocação (ex: 100%, parcial, 20h semanais)
+    data_atualizacao = Column(DateTime, default=datetime.now, index=True)  # Última alteração (mantida pelo model/alteracao.py)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")  # Versão dos campos (controle de concorrência otimista)
 
     # ========== Relacionamentos ==========
     # Relacionamento N:N com projetos através da tabela associativa 'projeto_recurso'
     projetos = relationship("Projeto", secondary=projeto_recurso, back_populates="recursos")
 
+    # UPDATE condicional à versão lida (ver model/projeto.py)
+    __mapper_args__ = {"version_id_col": versao}
+
     # ========== Representação (opcional) ==========
     def __repr__(self):
         """
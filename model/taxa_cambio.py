@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Float, Date, DateTime
+from model.base import Base
+
+# ==============================================
+# Modelo: TaxaCambio
+# ==============================================
+# Guarda a última tabela de câmbio obtida da API externa (Frankfurter/BCE),
+# uma linha por par (moeda base, moeda cotada). Permite que reinícios da
+# aplicação e outros workers reaproveitem as taxas sem consultar a API.
+# ==============================================
+
+class TaxaCambio(Base):
+    __tablename__ = "taxa_cambio"  # Nome da tabela no banco de dados
+
+    # ========== Colunas ==========
+    base = Column(String(3), primary_key=True)  # Moeda de origem da tabela (ex: BRL)
+    moeda = Column(String(3), primary_key=True)  # Moeda cotada (ex: USD)
+    taxa = Column(Float, nullable=False)  # Quanto 1 unidade da base vale na moeda cotada
+    data_cotacao = Column(Date, nullable=False)  # Data de referência publicada pelo BCE
+    obtido_em = Column(DateTime, nullable=False)  # Momento (UTC) em que a tabela foi consultada
+
+    # ========== Representação ==========
+    def __repr__(self):
+        """Representação do objeto para debug e logs."""
+        return f"<TaxaCambio(base={self.base}, moeda={self.moeda}, taxa={self.taxa}, data_cotacao={self.data_cotacao})>"
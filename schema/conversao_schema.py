@@ -0,0 +1,51 @@
+from pydantic import BaseModel, conlist
+from typing import List, Optional
+from datetime import date
+
+# Limite de conversões por requisição, para manter o tempo de resposta previsível
+MAX_ITENS_LOTE = 1000
+
+
+class ConversaoItemSchema(BaseModel):
+    """
+    Uma conversão individual dentro de um lote.
+
+    Quando 'de' ou 'para' não são informados, valem as moedas padrão do lote.
+    Permite taxas cruzadas entre duas moedas que não são a base (ex: USD → EUR).
+    """
+    valor: float = 1000.0  # Valor a ser convertido
+    de: Optional[str] = None  # Moeda de origem (padrão: 'de' do lote)
+    para: Optional[str] = None  # Moeda de destino (padrão: primeira de 'para' do lote)
+
+
+class ConversaoLoteSchema(BaseModel):
+    """
+    Schema para converter vários valores em uma única requisição.
+
+    Cada valor de 'valores' é convertido de 'de' para cada moeda de 'para';
+    os 'itens' permitem conversões com moedas próprias. Todas as conversões
+    usam uma única tabela de câmbio (a da moeda 'de').
+    """
+    de: str = "BRL"  # Moeda de origem padrão e base da tabela de câmbio
+    para: conlist(str, min_items=1, max_items=50) = ["USD"]  # Moedas de destino
+    valores: conlist(float, max_items=MAX_ITENS_LOTE) = [69000.0, 55000.0]  # Valores em 'de'
+    itens: conlist(ConversaoItemSchema, max_items=MAX_ITENS_LOTE) = []  # Conversões individuais
+
+
+class ConversaoResultadoSchema(BaseModel):
+    """Resultado de uma conversão do lote."""
+    valor_original: float
+    de: str
+    para: str
+    valor_convertido: float
+    taxa: float
+
+
+class ConversaoLoteViewSchema(BaseModel):
+    """
+    Schema de retorno da conversão em lote, com a cotação utilizada.
+    """
+    base: str  # Moeda base da tabela de câmbio utilizada
+    data_cotacao: date  # Data de referência da cotação (BCE)
+    cotacao_atualizada: bool  # Falso quando a API externa falhou e a última cotação conhecida foi usada
+    resultados: List[ConversaoResultadoSchema]
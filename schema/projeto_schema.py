@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Literal, Union
 from datetime import date
 from schema.historico_schema import HistoricoSchema
+from schema.sincronizacao_schema import SincronizacaoSchema
 from model.projeto import Projeto
 
 
@@ -38,6 +39,7 @@ class ProjetoIdSchema(BaseModel):
     status: str = "A iniciar" # Status do projeto
     data_registro: date
     historico:List[HistoricoSchema]
+    versao: int = 1  # Versão do registro: enviar no PUT (If-Match ou campo 'versao')
 
     class Config:
         orm_mode = True  # Permite a conversão de ORM para Pydantic
@@ -55,6 +57,7 @@ class ProjetoEditSchema(BaseModel):
     tipo: str = "Desenvolvimento de Software" # Tipo de projeto
     custo: float = "10000.00" # Custo do projeto
     status: str = "A iniciar" # Status do projeto
+    versao: Optional[int] = None  # Versão lida pelo cliente; se o projeto mudou desde então, 409 (alternativa ao If-Match)
 
     class Config:
         orm_mode = True  # Permite a conversão de ORM para Pydantic
@@ -84,6 +87,22 @@ class ListagemProjetoSchema(BaseModel):
     projetos: List[ProjetoViewSchema]  # Lista de projetos
 
 
+class ProjetosAlteradosSchema(BaseModel):
+    """
+    Schema de GET /projetos?since=: projetos criados ou alterados e IDs removidos.
+    """
+    projetos: List[ProjetoIdSchema]
+    removidos: List[int]  # IDs excluídos desde o ponto pedido (lápides)
+    cursor: int  # Enviar como 'since' na próxima sincronização
+
+
+class ProjetosOuAlteradosSchema(BaseModel):
+    """
+    Resposta 200 de GET /projetos: a listagem completa ou, com 'since', só as alterações.
+    """
+    __root__: Union[ListagemProjetoSchema, ProjetosAlteradosSchema]
+
+
 class ProjetoBuscaNomeSchema(BaseModel):
     """
     Schema para representar a busca de projetos com base no nome.
@@ -98,6 +117,23 @@ class ProjetoBuscaIdSchema(BaseModel):
     id: int  # ID do projeto a ser buscado
 
 
+class ProjetoMoedaSchema(SincronizacaoSchema):
+    """
+    Schema para solicitar os custos dos projetos convertidos para outra moeda
+    e, com 'since', apenas os projetos alterados.
+    """
+    moeda: Optional[str] = None  # Moeda de destino (ex: USD); sem ela, os custos vêm na moeda original
+    cotacao_em: Literal["atual", "registro"] = "atual"  # 'registro' usa a cotação da data de registro de cada projeto
+
+
+class ProjetoBuscaIdMoedaSchema(ProjetoBuscaIdSchema):
+    """
+    Schema para buscar um projeto pelo ID, com o custo opcionalmente convertido.
+    """
+    moeda: Optional[str] = None  # Moeda de destino (ex: USD)
+    cotacao_em: Literal["atual", "registro"] = "atual"  # 'registro' usa a cotação da data de registro do projeto
+
+
 class ProjetoMsgSchema(BaseModel):
     """
     Schema para representar a resposta de uma requisição de remoção de um projeto.
@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from typing import Optional
-from typing import List
+from typing import List, Union
+
+from schema.sincronizacao_schema import SincronizacaoSchema
 
 # Schema de entrada para criação de recurso
 class RecursoSchema(BaseModel):
@@ -19,6 +21,7 @@ class RecursoEditSchema(BaseModel):
     nome: str = "Recurso Atualizado"
     papel: str = "Arquiteto de Software"
     alocacao: Optional[str] = "100%"
+    versao: Optional[int] = None  # Versão lida pelo cliente; se o recurso mudou desde então, 409 (alternativa ao If-Match)
 
 
 # Schema de saída (view) para exibir os dados do recurso
@@ -28,6 +31,7 @@ class RecursoViewSchema(BaseModel):
     papel: str = "Desenvolvedor Senior"
     alocacao: Optional[str] = "50%"
     projeto_id: Optional[int] = None
+    versao: int = 1  # Versão do registro: enviar no PUT (If-Match ou campo 'versao')
     
     class Config:
         orm_mode = True
@@ -45,6 +49,28 @@ class ListagemRecursoSchema(BaseModel):
     recursos: List[RecursoViewSchema]
 
 
+class RecursoSincronizacaoSchema(SincronizacaoSchema):
+    """
+    Schema para listar, com 'since', apenas os recursos alterados.
+    """
+
+
+class RecursosAlteradosSchema(BaseModel):
+    """
+    Schema de GET /recursos?since=: recursos criados ou alterados e IDs removidos.
+    """
+    recursos: List[RecursoViewSchema]
+    removidos: List[int]  # IDs excluídos desde o ponto pedido (lápides)
+    cursor: int  # Enviar como 'since' na próxima sincronização
+
+
+class RecursosOuAlteradosSchema(BaseModel):
+    """
+    Resposta 200 de GET /recursos: a listagem completa ou, com 'since', só as alterações.
+    """
+    __root__: Union[ListagemRecursoSchema, RecursosAlteradosSchema]
+
+
 class RecursoMsgSchema(BaseModel):
     """
     Schema para representar a resposta de uma requisição de remoção de um recurso.
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Optional, Union
+
+from pydantic import BaseModel, validator
+
+
+class SincronizacaoSchema(BaseModel):
+    """
+    Parâmetro da sincronização incremental das listagens.
+
+    'since' aceita o 'cursor' devolvido pela consulta anterior (0 faz a carga
+    inicial) ou uma data e hora ISO 8601. Sem ele, a listagem vem completa.
+    """
+    since: Optional[Union[int, datetime]] = None  # Cursor ou data/hora da última sincronização
+
+    @validator("since")
+    def validar_since(cls, valor):
+        if isinstance(valor, int) and valor < 0:
+            raise ValueError("O cursor deve ser um inteiro maior ou igual a zero.")
+        if isinstance(valor, datetime) and valor.tzinfo is not None:
+            # As datas do banco são locais e sem fuso
+            return valor.astimezone().replace(tzinfo=None)
+        return valor
+
+
+TIPOS_EVENTO = ("projeto", "historico", "recurso", "vinculo")
+
+
+class EventosSchema(BaseModel):
+    """
+    Parâmetros de GET /eventos.
+
+    Na reconexão vale o cabeçalho Last-Event-ID, enviado pelo próprio
+    EventSource; 'ultimo_id' serve para a primeira conexão.
+    """
+    ultimo_id: Optional[int] = None  # Retoma depois deste evento (ex: o 'cursor' de GET /projetos?since=)
+    tipos: Optional[str] = None  # Filtro separado por vírgula: projeto, historico, recurso, vinculo
+
+    @validator("ultimo_id")
+    def validar_ultimo_id(cls, valor):
+        if valor is not None and valor < 0:
+            raise ValueError("O ID do evento deve ser um inteiro maior ou igual a zero.")
+        return valor
+
+    @validator("tipos")
+    def validar_tipos(cls, valor):
+        if valor is None:
+            return valor
+        invalidos = set(valor.split(",")) - set(TIPOS_EVENTO)
+        if invalidos:
+            raise ValueError(f"Tipos de evento inválidos: {', '.join(sorted(invalidos))}. "
+                             f"Use {', '.join(TIPOS_EVENTO)}.")
+        return valor
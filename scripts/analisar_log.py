@@ -0,0 +1,224 @@
+"""
+Relatório de latência e vazão a partir dos logs de acesso da aplicação.
+
+Lê em fluxo (linha a linha, sem carregar os arquivos na memória) o log
+detalhado (o de cada worker do gunicorn) e todos os seus arquivos
+rotacionados, do mais antigo para o mais recente, inclusive compactados (.gz). Considera as linhas de acesso do
+logger `instrumentacao` (texto ou JSON) e agrega por rota, opcionalmente em
+janelas de tempo: quantidade, vazão, taxa de erros e percentis de latência
+estimados por histograma (memória constante, erro relativo de ~2%).
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.analisar_log                                   # log/gunicorn.detailed*.log*
+    python -m scripts.analisar_log --janela 15m --desde 2026-10-01T00:00
+    python -m scripts.analisar_log --formato json > release-1.2.json  # para comparar entre versões
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from scripts.estatistica import HistogramaLog
+
+# [2026-10-19 02:22:21,332] INFO [req-id] registrar_medicao() L139  GET /projetos 200 total_ms=14.28 bytes=512 ...
+_LINHA_TEXTO = re.compile(
+    r"^\[(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[,.]\d+\]\s+\S+\s+\[[^\]]*\]\s+\S+\(\)\s+L\d+\s+"
+    r"(?P<metodo>GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS) (?P<caminho>\S+) (?P<status>\d{3}) (?P<campos>.*)$"
+)
+_CAMPO = re.compile(r"(\w+)=(\S+)")
+_UNIDADES = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class Acesso:
+    __slots__ = ("momento", "metodo", "rota", "status", "duracao_ms", "tamanho")
+
+    def __init__(self, momento: datetime, metodo: str, rota: str, status: int, duracao_ms: float, tamanho: Optional[int]):
+        self.momento = momento
+        self.metodo = metodo
+        self.rota = rota
+        self.status = status
+        self.duracao_ms = duracao_ms
+        self.tamanho = tamanho
+
+
+def interpretar(linha: str) -> Optional[Acesso]:
+    """Extrai uma linha de acesso (formato texto ou JSON); devolve None para as demais linhas."""
+    if linha.startswith("{"):
+        try:
+            dados = json.loads(linha)
+        except ValueError:
+            return None
+        if dados.get("logger") != "instrumentacao" or "total_ms" not in dados:
+            return None
+        try:
+            momento = datetime.strptime(dados["ts"][:19], "%Y-%m-%d %H:%M:%S")
+        except (KeyError, ValueError):
+            return None
+        return Acesso(momento, dados.get("metodo", "-"), dados.get("rota") or dados.get("caminho", "-"),
+                      int(dados.get("status", 0)), float(dados["total_ms"]), dados.get("bytes"))
+
+    encontrado = _LINHA_TEXTO.match(linha)
+    if not encontrado:
+        return None
+    campos = dict(_CAMPO.findall(encontrado["campos"]))
+    if "total_ms" not in campos:
+        return None
+    tamanho = campos.get("bytes")
+    return Acesso(
+        datetime.strptime(encontrado["ts"], "%Y-%m-%d %H:%M:%S"),
+        encontrado["metodo"], campos.get("rota", encontrado["caminho"]), int(encontrado["status"]),
+        float(campos["total_ms"]), int(tamanho) if tamanho and tamanho.isdigit() else None,
+    )
+
+
+def arquivos_em_ordem(padroes: List[str]) -> List[str]:
+    """Expande os padrões e ordena os rotacionados do mais antigo (.N maior) para o atual."""
+    def chave(caminho: str) -> Tuple[str, int]:
+        nome = caminho[:-3] if caminho.endswith(".gz") else caminho
+        base, _, sufixo = nome.rpartition(".")
+        if sufixo.isdigit():
+            return base, -int(sufixo)
+        return nome, 0
+
+    encontrados = {caminho for padrao in padroes for caminho in (glob.glob(padrao) or [padrao]) if os.path.isfile(caminho)}
+    return sorted(encontrados, key=chave)
+
+
+def ler_acessos(arquivos: List[str]) -> Iterator[Acesso]:
+    for caminho in arquivos:
+        abrir = gzip.open if caminho.endswith(".gz") else open
+        with abrir(caminho, "rt", encoding="utf-8", errors="replace") as arquivo:
+            for linha in arquivo:
+                acesso = interpretar(linha.rstrip("\n"))
+                if acesso is not None:
+                    yield acesso
+
+
+class Agregado:
+    """Contadores e histograma de latência de uma rota em uma janela."""
+
+    __slots__ = ("histograma", "erros_4xx", "erros_5xx", "bytes", "com_tamanho", "inicio", "fim")
+
+    def __init__(self):
+        self.histograma = HistogramaLog()
+        self.erros_4xx = 0
+        self.erros_5xx = 0
+        self.bytes = 0
+        self.com_tamanho = 0
+        self.inicio: Optional[datetime] = None
+        self.fim: Optional[datetime] = None
+
+    def adicionar(self, acesso: Acesso):
+        self.histograma.adicionar(acesso.duracao_ms)
+        if 400 <= acesso.status < 500:
+            self.erros_4xx += 1
+        elif acesso.status >= 500:
+            self.erros_5xx += 1
+        if acesso.tamanho is not None:
+            self.bytes += acesso.tamanho
+            self.com_tamanho += 1
+        self.inicio = acesso.momento if self.inicio is None else min(self.inicio, acesso.momento)
+        self.fim = acesso.momento if self.fim is None else max(self.fim, acesso.momento)
+
+    def resumo(self, segundos: float) -> dict:
+        h = self.histograma
+        return {
+            "n": h.n,
+            "rps": round(h.n / segundos, 3) if segundos > 0 else None,
+            "taxa_erro_5xx": round(self.erros_5xx / h.n, 4),
+            "taxa_erro_4xx": round(self.erros_4xx / h.n, 4),
+            "media_ms": round(h.soma / h.n, 2),
+            "p50_ms": round(h.percentil(50), 2),
+            "p95_ms": round(h.percentil(95), 2),
+            "p99_ms": round(h.percentil(99), 2),
+            "max_ms": round(h.maximo, 2),
+            "bytes_medio": round(self.bytes / self.com_tamanho) if self.com_tamanho else None,
+        }
+
+
+def _duracao(valor: str) -> timedelta:
+    encontrado = re.fullmatch(r"(\d+)([smhd])", valor)
+    if not encontrado:
+        raise argparse.ArgumentTypeError("Use um número seguido de s, m, h ou d (ex: 15m, 1h).")
+    return timedelta(seconds=int(encontrado[1]) * _UNIDADES[encontrado[2]])
+
+
+def _inicio_janela(momento: datetime, janela: timedelta) -> datetime:
+    segundos = int(janela.total_seconds())
+    return datetime.fromtimestamp(int(momento.timestamp()) // segundos * segundos)
+
+
+def analisar(acessos: Iterator[Acesso], janela: Optional[timedelta] = None,
+             desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> dict:
+    """Agrega os acessos por janela e rota; devolve um dicionário pronto para JSON."""
+    janelas: Dict[Optional[datetime], Dict[str, Agregado]] = {}
+    for acesso in acessos:
+        if (desde and acesso.momento < desde) or (ate and acesso.momento >= ate):
+            continue
+        chave_janela = _inicio_janela(acesso.momento, janela) if janela else None
+        rotas = janelas.setdefault(chave_janela, {})
+        for rota in (f"{acesso.metodo} {acesso.rota}", "TOTAL"):
+            agregado = rotas.get(rota)
+            if agregado is None:
+                agregado = rotas[rota] = Agregado()
+            agregado.adicionar(acesso)
+
+    resultado = []
+    for inicio in sorted(janelas, key=lambda j: j or datetime.min):
+        rotas = janelas[inicio]
+        total = rotas["TOTAL"]
+        if janela:
+            segundos = janela.total_seconds()
+        else:
+            segundos = max(1.0, (total.fim - total.inicio).total_seconds())
+        resultado.append({
+            "inicio": (inicio or total.inicio).isoformat(),
+            "fim": ((inicio + janela) if janela else total.fim).isoformat(),
+            "rotas": {rota: rotas[rota].resumo(segundos) for rota in sorted(rotas)},
+        })
+    return {"janela": str(janela) if janela else None, "janelas": resultado}
+
+
+def imprimir_tabela(relatorio: dict, saida=sys.stdout):
+    colunas = f"{'rota':<36} {'n':>8} {'req/s':>9} {'5xx %':>7} {'4xx %':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9} {'bytes':>8}"
+    for janela in relatorio["janelas"]:
+        print(f"\n== {janela['inicio']} → {janela['fim']}", file=saida)
+        print(colunas, file=saida)
+        for rota, d in janela["rotas"].items():
+            print(f"{rota:<36} {d['n']:>8} {d['rps'] or 0:>9.3f} {d['taxa_erro_5xx'] * 100:>7.2f} "
+                  f"{d['taxa_erro_4xx'] * 100:>7.2f} {d['p50_ms']:>9.2f} {d['p95_ms']:>9.2f} {d['p99_ms']:>9.2f} "
+                  f"{d['max_ms']:>9.2f} {d['bytes_medio'] if d['bytes_medio'] is not None else '-':>8}", file=saida)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de latência e vazão a partir dos logs de acesso.")
+    parser.add_argument("arquivos", nargs="*", default=[os.path.join(os.getenv("LOG_DIR", "log/"), "gunicorn.detailed*.log*")],
+                        help="Arquivos ou padrões glob (padrão: log/gunicorn.detailed*.log*).")
+    parser.add_argument("--janela", type=_duracao, help="Agrupa em janelas de tempo (ex: 5m, 1h, 1d).")
+    parser.add_argument("--desde", type=datetime.fromisoformat, help="Ignora acessos anteriores (ISO 8601).")
+    parser.add_argument("--ate", type=datetime.fromisoformat, help="Ignora acessos a partir deste momento (ISO 8601).")
+    parser.add_argument("--formato", choices=("tabela", "json"), default="tabela")
+    args = parser.parse_args(argv)
+
+    arquivos = arquivos_em_ordem(args.arquivos)
+    if not arquivos:
+        print("Nenhum arquivo de log encontrado.", file=sys.stderr)
+        return 1
+    relatorio = analisar(ler_acessos(arquivos), args.janela, args.desde, args.ate)
+    relatorio["arquivos"] = arquivos
+    if args.formato == "json":
+        json.dump(relatorio, sys.stdout, ensure_ascii=False, indent=2, sort_keys=True)
+        print()
+    else:
+        print(f"{len(arquivos)} arquivo(s): {', '.join(arquivos)}")
+        imprimir_tabela(relatorio)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,459 @@
+"""
+Benchmark das rotas da API com percentis de latência e comparação com baseline.
+
+Para cada escala de dados (gerada com scripts.gerar_dados em um banco
+temporário), exercita todas as rotas de app.py pelo test client do Flask
+(`cliente`), por um servidor WSGI real em uma porta local (`servidor`) e/ou
+pelo servidor ASGI de asgi.py sob o uvicorn (`asgi`), medindo vazão e
+latência p50/p95/p99. As rotas de conversão usam a API de
+câmbio falsa de scripts.fake_cambio, com latência e erros configuráveis, de
+modo que os resultados não dependem da rede.
+
+O controle de admissão (middleware/admissao.py) fica desligado durante a
+medição: o benchmark quer a latência das rotas, e não 429/503 da fila de
+escritas ou do limite de taxa. Com --admissao, vale a configuração do
+ambiente (ADMISSAO_*), e a coluna `recusadas` mostra o descarte de carga.
+
+Com --baseline, os resultados são comparados ao arquivo: se o p95 de alguma
+rota piorar além de --limite (padrão 25%), o script termina com código 1.
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.benchmark --escalas 1k,100k --salvar-baseline scripts/benchmark_baseline.json
+    python -m scripts.benchmark --escalas 1k,100k --baseline scripts/benchmark_baseline.json
+    python -m scripts.benchmark --url http://127.0.0.1:8000 --projeto-id 10   # servidor externo (ex: gunicorn)
+
+    # API de câmbio lenta, sem cache: WSGI com 4 threads (como 1 worker gthread) x ASGI
+    python -m scripts.benchmark --modos servidor,asgi --threads 4 --concorrencia 64 \
+        --cenarios "GET /conversao" --cambio-latencia-ms 200 --cambio-sem-cache
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from sqlalchemy.orm import sessionmaker
+from werkzeug.serving import BaseWSGIServer
+
+from scripts import fake_cambio
+from scripts.estatistica import resumo
+from scripts.gerar_dados import base36, criar_engine, gerar, ESCALAS
+
+# ==============================================
+# Cenários
+# ==============================================
+# Cada cenário monta (método, caminho, corpo JSON) a partir do contexto e do
+# número da requisição. Os cenários de escrita criam e depois removem os
+# próprios registros, na ordem em que aparecem.
+
+Requisicao = Tuple[str, str, Optional[dict]]
+
+
+class Contexto:
+    """IDs usados pelos cenários; os criados durante o benchmark são guardados para edição e remoção."""
+
+    def __init__(self, projeto_id: int, recurso_id: int):
+        self.projeto_id = projeto_id
+        self.recurso_id = recurso_id
+        self.projetos_criados: List[int] = []
+        self.recursos_criados: List[int] = []
+        self._lock = threading.Lock()
+        self._sequencia = itertools.count()
+
+    def proximo(self) -> int:
+        return next(self._sequencia)
+
+    def criado(self, lista: List[int], indice: int) -> Optional[int]:
+        with self._lock:
+            return lista[indice % len(lista)] if lista else None
+
+    def retirar(self, lista: List[int]) -> Optional[int]:
+        with self._lock:
+            return lista.pop() if lista else None
+
+
+def _novo_projeto(ctx: Contexto, i: int) -> Requisicao:
+    codigo = base36(ctx.proximo())
+    return "POST", "/projeto", {"nome": f"Projeto Benchmark {codigo}", "sigla": f"BEN{codigo}"[:10],
+                                "descricao": "Criado pelo benchmark", "tipo": "Interno",
+                                "custo": 1000.0, "status": "A iniciar"}
+
+
+def _editar_projeto(ctx: Contexto, i: int) -> Requisicao:
+    projeto_id = ctx.criado(ctx.projetos_criados, i) or ctx.projeto_id
+    codigo = base36(ctx.proximo())
+    return "PUT", "/projeto", {"id": projeto_id, "nome": f"Projeto Benchmark Editado {codigo}",
+                               "sigla": f"BED{codigo}"[:10], "custo": 2000.0, "status": "Em andamento"}
+
+
+def _novo_recurso(ctx: Contexto, i: int) -> Requisicao:
+    return "POST", "/recurso", {"nome": f"Recurso Benchmark {base36(ctx.proximo())}", "papel": "QA",
+                                "alocacao": "50%"}
+
+
+def _editar_recurso(ctx: Contexto, i: int) -> Requisicao:
+    recurso_id = ctx.criado(ctx.recursos_criados, i) or ctx.recurso_id
+    return "PUT", "/recurso", {"id": recurso_id, "nome": f"Recurso Benchmark {i}", "papel": "Dev",
+                               "alocacao": "100%"}
+
+
+def _vinculo(metodo: str):
+    def montar(ctx: Contexto, i: int) -> Requisicao:
+        projeto_id = ctx.criado(ctx.projetos_criados, i) or ctx.projeto_id
+        recurso_id = ctx.criado(ctx.recursos_criados, i) or ctx.recurso_id
+        return metodo, f"/projeto/recurso?id_projeto={projeto_id}&id_recurso={recurso_id}", None
+    return montar
+
+
+def _remover(caminho: str, lista: Callable[[Contexto], List[int]]):
+    def montar(ctx: Contexto, i: int) -> Optional[Requisicao]:
+        identificador = ctx.retirar(lista(ctx))
+        return None if identificador is None else ("DELETE", f"{caminho}?id={identificador}", None)
+    return montar
+
+
+def _fixo(metodo: str, caminho: str, corpo: Optional[dict] = None):
+    return lambda ctx, i: (metodo, caminho.format(ctx=ctx), corpo)
+
+
+DATA_HISTORICA = (date.today() - timedelta(days=400)).isoformat()
+
+CENARIOS: List[Tuple[str, Callable[[Contexto, int], Optional[Requisicao]]]] = [
+    ("GET /projetos", _fixo("GET", "/projetos")),
+    ("GET /projetos?moeda", _fixo("GET", "/projetos?moeda=USD")),
+    ("GET /projeto", _fixo("GET", "/projeto?id={ctx.projeto_id}")),
+    ("GET /historico", _fixo("GET", "/historico?id={ctx.projeto_id}")),
+    ("GET /recursos", _fixo("GET", "/recursos")),
+    ("GET /recurso", _fixo("GET", "/recurso?id={ctx.recurso_id}")),
+    ("GET /recursos-disponiveis", _fixo("GET", "/recursos-disponiveis?id={ctx.projeto_id}")),
+    ("GET /projeto/recursos", _fixo("GET", "/projeto/recursos?id={ctx.projeto_id}")),
+    ("GET /conversao", _fixo("GET", "/conversao?valor=1000&de=BRL&para=USD")),
+    ("GET /conversao?data", _fixo("GET", f"/conversao?valor=1000&de=BRL&para=USD&data={DATA_HISTORICA}")),
+    ("POST /conversao/lote", _fixo("POST", "/conversao/lote",
+                                   {"de": "BRL", "para": ["USD", "EUR"], "valores": [float(v) for v in range(100)]})),
+    ("GET /conversao/status", _fixo("GET", "/conversao/status")),
+    ("POST /projeto", _novo_projeto),
+    ("PUT /projeto", _editar_projeto),
+    ("POST /historico", lambda ctx, i: ("POST", f"/historico?id={ctx.criado(ctx.projetos_criados, i) or ctx.projeto_id}",
+                                        {"descricao": f"Histórico do benchmark {i}"})),
+    ("POST /recurso", _novo_recurso),
+    ("PUT /recurso", _editar_recurso),
+    ("POST /projeto/recurso", _vinculo("POST")),
+    ("DELETE /projeto/recurso", _vinculo("DELETE")),
+    ("DELETE /recurso", _remover("/recurso", lambda ctx: ctx.recursos_criados)),
+    ("DELETE /projeto", _remover("/projeto", lambda ctx: ctx.projetos_criados)),
+]
+
+
+# ==============================================
+# Clientes
+# ==============================================
+class ClienteFlask:
+    """Executa as requisições pelo test client do Flask (sem rede)."""
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def enviar(self, metodo: str, caminho: str, corpo: Optional[dict]) -> Tuple[int, Optional[dict]]:
+        cliente = getattr(self._local, "cliente", None)
+        if cliente is None:
+            cliente = self._local.cliente = self._app.test_client()
+        resposta = cliente.open(caminho, method=metodo, json=corpo)
+        return resposta.status_code, resposta.get_json(silent=True)
+
+
+class ClienteHttp:
+    """Executa as requisições por HTTP com conexões persistentes (uma sessão por thread)."""
+
+    def __init__(self, url_base: str):
+        self._url_base = url_base.rstrip("/")
+        self._local = threading.local()
+
+    def enviar(self, metodo: str, caminho: str, corpo: Optional[dict]) -> Tuple[int, Optional[dict]]:
+        sessao = getattr(self._local, "sessao", None)
+        if sessao is None:
+            sessao = self._local.sessao = requests.Session()
+        resposta = sessao.request(metodo, self._url_base + caminho, json=corpo, timeout=120)
+        try:
+            return resposta.status_code, resposta.json()
+        except ValueError:
+            return resposta.status_code, None
+
+
+# ==============================================
+# Execução
+# ==============================================
+def executar_cenario(cliente, ctx: Contexto, nome: str, montar, requisicoes: int, duracao: float,
+                     aquecimento: int, concorrencia: int) -> Dict:
+    """Executa um cenário até `requisicoes` ou `duracao` segundos e devolve vazão e percentis (ms)."""
+    latencias: List[float] = []
+    erros = recusadas = 0
+    lock = threading.Lock()
+
+    def uma(i: int, medir: bool):
+        nonlocal erros, recusadas
+        requisicao = montar(ctx, i)
+        if requisicao is None:
+            return
+        inicio = time.perf_counter()
+        status, dados = cliente.enviar(*requisicao)
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        # Guarda os IDs criados para os cenários de edição e remoção
+        criados = {"/projeto": ctx.projetos_criados, "/recurso": ctx.recursos_criados}.get(requisicao[1])
+        if requisicao[0] == "POST" and criados is not None and status < 300 and isinstance(dados, dict) and "id" in dados:
+            with ctx._lock:
+                criados.append(dados["id"])
+        if medir:
+            with lock:
+                latencias.append(duracao_ms)
+                if status >= 400:
+                    erros += 1
+                if status in (429, 503):
+                    recusadas += 1  # controle de admissão
+
+    for i in range(aquecimento):
+        uma(i, medir=False)
+
+    inicio = time.perf_counter()
+    limite = inicio + duracao
+    contador = itertools.count(aquecimento)
+
+    def trabalhador():
+        while time.perf_counter() < limite:
+            i = next(contador)
+            if i >= aquecimento + requisicoes:
+                return
+            uma(i, medir=True)
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for futuro in [executor.submit(trabalhador) for _ in range(concorrencia)]:
+            futuro.result()
+    decorrido = time.perf_counter() - inicio
+
+    estatisticas = resumo(latencias)
+    return {
+        "cenario": nome,
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "recusadas": recusadas,
+        "rps": round(len(latencias) / decorrido, 1) if decorrido else None,
+        **{chave: round(valor, 2) for chave, valor in estatisticas.items() if chave != "n" and valor is not None},
+    }
+
+
+def preparar_aplicacao(banco: str, url_cambio: str, sem_cache: bool = False, admissao: bool = False):
+    """
+    Aponta a aplicação para o banco de benchmark e para a API de câmbio falsa.
+
+    Com `sem_cache`, o relógio do cache avança uma semana a cada consulta, de
+    modo que toda conversão vai à API externa (simula o cache frio). Sem
+    `admissao`, o controle de admissão é trocado por um sem limites.
+    """
+    import app as app_module
+    from middleware.admissao import ControleAdmissao
+    from service.cambio import CacheCambio
+    from service.cliente_cambio import ClienteCambio
+    from service.serie_cambio import SerieCambio
+
+    engine = criar_engine(banco)
+    sessao = sessionmaker(bind=engine)
+    cliente_cambio = ClienteCambio(url_base=url_cambio)
+    app_module.Session = sessao
+    app_module.cliente_cambio = cliente_cambio
+    relogio = {}
+    if sem_cache:
+        semanas = itertools.count()
+        relogio["relogio"] = lambda: datetime(2030, 1, 7) + timedelta(weeks=next(semanas))
+    app_module.cache_cambio = CacheCambio(buscar=cliente_cambio.ultimas_taxas, session_factory=sessao, **relogio)
+    app_module.serie_cambio = SerieCambio(buscar_intervalo=cliente_cambio.intervalo, session_factory=sessao)
+    if not admissao:
+        app_module.admissao.controle = ControleAdmissao(leituras=0, escritas=0, taxa=0)
+    return app_module.app
+
+
+class _ServidorThreadsLimitadas(BaseWSGIServer):
+    """Servidor WSGI do werkzeug com no máximo `threads` requisições simultâneas (como um worker gthread)."""
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int):
+        super().__init__(host, port, app)
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def iniciar_servidor_wsgi(app, threads: Optional[int] = None):
+    """Sobe a aplicação em um servidor WSGI (werkzeug) em uma porta livre, com uma thread por requisição ou `threads` no máximo."""
+    from werkzeug.serving import make_server
+
+    if threads:
+        servidor = _ServidorThreadsLimitadas("127.0.0.1", 0, app, threads)
+    else:
+        servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def iniciar_servidor_asgi(threads: Optional[int] = None):
+    """Sobe asgi.py no uvicorn em uma porta livre; `threads` limita os pools do banco e do Flask."""
+    import socket
+    import uvicorn
+
+    if threads:
+        os.environ["ASGI_DB_THREADS"] = os.environ["ASGI_WSGI_THREADS"] = str(threads)
+    import asgi
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        porta = sock.getsockname()[1]
+    servidor = uvicorn.Server(uvicorn.Config(asgi.aplicacao, host="127.0.0.1", port=porta,
+                                             log_level="warning", access_log=False))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, f"http://127.0.0.1:{porta}"
+
+
+def rodar(cliente, ctx: Contexto, args, rotulo: str) -> List[Dict]:
+    resultados = []
+    filtro = [nome.strip() for nome in args.cenarios.split(",")] if args.cenarios else None
+    for nome, montar in CENARIOS:
+        if filtro and not any(parte in nome for parte in filtro):
+            continue
+        resultado = executar_cenario(cliente, ctx, nome, montar, args.requisicoes, args.duracao,
+                                     args.aquecimento, args.concorrencia)
+        resultado["execucao"] = rotulo
+        resultados.append(resultado)
+        print(_linha(resultado), flush=True)
+    return resultados
+
+
+def _linha(r: Dict) -> str:
+    def ms(chave):
+        return f"{r[chave]:>9.2f}" if chave in r else f"{'-':>9}"
+    return (f"{r['execucao']:<18} {r['cenario']:<26} {r['requisicoes']:>6} {r['erros']:>5} "
+            f"{r.get('recusadas', 0):>9} {(r['rps'] or 0):>9.1f} {ms('p50')} {ms('p95')} {ms('p99')}")
+
+
+def comparar(resultados: List[Dict], baseline: Dict[str, Dict], limite: float, piso_ms: float) -> List[str]:
+    """Lista as regressões de p95 acima de `limite` (fração) e de `piso_ms` em relação à baseline."""
+    regressoes = []
+    for r in resultados:
+        chave = f"{r['execucao']} | {r['cenario']}"
+        anterior = baseline.get(chave)
+        if not anterior or "p95" not in r or "p95" not in anterior:
+            continue
+        if r["p95"] > anterior["p95"] * (1 + limite) and r["p95"] - anterior["p95"] > piso_ms:
+            regressoes.append(f"{chave}: p95 {anterior['p95']:.2f} ms → {r['p95']:.2f} ms "
+                              f"(+{(r['p95'] / anterior['p95'] - 1) * 100:.0f}%)")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das rotas da API.")
+    parser.add_argument("--escalas", default="1k", help=f"Escalas de dados separadas por vírgula ({', '.join(ESCALAS)}).")
+    parser.add_argument("--modos", default="cliente,servidor",
+                        help="'cliente' (test client), 'servidor' (WSGI) e/ou 'asgi' (uvicorn), separados por vírgula.")
+    parser.add_argument("--threads", type=int,
+                        help="Limita as threads dos servidores (WSGI: requisições simultâneas; ASGI: pools do banco e do Flask).")
+    parser.add_argument("--url", help="Mede um servidor já em execução (não gera dados nem usa a API falsa).")
+    parser.add_argument("--projeto-id", type=int, default=1, help="Projeto usado nas rotas por ID (com --url).")
+    parser.add_argument("--recurso-id", type=int, default=1, help="Recurso usado nas rotas por ID (com --url).")
+    parser.add_argument("--cenarios", help="Executa só os cenários cujo nome contém um dos trechos (separados por vírgula).")
+    parser.add_argument("--requisicoes", type=int, default=200, help="Máximo de requisições medidas por cenário.")
+    parser.add_argument("--duracao", type=float, default=5.0, help="Tempo máximo por cenário, em segundos.")
+    parser.add_argument("--aquecimento", type=int, default=3, help="Requisições descartadas antes da medição.")
+    parser.add_argument("--concorrencia", type=int, default=1, help="Requisições simultâneas.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--cambio-latencia-ms", type=float, default=0.0, help="Latência da API de câmbio falsa.")
+    parser.add_argument("--cambio-taxa-erro", type=float, default=0.0, help="Fração de erros da API de câmbio falsa.")
+    parser.add_argument("--cambio-sem-cache", action="store_true", help="Toda conversão consulta a API de câmbio falsa.")
+    parser.add_argument("--admissao", action="store_true",
+                        help="Mantém o controle de admissão configurado no ambiente (padrão: desligado).")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo.")
+    parser.add_argument("--baseline", help="Compara com a baseline deste arquivo (regressão termina com código 1).")
+    parser.add_argument("--salvar-baseline", help="Grava os resultados como baseline neste arquivo.")
+    parser.add_argument("--limite", type=float, default=0.25, help="Piora tolerada do p95 (fração, padrão 0.25).")
+    parser.add_argument("--piso-ms", type=float, default=1.0, help="Piora absoluta mínima para contar como regressão.")
+    parser.add_argument("--manter-logs", action="store_true", help="Mantém os logs INFO da aplicação durante a medição.")
+    args = parser.parse_args(argv)
+
+    print(f"{'execução':<18} {'cenário':<26} {'n':>6} {'erros':>5} {'recusadas':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    resultados: List[Dict] = []
+
+    if args.url:
+        resultados += rodar(ClienteHttp(args.url), Contexto(args.projeto_id, args.recurso_id), args, "externo")
+    else:
+        servidor_cambio, url_cambio = fake_cambio.iniciar_em_segundo_plano(
+            latencia_ms=args.cambio_latencia_ms, taxa_erro=args.cambio_taxa_erro, semente=args.semente)
+        modos = [modo.strip() for modo in args.modos.split(",")]
+        with tempfile.TemporaryDirectory(prefix="benchmark_") as diretorio:
+            for escala in args.escalas.split(","):
+                historicos = ESCALAS.get(escala) or int(escala)
+                banco = os.path.join(diretorio, f"bench_{escala}.sqlite3")
+                inicio = time.perf_counter()
+                totais = gerar(criar_engine(banco), historicos, semente=args.semente)
+                print(f"# escala {escala}: {totais['projeto']} projetos, {totais['historico']} históricos, "
+                      f"{totais['recurso']} recursos ({time.perf_counter() - inicio:.1f}s)", flush=True)
+
+                app = preparar_aplicacao(banco, url_cambio, args.cambio_sem_cache, args.admissao)
+                if not args.manter_logs:
+                    for nome in ("", "werkzeug", "instrumentacao"):
+                        logging.getLogger(nome).setLevel(logging.WARNING)
+                ctx = Contexto(max(1, totais["projeto"] // 2), max(1, totais["recurso"] // 2))
+                if "cliente" in modos:
+                    resultados += rodar(ClienteFlask(app), ctx, args, f"cliente {escala}")
+                if "servidor" in modos:
+                    servidor, url = iniciar_servidor_wsgi(app, args.threads)
+                    try:
+                        resultados += rodar(ClienteHttp(url), ctx, args, f"servidor {escala}")
+                    finally:
+                        servidor.shutdown()
+                if "asgi" in modos:
+                    servidor, url = iniciar_servidor_asgi(args.threads)
+                    try:
+                        resultados += rodar(ClienteHttp(url), ctx, args, f"asgi {escala}")
+                    finally:
+                        servidor.should_exit = True
+        servidor_cambio.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+    if args.salvar_baseline:
+        with open(args.salvar_baseline, "w") as arquivo:
+            json.dump({f"{r['execucao']} | {r['cenario']}": r for r in resultados}, arquivo, ensure_ascii=False, indent=2)
+        print(f"Baseline gravada em {args.salvar_baseline}.")
+    if args.baseline:
+        with open(args.baseline) as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.limite, args.piso_ms)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) acima de {args.limite:.0%}:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            return 1
+        print("\nSem regressões em relação à baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Funções estatísticas compartilhadas pelos scripts de desempenho (benchmark, replay e análise de logs)."""
+import math
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+def percentil(ordenados: Sequence[float], p: float) -> Optional[float]:
+    """Percentil `p` (0 a 100) pelo método do posto mais próximo; `ordenados` deve estar em ordem crescente."""
+    if not ordenados:
+        return None
+    posto = max(1, -(-len(ordenados) * p // 100))  # teto de n * p / 100
+    return ordenados[min(len(ordenados), int(posto)) - 1]
+
+
+def resumo(amostra: Iterable[float], percentis: Iterable[float] = (50, 95, 99)) -> Dict[str, Optional[float]]:
+    """Quantidade, média, máximo e percentis de uma amostra (na unidade da amostra)."""
+    ordenados: List[float] = sorted(amostra)
+    dados: Dict[str, Optional[float]] = {
+        "n": len(ordenados),
+        "media": sum(ordenados) / len(ordenados) if ordenados else None,
+        "max": ordenados[-1] if ordenados else None,
+    }
+    for p in percentis:
+        dados[f"p{p:g}"] = percentil(ordenados, p)
+    return dados
+
+
+class HistogramaLog:
+    """
+    Histograma com faixas em escala logarítmica para estimar percentis em fluxo.
+
+    Usa memória constante (uma contagem por faixa) e erro relativo de até
+    `precisao` nos percentis, o que permite agregar milhões de amostras sem
+    guardá-las.
+    """
+
+    def __init__(self, precisao: float = 0.02, minimo: float = 0.01):
+        self.razao = 1 + 2 * precisao
+        self.minimo = minimo
+        self._log_razao = math.log(self.razao)
+        self.contagens: Dict[int, int] = {}
+        self.n = 0
+        self.soma = 0.0
+        self.maximo: Optional[float] = None
+
+    def adicionar(self, valor: float):
+        faixa = 0 if valor <= self.minimo else int(math.log(valor / self.minimo) / self._log_razao) + 1
+        self.contagens[faixa] = self.contagens.get(faixa, 0) + 1
+        self.n += 1
+        self.soma += valor
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+
+    def mesclar(self, outro: "HistogramaLog"):
+        for faixa, contagem in outro.contagens.items():
+            self.contagens[faixa] = self.contagens.get(faixa, 0) + contagem
+        self.n += outro.n
+        self.soma += outro.soma
+        if outro.maximo is not None:
+            self.maximo = outro.maximo if self.maximo is None else max(self.maximo, outro.maximo)
+
+    def percentil(self, p: float) -> Optional[float]:
+        """Estimativa do percentil `p` (0 a 100): o ponto médio geométrico da faixa que o contém."""
+        if not self.n:
+            return None
+        alvo = max(1, math.ceil(self.n * p / 100))
+        acumulado = 0
+        for faixa in sorted(self.contagens):
+            acumulado += self.contagens[faixa]
+            if acumulado >= alvo:
+                if faixa == 0:
+                    return self.minimo
+                estimativa = self.minimo * self.razao ** (faixa - 0.5)
+                return min(estimativa, self.maximo)
+        return self.maximo
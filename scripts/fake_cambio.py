@@ -0,0 +1,128 @@
+"""
+Servidor local que imita a Frankfurter API, para benchmarks determinísticos e offline.
+
+Responde a GET /latest?from=XXX e GET /AAAA-MM-DD..AAAA-MM-DD?from=XXX com
+taxas fixas (levemente variadas por dia nas séries), com latência e taxa de
+erros configuráveis.
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.fake_cambio --porta 8089 --latencia-ms 50 --taxa-erro 0.05
+    CAMBIO_API_URL=http://127.0.0.1:8089 flask run
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Taxas por 1 EUR
+TAXAS_EUR = {
+    "EUR": 1.0, "USD": 1.08, "BRL": 5.40, "GBP": 0.85, "JPY": 160.0, "CHF": 0.95, "CAD": 1.47,
+    "AUD": 1.65, "CNY": 7.80, "ARS": 950.0, "MXN": 18.5, "SEK": 11.3, "NOK": 11.6, "INR": 90.0,
+}
+
+
+def _taxas(base: str, dia: date = None) -> dict:
+    variacao = 1.0 if dia is None else 1 + 0.02 * math.sin(dia.toordinal() / 30)
+    return {
+        moeda: round(taxa * (variacao if moeda != "EUR" else 1.0) / TAXAS_EUR[base], 6)
+        for moeda, taxa in TAXAS_EUR.items() if moeda != base
+    }
+
+
+def _dia_util_anterior(dia: date) -> date:
+    while dia.weekday() >= 5:
+        dia -= timedelta(days=1)
+    return dia
+
+
+def criar_servidor(porta: int = 0, latencia_ms: float = 0.0, jitter_ms: float = 0.0,
+                   taxa_erro: float = 0.0, semente: int = 42) -> ThreadingHTTPServer:
+    """Cria o servidor (porta 0 escolhe uma livre). Use `servidor.server_address` para obter a porta."""
+    rng = random.Random(semente)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, status: int, dados: dict):
+            corpo = json.dumps(dados).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            with lock:
+                atraso = max(0.0, latencia_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+                falhar = rng.random() < taxa_erro
+            if atraso:
+                time.sleep(atraso)
+            if falhar:
+                return self._responder(503, {"message": "erro injetado"})
+
+            url = urlparse(self.path)
+            base = parse_qs(url.query).get("from", ["EUR"])[0].upper()
+            if base not in TAXAS_EUR:
+                return self._responder(404, {"message": "not found"})
+
+            caminho = url.path.strip("/")
+            if caminho == "latest":
+                hoje = _dia_util_anterior(date.today())
+                return self._responder(200, {"amount": 1.0, "base": base, "date": hoje.isoformat(),
+                                             "rates": _taxas(base)})
+            if ".." in caminho:
+                try:
+                    inicio, fim = (date.fromisoformat(parte) for parte in caminho.split(".."))
+                except ValueError:
+                    return self._responder(400, {"message": "invalid date"})
+                fim = min(fim, date.today())
+                taxas, dia = {}, inicio
+                while dia <= fim:
+                    if dia.weekday() < 5:
+                        taxas[dia.isoformat()] = _taxas(base, dia)
+                    dia += timedelta(days=1)
+                return self._responder(200, {"amount": 1.0, "base": base, "start_date": inicio.isoformat(),
+                                             "end_date": fim.isoformat(), "rates": taxas})
+            return self._responder(404, {"message": "not found"})
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_em_segundo_plano(**opcoes):
+    """Inicia o servidor em uma thread e devolve (servidor, url_base)."""
+    servidor = criar_servidor(**opcoes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, porta = servidor.server_address[:2]
+    return servidor, f"http://{host}:{porta}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita a Frankfurter API.")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência adicionada a cada resposta.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Variação aleatória (±) da latência.")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração das respostas com erro 503 (0 a 1).")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    servidor = criar_servidor(args.porta, args.latencia_ms, args.jitter_ms, args.taxa_erro, args.semente)
+    print(f"API de câmbio falsa em http://127.0.0.1:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
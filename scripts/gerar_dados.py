@@ -0,0 +1,276 @@
+"""
+Gerador de dados sintéticos para testes de desempenho.
+
+Preenche o banco com projetos, históricos, recursos e vínculos em escala
+(1k, 100k ou 1M linhas de histórico), com distribuições assimétricas como as
+de um portfólio real: poucos projetos concentram a maior parte do histórico,
+poucas equipes são grandes e alguns recursos participam de muitos projetos.
+A mesma semente gera sempre os mesmos dados.
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.gerar_dados --escala 100k --semente 42 --limpar
+    python -m scripts.gerar_dados --escala 1M --banco /tmp/bench.sqlite3
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Iterable, List
+
+from sqlalchemy import create_engine, event
+
+from model import init_db
+
+# ==============================================
+# Configuração
+# ==============================================
+
+ESCALAS = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+# Data fixa de referência: os dados não dependem do dia em que são gerados
+DATA_REFERENCIA = datetime(2025, 1, 1)
+ANOS_DE_PORTFOLIO = 5
+
+TAMANHO_LOTE = 50_000
+MAXIMO_EQUIPE = 60
+
+TIPOS = [("Desenvolvimento de Software", 45), ("Infraestrutura", 15), ("Dados e Analytics", 12),
+         ("Interno", 10), ("Externo", 8), ("Pesquisa", 5), ("Segurança", 5)]
+STATUS = [("Em andamento", 40), ("Concluído", 25), ("A iniciar", 20), ("Suspenso", 10), ("Cancelado", 5)]
+PAPEIS = [("Desenvolvedor", 35), ("Desenvolvedor Senior", 15), ("Analista", 12), ("QA", 10),
+          ("Arquiteto de Software", 6), ("Gerente de Projeto", 6), ("Designer", 5),
+          ("DBA", 4), ("Scrum Master", 4), ("Cientista de Dados", 3)]
+ALOCACOES = [("100%", 35), ("50%", 20), ("parcial", 10), ("20h semanais", 10), ("40h/semana", 8),
+             ("meio período", 6), ("25%", 5), ("sob demanda", 3), (None, 3)]
+
+ADJETIVOS = ["Novo", "Integrado", "Digital", "Unificado", "Ágil", "Seguro", "Inteligente", "Moderno",
+             "Central", "Automatizado", "Corporativo", "Móvel", "Nacional", "Regional", "Aberto"]
+SUBSTANTIVOS = ["Portal", "Sistema", "Painel", "Motor", "Barramento", "Catálogo", "Aplicativo",
+                "Repositório", "Serviço", "Gateway", "Cadastro", "Orquestrador", "Monitor", "Arquivo"]
+DOMINIOS = ["Clientes", "Pagamentos", "Vendas", "Estoque", "Logística", "Faturamento", "Contratos",
+            "Pessoas", "Compras", "Atendimento", "Crédito", "Cobrança", "Documentos", "Riscos"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Isabela", "João",
+         "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Tiago", "Vanessa", "Yuri"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa", "Ferreira", "Almeida",
+              "Ribeiro", "Carvalho", "Gomes", "Martins", "Rocha", "Barbosa", "Moraes", "Teixeira"]
+EVENTOS = ["Reunião de kickoff realizada", "Escopo revisado", "Entrega da sprint {n}", "Orçamento ajustado",
+           "Risco identificado: dependência de fornecedor", "Homologação concluída", "Deploy em produção",
+           "Mudança de responsável", "Status atualizado", "Marco {n} atingido", "Recurso alocado",
+           "Auditoria de segurança", "Correção de incidente crítico", "Retrospectiva da sprint {n}"]
+
+
+# ==============================================
+# Distribuições
+# ==============================================
+class Sorteio:
+    """Escolha ponderada rápida com pesos acumulados pré-calculados."""
+
+    def __init__(self, rng: random.Random, opcoes: List, pesos: Iterable[float]):
+        self._rng = rng
+        self._opcoes = opcoes
+        self._acumulados = list(accumulate(pesos))
+        self._total = self._acumulados[-1]
+
+    def __call__(self):
+        return self._opcoes[bisect_left(self._acumulados, self._rng.random() * self._total)]
+
+
+def _pareto(rng: random.Random, media: float, alfa: float) -> float:
+    """Valor de uma Pareto com a média pedida (alfa > 1; quanto menor, mais assimétrica)."""
+    return rng.paretovariate(alfa) * media * (alfa - 1) / alfa
+
+
+def _repartir(rng: random.Random, total: int, partes: int, alfa: float) -> List[int]:
+    """Divide `total` em `partes` inteiros com distribuição de Pareto (soma exata)."""
+    pesos = [rng.paretovariate(alfa) for _ in range(partes)]
+    soma = sum(pesos)
+    quantidades = [int(total * peso / soma) for peso in pesos]
+    for indice in rng.sample(range(partes), total - sum(quantidades)):
+        quantidades[indice] += 1
+    return quantidades
+
+
+def base36(numero: int) -> str:
+    digitos = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    texto = ""
+    while True:
+        numero, resto = divmod(numero, 36)
+        texto = digitos[resto] + texto
+        if not numero:
+            return texto
+
+
+def _data(momento: datetime) -> str:
+    # Mesmo formato que o SQLAlchemy grava para DateTime no SQLite (isoformat é bem mais rápido que strftime)
+    return momento.isoformat(" ", "microseconds")
+
+
+# ==============================================
+# Geração
+# ==============================================
+def gerar(engine, historicos: int, semente: int = 42, media_historicos: float = 10.0,
+          media_equipe: float = 5.0, alfa: float = 1.5, limpar: bool = False) -> Dict[str, int]:
+    """
+    Gera `historicos` linhas de histórico e os projetos, recursos e vínculos proporcionais.
+
+    - projetos: historicos / media_historicos, com o histórico repartido por uma Pareto;
+    - equipes: tamanho por projeto com Pareto de média `media_equipe` (máximo MAXIMO_EQUIPE);
+    - recursos: metade do número de projetos (mínimo 50), escolhidos com popularidade
+      decrescente (Zipf), de modo que alguns participam de muitos projetos.
+
+    Retorna a quantidade de linhas inseridas por tabela.
+    """
+    rng = random.Random(semente)
+    init_db(engine)
+
+    total_projetos = max(1, round(historicos / media_historicos))
+    total_recursos = max(50, total_projetos // 2)
+    inicio_portfolio = DATA_REFERENCIA - timedelta(days=365 * ANOS_DE_PORTFOLIO)
+    segundos_portfolio = int((DATA_REFERENCIA - inicio_portfolio).total_seconds())
+
+    tipo, status, papel, alocacao = (Sorteio(rng, [o for o, _ in opcoes], [p for _, p in opcoes])
+                                     for opcoes in (TIPOS, STATUS, PAPEIS, ALOCACOES))
+
+    # ========== Projetos ==========
+    projetos = []
+    datas_projeto = []
+    for indice in range(total_projetos):
+        codigo = base36(indice)
+        adjetivo, substantivo, dominio = rng.choice(ADJETIVOS), rng.choice(SUBSTANTIVOS), rng.choice(DOMINIOS)
+        # Nome e sigla únicos: o código em base 36 do índice garante a unicidade
+        nome = f"{substantivo} {adjetivo} de {dominio} {codigo}"
+        sigla = (substantivo[0] + dominio[0] + adjetivo[0]).upper().translate(str.maketrans("ÁÉÍÓÚÂÊÔÃÕÇ", "AEIOUAEOAOC")) + codigo
+        registro = inicio_portfolio + timedelta(seconds=rng.randrange(segundos_portfolio))
+        datas_projeto.append(registro)
+        projetos.append((
+            indice + 1, nome, sigla, f"Projeto de {dominio.lower()} ({tipo().lower()}).", tipo(),
+            round(rng.lognormvariate(11.5, 1.0), 2), status(), _data(registro), _data(registro),
+        ))
+
+    # ========== Históricos ==========
+    # Laço mais quente do gerador (uma volta por linha): usa rng.random() direto
+    # em vez de randrange/choice, que custam várias chamadas cada.
+    linhas_historico = []
+    identificador = 1
+    sortear = rng.random
+    for projeto_id, quantidade in enumerate(_repartir(rng, historicos, total_projetos, alfa), start=1):
+        registro = datas_projeto[projeto_id - 1]
+        segundos = max(1, int((DATA_REFERENCIA - registro).total_seconds()))
+        for n in range(1, quantidade + 1):
+            momento = registro + timedelta(seconds=int(sortear() * segundos))
+            evento = EVENTOS[int(sortear() * len(EVENTOS))].format(n=n)
+            linhas_historico.append((identificador, evento, _data(momento), projeto_id))
+            identificador += 1
+
+    # ========== Recursos ==========
+    recursos = [
+        (indice + 1, f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}", papel(), alocacao(),
+         _data(DATA_REFERENCIA))
+        for indice in range(total_recursos)
+    ]
+
+    # ========== Vínculos ==========
+    popular = Sorteio(rng, list(range(1, total_recursos + 1)),
+                      (1 / (posicao + 1) ** 0.8 for posicao in range(total_recursos)))
+    vinculos = []
+    for projeto_id in range(1, total_projetos + 1):
+        tamanho = min(MAXIMO_EQUIPE, total_recursos, max(1, math.ceil(_pareto(rng, media_equipe, alfa))))
+        equipe = set()
+        while len(equipe) < tamanho:
+            equipe.add(popular())
+        vinculos.extend((projeto_id, recurso_id) for recurso_id in sorted(equipe))
+
+    # ========== Inserção em bloco ==========
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        if limpar:
+            # As linhas são inseridas fora do ORM: o registro de alterações antigo não vale mais
+            for tabela in ("alteracao", "projeto_recurso", "historico", "recurso", "projeto"):
+                cursor.execute(f"DELETE FROM {tabela}")
+        else:
+            cursor.execute("SELECT (SELECT COUNT(*) FROM projeto) + (SELECT COUNT(*) FROM recurso)")
+            if cursor.fetchone()[0]:
+                raise ValueError("O banco já contém projetos ou recursos; use --limpar para substituí-los.")
+
+        comandos = [
+            ("INSERT INTO projeto (id, nome, sigla, descricao, tipo, custo, status, data_registro, data_atualizacao) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", projetos),
+            ("INSERT INTO historico (id, descricao, data_insercao, projeto_id) VALUES (?, ?, ?, ?)", linhas_historico),
+            ("INSERT INTO recurso (id, nome, papel, alocacao, data_atualizacao) VALUES (?, ?, ?, ?, ?)", recursos),
+            ("INSERT INTO projeto_recurso (projeto_id, recurso_id) VALUES (?, ?)", vinculos),
+        ]
+        for sql, linhas in comandos:
+            for inicio in range(0, len(linhas), TAMANHO_LOTE):
+                cursor.executemany(sql, linhas[inicio:inicio + TAMANHO_LOTE])
+        conexao.commit()
+    except Exception:
+        conexao.rollback()
+        raise
+    finally:
+        conexao.close()
+
+    return {
+        "projeto": len(projetos),
+        "historico": len(linhas_historico),
+        "recurso": len(recursos),
+        "projeto_recurso": len(vinculos),
+    }
+
+
+def criar_engine(caminho: str):
+    """Engine SQLite com ajustes de carga em massa (sem fsync a cada transação)."""
+    engine = create_engine(f"sqlite:///{caminho}")
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(conexao_dbapi, _):
+        cursor = conexao_dbapi.cursor()
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+    return engine
+
+
+def _escala(valor: str) -> int:
+    if valor in ESCALAS:
+        return ESCALAS[valor]
+    try:
+        return int(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Use {', '.join(ESCALAS)} ou um número de linhas de histórico.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos do portfólio para testes de desempenho.")
+    parser.add_argument("--escala", type=_escala, default="1k",
+                        help="Linhas de histórico: 1k, 100k, 1M ou um número (padrão: 1k).")
+    parser.add_argument("--banco", default="database/db.sqlite3", help="Arquivo SQLite de destino.")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do gerador (padrão: 42).")
+    parser.add_argument("--media-historicos", type=float, default=10.0, help="Média de históricos por projeto.")
+    parser.add_argument("--media-equipe", type=float, default=5.0, help="Média de recursos por projeto.")
+    parser.add_argument("--alfa", type=float, default=1.5,
+                        help="Parâmetro das distribuições de Pareto (> 1; menor = mais assimétrico).")
+    parser.add_argument("--limpar", action="store_true", help="Apaga projetos, históricos e recursos existentes.")
+    args = parser.parse_args(argv)
+    if args.alfa <= 1:
+        parser.error("--alfa deve ser maior que 1.")
+
+    inicio = time.perf_counter()
+    try:
+        totais = gerar(criar_engine(args.banco), args.escala, args.semente, args.media_historicos,
+                       args.media_equipe, args.alfa, args.limpar)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    resumo = ", ".join(f"{quantidade} {tabela}" for tabela, quantidade in totais.items())
+    print(f"Gerados {resumo} em {time.perf_counter() - inicio:.1f}s ({args.banco}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Reprodução de tráfego capturado (middleware/captura.py) contra uma instância local.
+
+Lê um ou mais arquivos JSONL de captura (inclusive os rotacionados) e envia
+as requisições na ordem original, respeitando os intervalos entre elas
+(--velocidade 1), acelerados (--velocidade 4 = 4x mais rápido) ou sem espera
+(--velocidade max), com até --concorrencia requisições simultâneas. Ao final
+mostra a distribuição de latência por rota e as respostas divergentes das
+capturadas (status diferente ou corpo JSON diferente, ignorando os campos de
+--ignorar, que mudam a cada execução).
+
+Reproduzido em velocidade, o tráfego esbarra no controle de admissão da
+instância alvo (middleware/admissao.py): suba-a com ADMISSAO_ESCRITAS=0,
+ADMISSAO_LEITURAS=0 e ADMISSAO_TAXA=0. Respostas recusadas por ele (429 ou
+503 com Retry-After, quando a captura tinha outro status) são reenviadas
+após o Retry-After, até --reenvios vezes, e contadas à parte em vez de
+virar divergência.
+
+Uso (a partir da raiz do projeto):
+    python -m scripts.replay log/captura*.jsonl* --url http://127.0.0.1:5000 --velocidade 2 --concorrencia 16
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from scripts.estatistica import resumo
+
+IGNORAR_PADRAO = "id,projeto,projeto_id,data_registro,data_insercao,data_cotacao,obtido_em,mensagem"
+
+
+def ler_capturas(arquivos: List[str]) -> Iterator[dict]:
+    """Lê os registros de todos os arquivos, ignorando linhas inválidas."""
+    for caminho in arquivos:
+        with open(caminho, encoding="utf-8") as arquivo:
+            for numero, linha in enumerate(arquivo, start=1):
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    print(f"# {caminho}:{numero}: linha ignorada (JSON inválido)", file=sys.stderr)
+
+
+def diferencas(esperado, obtido, ignorar: set, caminho: str = "$", limite: int = 5) -> List[str]:
+    """Lista (até `limite`) os caminhos em que dois valores JSON diferem, sem olhar as chaves de `ignorar`."""
+    if isinstance(esperado, dict) and isinstance(obtido, dict):
+        saida = []
+        for chave in sorted(set(esperado) | set(obtido)):
+            if chave in ignorar:
+                continue
+            if chave not in esperado or chave not in obtido:
+                saida.append(f"{caminho}.{chave} ausente em {'obtido' if chave in esperado else 'esperado'}")
+            else:
+                saida += diferencas(esperado[chave], obtido[chave], ignorar, f"{caminho}.{chave}", limite)
+            if len(saida) >= limite:
+                break
+        return saida[:limite]
+    if isinstance(esperado, list) and isinstance(obtido, list):
+        if len(esperado) != len(obtido):
+            return [f"{caminho}: {len(esperado)} item(ns) esperado(s), {len(obtido)} obtido(s)"]
+        saida = []
+        for indice, (a, b) in enumerate(zip(esperado, obtido)):
+            saida += diferencas(a, b, ignorar, f"{caminho}[{indice}]", limite)
+            if len(saida) >= limite:
+                break
+        return saida[:limite]
+    return [] if esperado == obtido else [f"{caminho}: esperado {esperado!r}, obtido {obtido!r}"]
+
+
+def recusada(resposta: requests.Response, registro: dict) -> bool:
+    """A instância alvo recusou a requisição no controle de admissão (e a captura não tinha essa recusa)."""
+    return (resposta.status_code in (429, 503) and resposta.status_code != registro.get("status")
+            and resposta.headers.get("Retry-After", "").isdigit())
+
+
+class Reproducao:
+    """Agenda e envia as requisições capturadas, acumulando latências e divergências."""
+
+    def __init__(self, url: str, velocidade: Optional[float], concorrencia: int, ignorar: set, timeout: float = 60,
+                 reenvios: int = 3):
+        self.url = url.rstrip("/")
+        self.velocidade = velocidade  # None = sem espera
+        self.concorrencia = concorrencia
+        self.ignorar = ignorar
+        self.timeout = timeout
+        self.reenvios = reenvios
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.atrasos: List[float] = []  # quanto cada requisição saiu depois do horário previsto (ms)
+        self.erros_rede = 0
+        self.recusadas = 0  # respostas do controle de admissão da instância alvo
+        self.divergencias: List[dict] = []
+        self.total_divergencias = 0
+
+    def _sessao(self) -> requests.Session:
+        sessao = getattr(self._local, "sessao", None)
+        if sessao is None:
+            sessao = self._local.sessao = requests.Session()
+        return sessao
+
+    def enviar(self, indice: int, registro: dict, previsto: float):
+        atraso = (time.perf_counter() - previsto) * 1000
+        rota = f"{registro['metodo']} {registro.get('rota') or registro['caminho']}"
+        corpo = registro.get("corpo")
+        for tentativa in range(self.reenvios + 1):
+            inicio = time.perf_counter()
+            try:
+                resposta = self._sessao().request(
+                    registro["metodo"], self.url + registro["caminho"], params=registro.get("query") or None,
+                    json=corpo if isinstance(corpo, (dict, list)) else None,
+                    data=corpo if isinstance(corpo, str) else None,
+                    headers={**(registro.get("cabecalhos") or {}), "X-Request-ID": f"replay-{indice}"},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                with self._lock:
+                    self.erros_rede += 1
+                    self._divergencia(registro, rota, [f"erro de rede: {e}"])
+                return
+            duracao = (time.perf_counter() - inicio) * 1000
+            if not recusada(resposta, registro) or tentativa == self.reenvios:
+                break
+            with self._lock:
+                self.recusadas += 1
+            time.sleep(float(resposta.headers["Retry-After"]))
+
+        problemas = []
+        if resposta.status_code != registro.get("status"):
+            problemas.append(f"status: esperado {registro.get('status')}, obtido {resposta.status_code}")
+        elif registro.get("resposta") is not None:
+            try:
+                problemas += diferencas(registro["resposta"], resposta.json(), self.ignorar)
+            except ValueError:
+                problemas.append("resposta obtida não é JSON")
+
+        with self._lock:
+            self.latencias[rota].append(duracao)
+            self.atrasos.append(max(0.0, atraso))
+            if problemas:
+                self._divergencia(registro, rota, problemas)
+
+    def _divergencia(self, registro: dict, rota: str, problemas: List[str]):
+        self.total_divergencias += 1
+        if len(self.divergencias) < 50:
+            self.divergencias.append({"request_id": registro.get("request_id"), "rota": rota,
+                                      "caminho": registro["caminho"], "problemas": problemas})
+
+    def executar(self, registros: List[dict]) -> float:
+        """Envia todos os registros respeitando a velocidade escolhida; devolve a duração total (s)."""
+        registros = sorted(registros, key=lambda r: r["ts"])
+        inicio = time.perf_counter()
+        primeiro = registros[0]["ts"] if registros else 0
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            vagas = threading.Semaphore(self.concorrencia * 2)
+            for indice, registro in enumerate(registros):
+                if self.velocidade:
+                    previsto = inicio + (registro["ts"] - primeiro) / self.velocidade
+                    espera = previsto - time.perf_counter()
+                    if espera > 0:
+                        time.sleep(espera)
+                else:
+                    previsto = time.perf_counter()
+                # Limita a fila: se o servidor não acompanha, o atraso aparece no relatório
+                vagas.acquire()
+                futuro = executor.submit(self.enviar, indice, registro, previsto)
+                futuro.add_done_callback(lambda _: vagas.release())
+        return time.perf_counter() - inicio
+
+    def relatorio(self, duracao: float) -> dict:
+        rotas = {}
+        for rota, latencias in sorted(self.latencias.items()):
+            dados = resumo(latencias)
+            rotas[rota] = {chave: round(valor, 2) if isinstance(valor, float) else valor for chave, valor in dados.items()}
+        total = sum(len(latencias) for latencias in self.latencias.values())
+        atrasos = resumo(self.atrasos)
+        return {
+            "requisicoes": total,
+            "duracao_s": round(duracao, 2),
+            "rps": round(total / duracao, 1) if duracao else None,
+            "erros_rede": self.erros_rede,
+            "recusadas": self.recusadas,
+            "divergencias": self.total_divergencias,
+            "atraso_agendamento_p95_ms": round(atrasos["p95"], 2) if atrasos["p95"] is not None else None,
+            "rotas": rotas,
+            "exemplos_divergencia": self.divergencias,
+        }
+
+
+def _velocidade(valor: str) -> Optional[float]:
+    if valor in ("max", "maxima"):
+        return None
+    try:
+        velocidade = float(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Use um fator (1 = original, 2 = 2x mais rápido) ou 'max'.")
+    if velocidade <= 0:
+        raise argparse.ArgumentTypeError("A velocidade deve ser positiva.")
+    return velocidade
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduz tráfego capturado contra uma instância da API.")
+    parser.add_argument("arquivos", nargs="+", help="Arquivos JSONL de captura.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Endereço da instância alvo.")
+    parser.add_argument("--velocidade", type=_velocidade, default=1.0,
+                        help="1 = intervalos originais, N = N vezes mais rápido, 'max' = sem espera.")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Máximo de requisições simultâneas.")
+    parser.add_argument("--limite", type=int, help="Reproduz só as primeiras N requisições.")
+    parser.add_argument("--ignorar", default=IGNORAR_PADRAO,
+                        help="Campos ignorados na comparação das respostas (separados por vírgula).")
+    parser.add_argument("--reenvios", type=int, default=3,
+                        help="Reenvios de uma requisição recusada pelo controle de admissão (429/503 com Retry-After).")
+    parser.add_argument("--json", help="Grava o relatório neste arquivo.")
+    parser.add_argument("--falhar-divergencias", action="store_true", help="Termina com código 1 se houver divergências.")
+    args = parser.parse_args(argv)
+
+    registros = list(ler_capturas(args.arquivos))
+    registros.sort(key=lambda r: r["ts"])
+    if args.limite:
+        registros = registros[:args.limite]
+    if not registros:
+        print("Nenhuma requisição capturada encontrada.", file=sys.stderr)
+        return 1
+
+    reproducao = Reproducao(args.url, args.velocidade, args.concorrencia,
+                            {campo.strip() for campo in args.ignorar.split(",") if campo.strip()}, reenvios=args.reenvios)
+    relatorio = reproducao.relatorio(reproducao.executar(registros))
+
+    print(f"{relatorio['requisicoes']} requisições em {relatorio['duracao_s']}s ({relatorio['rps']} req/s), "
+          f"{relatorio['erros_rede']} erro(s) de rede, {relatorio['recusadas']} recusada(s) pelo controle de admissão, "
+          f"{relatorio['divergencias']} divergência(s), "
+          f"atraso de agendamento p95 {relatorio['atraso_agendamento_p95_ms']} ms")
+    print(f"\n{'rota':<40} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for rota, dados in relatorio["rotas"].items():
+        print(f"{rota:<40} {dados['n']:>6} {dados['p50']:>9.2f} {dados['p95']:>9.2f} {dados['p99']:>9.2f} {dados['max']:>9.2f}")
+    if relatorio["exemplos_divergencia"]:
+        print("\nDivergências (primeiras):")
+        for divergencia in relatorio["exemplos_divergencia"][:10]:
+            print(f"  {divergencia['rota']} ({divergencia['request_id']}): {'; '.join(divergencia['problemas'])}")
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    return 1 if args.falhar_divergencias and relatorio["divergencias"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
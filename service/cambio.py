@@ -0,0 +1,268 @@
+from datetime import datetime, date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from model.taxa_cambio import TaxaCambio
+from service.cliente_cambio import cliente_cambio, MoedaInvalida
+from logger import logger
+
+# ==============================================
+# Serviço: Cache de Câmbio
+# ==============================================
+# As taxas do BCE (usadas pela Frankfurter API) mudam uma vez por dia útil.
+# Em vez de consultar a API externa a cada conversão, guardamos a tabela
+# completa de cada moeda base em memória e na tabela 'taxa_cambio', válida
+# até a próxima publicação do BCE. Se a API falhar, a última tabela
+# conhecida é servida marcada como desatualizada.
+# ==============================================
+
+# Moeda em que os custos dos projetos são registrados
+MOEDA_CUSTO = "BRL"
+
+# O BCE publica por volta das 16h (horário da Europa Central). 16h UTC cobre
+# o horário de verão e o de inverno com folga para atrasos na publicação.
+HORA_PUBLICACAO_UTC = 16
+
+
+class CambioIndisponivel(Exception):
+    """A API de câmbio falhou e não há nenhuma tabela em cache para servir."""
+
+
+def agora_utc() -> datetime:
+    """Momento atual em UTC, sem fuso (mesma convenção das colunas DateTime)."""
+    return datetime.utcnow()
+
+
+def proxima_publicacao(momento: datetime) -> datetime:
+    """Retorna o primeiro horário de publicação do BCE (dias úteis) posterior a `momento`."""
+    candidato = momento.replace(hour=HORA_PUBLICACAO_UTC, minute=0, second=0, microsecond=0)
+    if candidato <= momento:
+        candidato += timedelta(days=1)
+    while candidato.weekday() >= 5:  # sábado e domingo não têm publicação
+        candidato += timedelta(days=1)
+    return candidato
+
+
+class TabelaCambio:
+    """Tabela de taxas de uma moeda base, válida até a próxima publicação do BCE."""
+
+    def __init__(self, base: str, data_cotacao: date, taxas: Dict[str, float], obtido_em: datetime):
+        self.base = base
+        self.data_cotacao = data_cotacao
+        self.taxas = dict(taxas)
+        self.taxas[base] = 1.0
+        self.obtido_em = obtido_em
+        self.expira_em = proxima_publicacao(obtido_em)
+
+    def fresca(self, momento: datetime) -> bool:
+        """Indica se a tabela ainda é a publicação vigente no `momento` informado."""
+        return momento < self.expira_em
+
+    def taxa(self, moeda: str) -> float:
+        """Retorna a taxa base → `moeda`."""
+        try:
+            return self.taxas[moeda]
+        except KeyError:
+            raise MoedaInvalida(f"Moeda '{moeda}' não suportada.")
+
+    def converter(self, valor: float, moeda: str) -> float:
+        """Converte `valor` da moeda base para `moeda` (aritmética pura, sem I/O)."""
+        return round(valor * self.taxa(moeda), 2)
+
+    def taxa_cruzada(self, de: str, para: str) -> float:
+        """Taxa `de` → `para` derivada desta tabela, mesmo que nenhuma das duas seja a base."""
+        return self.taxa(para) / self.taxa(de)
+
+    def converter_lote(self, conversoes: List[Tuple[float, str, str]]) -> List[Tuple[float, float]]:
+        """
+        Converte uma lista de (valor, de, para) em uma única passada.
+
+        Cada par de moedas distinto tem sua taxa calculada uma só vez; o
+        resultado é uma lista de (valor_convertido, taxa) na mesma ordem.
+        """
+        taxas = {par: self.taxa_cruzada(*par) for par in {(de, para) for _, de, para in conversoes}}
+        return [
+            (round(valor * taxas[(de, para)], 2), taxas[(de, para)])
+            for valor, de, para in conversoes
+        ]
+
+
+class CacheCambio:
+    """Cache de tabelas de câmbio por moeda base, em memória e persistido no banco."""
+
+    def __init__(self, buscar: Callable[[str], dict] = cliente_cambio.ultimas_taxas,
+                 session_factory: Optional[Callable] = None,
+                 relogio: Callable[[], datetime] = agora_utc):
+        self._buscar = buscar
+        self._session_factory = session_factory
+        self._relogio = relogio
+        self._tabelas: Dict[str, TabelaCambio] = {}
+        self.acertos = 0  # respostas servidas do cache (memória ou banco)
+        self.consultas = 0  # consultas feitas à API externa
+        self.obsoletas = 0  # respostas servidas desatualizadas por falha da API
+        self.observadores = []  # funções (resultado) chamadas a cada obtenção (ex: /metrics)
+
+    def _sessao(self):
+        if self._session_factory is None:
+            from model import Session
+            self._session_factory = Session
+        return self._session_factory()
+
+    def obter(self, base: str) -> Tuple[TabelaCambio, bool]:
+        """
+        Retorna a tabela de câmbio da moeda `base` e se ela está atualizada.
+
+        A API externa só é consultada quando nem a memória nem o banco têm a
+        publicação vigente. Em caso de falha da API, devolve a última tabela
+        conhecida com o indicador de atualização falso.
+        """
+        base = base.upper()
+        agora = self._relogio()
+
+        tabela = self._tabelas.get(base)
+        if tabela is None or not tabela.fresca(agora):
+            # Outro worker pode já ter renovado a tabela no banco
+            tabela = self._carregar(base) or tabela
+        if tabela and tabela.fresca(agora):
+            self.acertos += 1
+            self._notificar("acerto")
+            return tabela, True
+
+        try:
+            self.consultas += 1
+            self._notificar("consulta")
+            dados = self._buscar(base)
+        except MoedaInvalida:
+            raise
+        except Exception as e:
+            return self._falha(base, tabela, e)
+
+        nova = self._nova_tabela(base, dados, tabela, agora)
+        if nova is self._tabelas.get(base):
+            return nova, True
+        self._persistir(nova)
+        return nova, True
+
+    async def obter_async(self, base: str, buscar: Callable[[str], Awaitable[dict]],
+                          em_thread: Callable[..., Awaitable]) -> Tuple[TabelaCambio, bool]:
+        """
+        Versão de `obter` para o servidor ASGI (asgi.py).
+
+        A consulta à API é feita por `buscar` (corrotina) e as leituras e
+        gravações no banco por `em_thread(funcao, *args)`, de modo que o loop
+        de eventos nunca bloqueia. A tabela em memória é verificada primeiro,
+        sem I/O.
+        """
+        base = base.upper()
+        agora = self._relogio()
+
+        tabela = self._tabelas.get(base)
+        if tabela is None or not tabela.fresca(agora):
+            tabela = await em_thread(self._carregar, base) or tabela
+        if tabela and tabela.fresca(agora):
+            self.acertos += 1
+            self._notificar("acerto")
+            return tabela, True
+
+        try:
+            self.consultas += 1
+            self._notificar("consulta")
+            dados = await buscar(base)
+        except MoedaInvalida:
+            raise
+        except Exception as e:
+            return self._falha(base, tabela, e)
+
+        nova = self._nova_tabela(base, dados, tabela, agora)
+        if nova is self._tabelas.get(base):
+            return nova, True
+        await em_thread(self._persistir, nova)
+        return nova, True
+
+    def estatisticas(self) -> dict:
+        """Contadores de uso do cache."""
+        return {
+            "acertos": self.acertos,
+            "consultas": self.consultas,
+            "obsoletas": self.obsoletas,
+            "bases": sorted(self._tabelas),
+        }
+
+    def limpar(self):
+        """Descarta as tabelas em memória (o banco é mantido)."""
+        self._tabelas.clear()
+
+    # ========== Internos ==========
+    def _notificar(self, resultado: str):
+        for observador in self.observadores:
+            observador(resultado)
+
+    def _falha(self, base: str, tabela: Optional[TabelaCambio], erro: Exception) -> Tuple[TabelaCambio, bool]:
+        """Serve a última tabela conhecida como desatualizada ou, sem nenhuma, levanta CambioIndisponivel."""
+        if tabela is None:
+            logger.error("Falha ao consultar câmbio para %s sem tabela em cache: %s", base, erro)
+            raise CambioIndisponivel(str(erro))
+        self.obsoletas += 1
+        self._notificar("obsoleta")
+        logger.warning("Falha ao consultar câmbio para %s; servindo cotação de %s: %s",
+                       base, tabela.data_cotacao, erro)
+        return tabela, False
+
+    def _nova_tabela(self, base: str, dados: dict, anterior: Optional[TabelaCambio], agora: datetime) -> TabelaCambio:
+        """Monta a tabela recebida da API (ou devolve a que outra chamada coalescida acabou de salvar)."""
+        atual = self._tabelas.get(base)
+        if atual is not None and atual is not anterior and atual.fresca(agora):
+            # Chamada coalescida: outra thread já salvou esta mesma consulta
+            return atual
+        return TabelaCambio(
+            base=base,
+            data_cotacao=date.fromisoformat(dados["date"]),
+            taxas=dados.get("rates", {}),
+            obtido_em=agora,
+        )
+
+    # ========== Persistência ==========
+    def _carregar(self, base: str) -> Optional[TabelaCambio]:
+        """Lê do banco a última tabela salva para a `base`, se existir."""
+        session = self._sessao()
+        try:
+            linhas = session.query(TaxaCambio).filter_by(base=base).all()
+        except Exception as e:
+            logger.warning("Não foi possível ler taxas de câmbio do banco: %s", e)
+            return None
+        finally:
+            session.close()
+
+        if not linhas:
+            return None
+
+        tabela = TabelaCambio(
+            base=base,
+            data_cotacao=linhas[0].data_cotacao,
+            taxas={linha.moeda: linha.taxa for linha in linhas},
+            obtido_em=linhas[0].obtido_em,
+        )
+        self._tabelas[base] = tabela
+        return tabela
+
+    def _persistir(self, tabela: TabelaCambio):
+        """Substitui em memória e no banco a tabela da moeda base."""
+        self._tabelas[tabela.base] = tabela
+
+        session = self._sessao()
+        try:
+            session.query(TaxaCambio).filter_by(base=tabela.base).delete()
+            session.add_all([
+                TaxaCambio(base=tabela.base, moeda=moeda, taxa=taxa,
+                           data_cotacao=tabela.data_cotacao, obtido_em=tabela.obtido_em)
+                for moeda, taxa in tabela.taxas.items()
+            ])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning("Não foi possível salvar taxas de câmbio no banco: %s", e)
+        finally:
+            session.close()
+
+
+# Instância compartilhada pela aplicação
+cache_cambio = CacheCambio()
@@ -0,0 +1,277 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from logger import logger
+
+# ==============================================
+# Serviço: Cliente da API de Câmbio
+# ==============================================
+# Cliente HTTP dedicado à Frankfurter API. Reaproveita conexões (keep-alive),
+# limita o tempo de conexão e de leitura, repete falhas transitórias com
+# backoff exponencial e jitter, junta requisições idênticas simultâneas em
+# uma única chamada e abre um disjuntor (circuit breaker) após falhas
+# seguidas, para falhar rápido enquanto a API estiver fora do ar.
+# ==============================================
+
+API_URL = os.getenv("CAMBIO_API_URL", "https://api.frankfurter.app")
+
+
+class MoedaInvalida(ValueError):
+    """A moeda informada não é cotada pela API de câmbio."""
+
+
+class ErroCambioUpstream(Exception):
+    """A API de câmbio não respondeu com sucesso após todas as tentativas."""
+
+
+class CircuitoAberto(ErroCambioUpstream):
+    """O disjuntor está aberto: a chamada foi rejeitada sem consultar a API."""
+
+
+class RequisicaoRecusada(ErroCambioUpstream):
+    """A API recusou a requisição (4xx): não adianta repetir, mas a API está no ar."""
+
+
+class Disjuntor:
+    """
+    Disjuntor simples com três estados.
+
+    - fechado: chamadas liberadas; falhas seguidas são contadas.
+    - aberto: após `limite_falhas` falhas seguidas, rejeita chamadas por `tempo_reset` segundos.
+    - semiaberto: passado o tempo, libera uma chamada de teste; sucesso fecha, falha reabre.
+    """
+
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMIABERTO = "semiaberto"
+
+    def __init__(self, limite_falhas: int = 5, tempo_reset: float = 30.0,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.limite_falhas = limite_falhas
+        self.tempo_reset = tempo_reset
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self.estado = self.FECHADO
+        self.falhas_seguidas = 0
+        self._aberto_em = 0.0
+
+    def permitir(self) -> bool:
+        """Indica se uma chamada pode ser feita agora."""
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return True
+            if self.estado == self.ABERTO and self._relogio() - self._aberto_em >= self.tempo_reset:
+                self.estado = self.SEMIABERTO
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.estado = self.FECHADO
+            self.falhas_seguidas = 0
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == self.SEMIABERTO or self.falhas_seguidas >= self.limite_falhas:
+                if self.estado != self.ABERTO:
+                    logger.warning("Disjuntor da API de câmbio aberto após %d falha(s).", self.falhas_seguidas)
+                self.estado = self.ABERTO
+                self._aberto_em = self._relogio()
+
+
+def transitoria(status: int) -> bool:
+    """Respostas que valem nova tentativa (e contam como falha no disjuntor)."""
+    return status >= 500 or status == 429
+
+
+class ClienteCambio:
+    """Cliente HTTP da Frankfurter API com pool de conexões, timeouts, retries e coalescência."""
+
+    def __init__(self, url_base: str = API_URL,
+                 timeout_conexao: float = float(os.getenv("CAMBIO_TIMEOUT_CONEXAO", "3.05")),
+                 timeout_leitura: float = float(os.getenv("CAMBIO_TIMEOUT_LEITURA", "5")),
+                 tentativas: int = int(os.getenv("CAMBIO_TENTATIVAS", "3")),
+                 backoff: float = 0.2,
+                 tamanho_pool: int = 10,
+                 disjuntor: Optional[Disjuntor] = None,
+                 sessao: Optional[requests.Session] = None,
+                 dormir: Callable[[float], None] = time.sleep):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.tentativas = max(1, tentativas)
+        self.backoff = backoff
+        self.disjuntor = disjuntor or Disjuntor(
+            limite_falhas=int(os.getenv("CAMBIO_LIMITE_FALHAS", "5")),
+            tempo_reset=float(os.getenv("CAMBIO_RESET_CIRCUITO", "30")),
+        )
+        self._dormir = dormir
+
+        if sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool)
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+        self._sessao = sessao
+
+        self._lock = threading.Lock()
+        self._em_voo: Dict[Tuple, Future] = {}
+
+        # ========== Métricas ==========
+        self.requisicoes = 0  # chamadas HTTP feitas à API (inclui retentativas)
+        self.erros = 0  # chamadas HTTP que falharam (rede, timeout ou 5xx)
+        self.coalescidas = 0  # chamadas atendidas pela requisição de outra thread
+        self.rejeitadas = 0  # chamadas rejeitadas pelo disjuntor aberto
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+        self.latencias = deque(maxlen=500)  # amostra recente, em segundos
+        self.observadores = []  # funções (duracao, falhou) chamadas a cada chamada HTTP (ex: /metrics)
+
+    # ========== API pública ==========
+    def ultimas_taxas(self, base: str) -> dict:
+        """Tabela de taxas mais recente para a moeda `base` (GET /latest)."""
+        return self.get("/latest", {"from": base})
+
+    def intervalo(self, inicio: str, fim: str, base: str = "EUR") -> dict:
+        """Taxas diárias de `inicio` a `fim` (datas ISO) para a moeda `base` (GET /inicio..fim)."""
+        return self.get(f"/{inicio}..{fim}", {"from": base})
+
+    def get(self, caminho: str, params: Optional[dict] = None) -> dict:
+        """
+        Faz um GET na API e devolve o JSON da resposta.
+
+        Chamadas simultâneas com o mesmo caminho e parâmetros aguardam a
+        primeira, de modo que só uma requisição por chave fica em andamento.
+        """
+        chave = (caminho, tuple(sorted((params or {}).items())))
+        with self._lock:
+            pendente = self._em_voo.get(chave)
+            lider = pendente is None
+            if lider:
+                pendente = self._em_voo[chave] = Future()
+
+        if not lider:
+            self.coalescidas += 1
+            return pendente.result()
+
+        try:
+            resultado = self._get_com_retentativas(caminho, params)
+        except Exception as e:
+            pendente.set_exception(e)
+            raise
+        else:
+            pendente.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+
+    def estatisticas(self) -> dict:
+        """Métricas de latência e erros da API externa."""
+        amostra = sorted(self.latencias)
+
+        def percentil(p):
+            return round(amostra[min(len(amostra) - 1, int(p * len(amostra)))] * 1000, 2) if amostra else None
+
+        return {
+            "requisicoes": self.requisicoes,
+            "erros": self.erros,
+            "coalescidas": self.coalescidas,
+            "rejeitadas_disjuntor": self.rejeitadas,
+            "disjuntor": self.disjuntor.estado,
+            "latencia_media_ms": round(self.latencia_total / self.requisicoes * 1000, 2) if self.requisicoes else None,
+            "latencia_p50_ms": percentil(0.50),
+            "latencia_p95_ms": percentil(0.95),
+            "latencia_maxima_ms": round(self.latencia_maxima * 1000, 2),
+        }
+
+    # ========== Internos ==========
+    def _get_com_retentativas(self, caminho: str, params: Optional[dict]) -> dict:
+        if not self.disjuntor.permitir():
+            self.rejeitadas += 1
+            raise CircuitoAberto("API de câmbio indisponível (disjuntor aberto).")
+
+        url = f"{self.url_base}{caminho}"
+        with self._resultado_no_disjuntor():
+            erro = None
+            for tentativa in range(self.tentativas):
+                if tentativa:
+                    # Backoff exponencial com jitter, para não sincronizar retentativas
+                    self._dormir(random.uniform(0, self.backoff * 2 ** tentativa))
+
+                inicio = time.perf_counter()
+                try:
+                    resposta = self._sessao.get(url, params=params, timeout=self.timeout)
+                except requests.RequestException as e:
+                    erro = e
+                else:
+                    if not transitoria(resposta.status_code):
+                        return self._concluir(inicio, resposta.status_code, resposta.json, params)
+                    erro = ErroCambioUpstream(f"API de câmbio respondeu {resposta.status_code}.")
+
+                self._registrar(inicio, falhou=True)
+                logger.warning("Falha na API de câmbio (tentativa %d/%d): %s", tentativa + 1, self.tentativas, erro)
+
+            raise ErroCambioUpstream(str(erro))
+
+    # ========== Resultado das chamadas (compartilhado com o cliente assíncrono) ==========
+    def _concluir(self, inicio: float, status: int, ler_json: Callable[[], dict], params: Optional[dict]) -> dict:
+        """
+        Trata uma resposta definitiva (não transitória) da API: devolve o JSON
+        ou levanta MoedaInvalida, RequisicaoRecusada ou ErroCambioUpstream
+        (corpo inválido). O disjuntor sempre recebe o resultado: uma chamada
+        de teste (semiaberto) sem resultado deixaria o circuito travado.
+        """
+        if status == 404:
+            self._registrar(inicio, falhou=False)
+            self.disjuntor.registrar_sucesso()
+            raise MoedaInvalida(f"Moeda '{(params or {}).get('from')}' não suportada.")
+        if status >= 400:
+            # A API respondeu: o erro é da requisição, não da disponibilidade
+            self._registrar(inicio, falhou=False)
+            self.disjuntor.registrar_sucesso()
+            raise RequisicaoRecusada(f"API de câmbio recusou a requisição ({status}).")
+        try:
+            dados = ler_json()
+        except ValueError as e:
+            self._registrar(inicio, falhou=True)
+            raise ErroCambioUpstream(f"API de câmbio respondeu com um corpo inválido: {e}") from e
+        self._registrar(inicio, falhou=False)
+        self.disjuntor.registrar_sucesso()
+        return dados
+
+    @contextmanager
+    def _resultado_no_disjuntor(self):
+        """Registra no disjuntor como falha tudo o que sair do bloco sem resultado definido."""
+        try:
+            yield
+        except (MoedaInvalida, RequisicaoRecusada):
+            raise
+        except BaseException:
+            self.disjuntor.registrar_falha()
+            raise
+
+    def _registrar(self, inicio: float, falhou: bool):
+        """Contabiliza uma chamada HTTP nas métricas."""
+        duracao = time.perf_counter() - inicio
+        self.requisicoes += 1
+        self.latencia_total += duracao
+        self.latencia_maxima = max(self.latencia_maxima, duracao)
+        self.latencias.append(duracao)
+        if falhou:
+            self.erros += 1
+        for observador in self.observadores:
+            observador(duracao, falhou)
+
+
+# Instância compartilhada pela aplicação
+cliente_cambio = ClienteCambio()
@@ -0,0 +1,113 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from logger import logger
+from service.cliente_cambio import ClienteCambio, CircuitoAberto, ErroCambioUpstream, transitoria
+
+# ==============================================
+# Serviço: Cliente Assíncrono da API de Câmbio
+# ==============================================
+# Versão assíncrona (httpx) do ClienteCambio, usada pelo servidor ASGI
+# (asgi.py). Enquanto a API externa não responde, a requisição só aguarda no
+# loop de eventos, sem ocupar uma thread. Reaproveita a configuração, o
+# disjuntor e as métricas do cliente síncrono que envolve, de modo que os dois
+# caminhos abrem e fecham o mesmo circuito e aparecem juntos no
+# /conversao/status e no /metrics.
+# ==============================================
+
+
+class ClienteCambioAsync:
+    """Cliente httpx com timeouts, retries, coalescência e o disjuntor de um ClienteCambio."""
+
+    def __init__(self, cliente: ClienteCambio, tamanho_pool: int = 10,
+                 transporte: Optional[httpx.AsyncBaseTransport] = None):
+        self.cliente = cliente
+        self._tamanho_pool = tamanho_pool
+        self._transporte = transporte
+        self._http: Optional[httpx.AsyncClient] = None
+        self._em_voo: Dict[Tuple, asyncio.Future] = {}
+
+    # ========== API pública ==========
+    async def ultimas_taxas(self, base: str) -> dict:
+        """Tabela de taxas mais recente para a moeda `base` (GET /latest)."""
+        return await self.get("/latest", {"from": base})
+
+    async def get(self, caminho: str, params: Optional[dict] = None) -> dict:
+        """
+        Faz um GET na API e devolve o JSON da resposta.
+
+        Chamadas simultâneas com o mesmo caminho e parâmetros aguardam a
+        primeira (todas rodam no mesmo loop, então não há necessidade de lock).
+        """
+        chave = (caminho, tuple(sorted((params or {}).items())))
+        pendente = self._em_voo.get(chave)
+        if pendente is not None:
+            self.cliente.coalescidas += 1
+            return await asyncio.shield(pendente)
+
+        pendente = self._em_voo[chave] = asyncio.get_running_loop().create_future()
+        try:
+            resultado = await self._get_com_retentativas(caminho, params)
+        except asyncio.CancelledError:
+            pendente.cancel()
+            raise
+        except Exception as e:
+            pendente.set_exception(e)
+            pendente.exception()  # marca como recuperada quando ninguém mais aguardava
+            raise
+        else:
+            pendente.set_result(resultado)
+            return resultado
+        finally:
+            del self._em_voo[chave]
+
+    async def fechar(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # ========== Internos ==========
+    def _sessao(self) -> httpx.AsyncClient:
+        # Criado no primeiro uso, dentro do loop de eventos que vai utilizá-lo
+        if self._http is None:
+            conexao, leitura = self.cliente.timeout
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(leitura, connect=conexao),
+                limits=httpx.Limits(max_connections=self._tamanho_pool,
+                                    max_keepalive_connections=self._tamanho_pool),
+                transport=self._transporte,
+            )
+        return self._http
+
+    async def _get_com_retentativas(self, caminho: str, params: Optional[dict]) -> dict:
+        cliente = self.cliente
+        if not cliente.disjuntor.permitir():
+            cliente.rejeitadas += 1
+            raise CircuitoAberto("API de câmbio indisponível (disjuntor aberto).")
+
+        url = f"{cliente.url_base}{caminho}"
+        # A classificação das respostas e o registro no disjuntor são os do cliente síncrono
+        with cliente._resultado_no_disjuntor():
+            erro = None
+            for tentativa in range(cliente.tentativas):
+                if tentativa:
+                    await asyncio.sleep(random.uniform(0, cliente.backoff * 2 ** tentativa))
+
+                inicio = time.perf_counter()
+                try:
+                    resposta = await self._sessao().get(url, params=params)
+                except httpx.HTTPError as e:
+                    erro = e
+                else:
+                    if not transitoria(resposta.status_code):
+                        return cliente._concluir(inicio, resposta.status_code, resposta.json, params)
+                    erro = ErroCambioUpstream(f"API de câmbio respondeu {resposta.status_code}.")
+
+                cliente._registrar(inicio, falhou=True)
+                logger.warning("Falha na API de câmbio (tentativa %d/%d): %s", tentativa + 1, cliente.tentativas, erro)
+
+            raise ErroCambioUpstream(str(erro))
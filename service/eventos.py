@@ -0,0 +1,330 @@
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from typing import Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session as SessaoORM
+
+from model.alteracao import Alteracao, GRAVADAS
+from service.sincronizacao import cursor_atual
+from logger import logger
+
+# ==============================================
+# Serviço: Feed de Eventos (Server-Sent Events)
+# ==============================================
+# Transmite em GET /eventos as linhas do registro de alterações
+# (model/alteracao.py) como eventos compactos: projeto.criado,
+# historico.criado, vinculo.removido... O `id` de cada evento é o ID da
+# alteração, então um cliente que reconecta com Last-Event-ID retoma do ponto
+# exato, lendo o que perdeu do próprio banco.
+#
+# Cada processo tem um único Difusor: uma thread consulta o registro a cada
+# EVENTOS_INTERVALO segundos (uma consulta por worker, qualquer que seja o
+# número de clientes) e entrega os eventos novos na fila de cada assinante.
+# Como a consulta vai ao banco, escritas feitas por outros workers do gunicorn
+# também chegam a todos; escritas do próprio processo acordam a thread no
+# commit, sem esperar o intervalo.
+#
+# A fila de cada cliente tem no máximo EVENTOS_BUFFER eventos. Um cliente
+# lento que a enche é desconectado e, ao reconectar com Last-Event-ID,
+# recupera os eventos pelo banco, sem prender memória do servidor.
+# ==============================================
+
+EVENTOS_INTERVALO = float(os.getenv("EVENTOS_INTERVALO", "1"))  # segundos entre consultas ao registro
+EVENTOS_LOTE = int(os.getenv("EVENTOS_LOTE", "500"))  # alterações lidas por consulta
+EVENTOS_BUFFER = int(os.getenv("EVENTOS_BUFFER", "1000"))  # eventos pendentes por cliente
+EVENTOS_KEEPALIVE = float(os.getenv("EVENTOS_KEEPALIVE", "15"))  # segundos sem eventos até um comentário de keep-alive
+EVENTOS_DURACAO_MAXIMA = float(os.getenv("EVENTOS_DURACAO_MAXIMA", "300"))  # a conexão é encerrada e o cliente reconecta
+EVENTOS_MAX_CONEXOES = int(os.getenv("EVENTOS_MAX_CONEXOES", "16"))  # conexões simultâneas por processo
+EVENTOS_RETRY_MS = int(os.getenv("EVENTOS_RETRY_MS", "3000"))  # espera sugerida ao cliente antes de reconectar
+
+# Nome do evento por tabela do registro de alterações
+_PREFIXOS = {"projeto": "projeto", "recurso": "recurso", "historico": "historico", "projeto_recurso": "vinculo"}
+
+
+class LimiteConexoes(Exception):
+    """O processo já atende EVENTOS_MAX_CONEXOES clientes de eventos."""
+
+
+class Evento(NamedTuple):
+    id: int
+    tipo: str  # ex: projeto.atualizado, vinculo.criado
+    dados: dict
+
+    def formatar(self) -> str:
+        """Evento no formato text/event-stream."""
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {json.dumps(self.dados, separators=(',', ':'))}\n\n"
+
+
+def evento_da_alteracao(id_: int, tabela: str, registro_id: int, operacao: str, dados: Optional[str]) -> Evento:
+    """Converte uma linha do registro de alterações em um evento."""
+    relacionados = json.loads(dados) if dados else {}
+    if tabela == "projeto_recurso":
+        corpo = {"projeto_id": registro_id, **relacionados}
+    else:
+        corpo = {"id": registro_id, **relacionados}
+    return Evento(id_, f"{_PREFIXOS[tabela]}.{operacao}", corpo)
+
+
+class Assinante:
+    """Um cliente conectado: fila limitada de eventos e o último ID entregue."""
+
+    def __init__(self, ultimo_id: int, capacidade: int):
+        self.ultimo_id = ultimo_id
+        self.fila: "queue.Queue[Evento]" = queue.Queue(maxsize=capacidade)
+        self.transbordou = False
+
+    def entregar(self, evento: Evento):
+        if self.transbordou:
+            return  # depois de um evento descartado, os seguintes deixariam uma lacuna invisível ao cliente
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            self.transbordou = True
+
+
+class Difusor:
+    """Lê o registro de alterações do banco e distribui os eventos novos aos assinantes do processo."""
+
+    _instancias: "weakref.WeakSet[Difusor]" = weakref.WeakSet()  # acordadas no commit
+
+    def __init__(self, fabrica=None, intervalo: float = EVENTOS_INTERVALO, lote: int = EVENTOS_LOTE,
+                 capacidade: int = EVENTOS_BUFFER, max_conexoes: int = EVENTOS_MAX_CONEXOES,
+                 duracao: float = EVENTOS_DURACAO_MAXIMA, keepalive: float = EVENTOS_KEEPALIVE):
+        self._fabrica = fabrica  # fábrica de sessões; padrão: model.Session
+        self.intervalo = intervalo
+        self.lote = lote
+        self.capacidade = capacidade
+        self.max_conexoes = max_conexoes
+        self.duracao = duracao
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._assinantes: Set[Assinante] = set()
+        self._acordar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.ultimo_id: Optional[int] = None  # última alteração já distribuída
+        self.enviados = 0
+        self.descartados = 0  # clientes desconectados por encher a fila
+        self.observadores = []  # funções (ocorrencia) chamadas a cada evento enviado ou cliente descartado (ex: /metrics)
+        Difusor._instancias.add(self)
+
+    # ========== Assinaturas ==========
+    def assinar(self, ultimo_id: Optional[int] = None) -> Assinante:
+        """
+        Registra um cliente. Sem `ultimo_id`, ele recebe só os eventos a partir
+        de agora; com ele, o fluxo() lê antes do banco o que ficou para trás.
+        """
+        with self._lock:
+            if len(self._assinantes) >= self.max_conexoes:
+                raise LimiteConexoes(f"Limite de {self.max_conexoes} conexão(ões) de eventos atingido.")
+            if self.ultimo_id is None:
+                # Lido antes de o assinante existir: tudo o que vier depois passa pela thread
+                self.ultimo_id = self._ler_cursor()
+            assinante = Assinante(self.ultimo_id if ultimo_id is None else ultimo_id, self.capacidade)
+            self._assinantes.add(assinante)
+            self._iniciar()
+        return assinante
+
+    def cancelar(self, assinante: Assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+            if not self._assinantes:
+                # Sem ninguém ouvindo a thread para de consultar; o ponto de partida é relido na próxima assinatura
+                self.ultimo_id = None
+
+    def acordar(self):
+        """Antecipa a próxima consulta (chamado no commit de uma sessão que gravou alterações)."""
+        self._acordar.set()
+
+    def estatisticas(self) -> dict:
+        return {"conexoes": len(self._assinantes), "enviados": self.enviados, "descartados": self.descartados}
+
+    def _notificar(self, ocorrencia: str):
+        for observador in self.observadores:
+            observador(ocorrencia)
+
+    # ========== Leitura do banco ==========
+    def _sessao(self):
+        if self._fabrica is None:
+            from model import Session
+            return Session()
+        return self._fabrica()
+
+    def _ler_cursor(self) -> int:
+        session = self._sessao()
+        try:
+            return cursor_atual(session)
+        finally:
+            session.close()
+
+    def ler(self, desde: int, limite: Optional[int] = None) -> List[Evento]:
+        """Eventos com ID maior que `desde`, em ordem, no máximo `limite` (padrão: o lote)."""
+        session = self._sessao()
+        try:
+            linhas = session.execute(
+                select(Alteracao.id, Alteracao.tabela, Alteracao.registro_id, Alteracao.operacao, Alteracao.dados)
+                .where(Alteracao.id > desde).order_by(Alteracao.id).limit(limite or self.lote)
+            ).all()
+        finally:
+            session.close()
+        return [evento_da_alteracao(*linha) for linha in linhas]
+
+    def perdidos(self, ultimo_id: int) -> bool:
+        """Indica se algum evento depois de `ultimo_id` já foi descartado do registro (alteracoes-limpar)."""
+        session = self._sessao()
+        try:
+            primeira = session.execute(select(func.min(Alteracao.id))).scalar()
+        finally:
+            session.close()
+        return primeira is not None and primeira > ultimo_id + 1
+
+    # ========== Thread de distribuição ==========
+    def _iniciar(self):
+        # Após o fork (gunicorn), a thread do processo pai não existe no filho
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._laco, name="eventos-difusor", daemon=True)
+            self._thread.start()
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.distribuir()
+            except Exception as e:
+                logger.warning("Falha ao ler o registro de alterações para os eventos: %s", e)
+
+    def distribuir(self) -> int:
+        """Lê as alterações novas e as entrega aos assinantes; devolve quantos eventos foram lidos."""
+        with self._lock:
+            desde = self.ultimo_id
+        if desde is None:
+            return 0
+        total = 0
+        while True:
+            eventos = self.ler(desde)
+            if not eventos:
+                return total
+            with self._lock:
+                if self.ultimo_id != desde:
+                    # Todos os assinantes saíram (ou o ponto foi reiniciado) durante a leitura
+                    return total
+                for assinante in self._assinantes:
+                    for evento in eventos:
+                        assinante.entregar(evento)
+                desde = self.ultimo_id = eventos[-1].id
+            total += len(eventos)
+            if len(eventos) < self.lote:
+                return total
+
+    # ========== Fluxo de um cliente ==========
+    def fluxo(self, ultimo_id: Optional[int] = None, tipos: Optional[Tuple[str, ...]] = None) -> "Conexao":
+        """
+        Gera o corpo text/event-stream de uma conexão.
+
+        `tipos` filtra pelos prefixos dos eventos (ex: ("historico", "vinculo")).
+        A conexão termina após `self.duracao` segundos ou se a fila do cliente
+        transbordar; nos dois casos o cliente reconecta com Last-Event-ID.
+        Levanta LimiteConexoes antes do primeiro byte se o processo estiver cheio.
+        """
+        reinicio = ultimo_id is not None and self.perdidos(ultimo_id)
+        assinante = self.assinar(None if reinicio else ultimo_id)
+        return Conexao(self, assinante, self._gerar(assinante, reinicio, tipos))
+
+    def _gerar(self, assinante: Assinante, reinicio: bool, tipos) -> Iterator[str]:
+        fim = time.monotonic() + self.duracao
+
+        def enviar(evento: Evento) -> Optional[str]:
+            if evento.id <= assinante.ultimo_id:
+                return None  # já enviado pela leitura do banco
+            assinante.ultimo_id = evento.id
+            if tipos and evento.tipo.split(".")[0] not in tipos:
+                return None
+            self.enviados += 1
+            self._notificar("enviado")
+            return evento.formatar()
+
+        try:
+            yield f"retry: {EVENTOS_RETRY_MS}\n\n"
+            if reinicio:
+                # Alterações perdidas: o cliente refaz a carga (GET /projetos?since=0) e segue deste ponto
+                dados = {"mensagem": "Eventos anteriores já foram descartados; refaça a carga com since=0.",
+                         "cursor": assinante.ultimo_id}
+                yield f"id: {assinante.ultimo_id}\nevent: reinicio\ndata: {json.dumps(dados, separators=(',', ':'))}\n\n"
+
+            # Recuperação pelo banco: o que ficou para trás desde o Last-Event-ID
+            while True:
+                eventos = self.ler(assinante.ultimo_id)
+                pedaco = "".join(filter(None, map(enviar, eventos)))
+                if pedaco:
+                    yield pedaco
+                if len(eventos) < self.lote or time.monotonic() >= fim:
+                    break
+
+            # Tempo real: eventos distribuídos pela thread do processo
+            while True:
+                restante = fim - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    evento = assinante.fila.get(timeout=min(self.keepalive, restante))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # mantém proxies abertos e detecta clientes desconectados
+                    continue
+                eventos = [evento]
+                while True:
+                    try:
+                        eventos.append(assinante.fila.get_nowait())
+                    except queue.Empty:
+                        break
+                # Mesmo com a fila transbordada, estes eventos vêm antes do primeiro descartado
+                pedaco = "".join(filter(None, map(enviar, eventos)))
+                if pedaco:
+                    yield pedaco
+                if assinante.transbordou:
+                    break
+            if assinante.transbordou:
+                self.descartados += 1
+                self._notificar("descartado")
+                logger.warning("Cliente de eventos desconectado por fila cheia (último ID %s).", assinante.ultimo_id)
+        finally:
+            self.cancelar(assinante)
+
+
+class Conexao:
+    """
+    Corpo da resposta de uma conexão de eventos.
+
+    O servidor WSGI chama close() ao fim da resposta, mesmo que o cliente
+    desconecte antes do primeiro byte (quando o gerador nem começou e o seu
+    `finally` não rodaria): a assinatura é sempre cancelada.
+    """
+
+    def __init__(self, difusor: Difusor, assinante: Assinante, gerador: Iterator[str]):
+        self.difusor = difusor
+        self.assinante = assinante
+        self._gerador = gerador
+
+    def __iter__(self):
+        return self._gerador
+
+    def close(self):
+        self._gerador.close()
+        self.difusor.cancelar(self.assinante)
+
+
+# Difusor compartilhado pela aplicação
+difusor = Difusor()
+
+
+@event.listens_for(SessaoORM, "after_commit")
+def _depois_do_commit(session):
+    if session.info.pop(GRAVADAS, False):
+        for instancia in list(Difusor._instancias):
+            instancia.acordar()
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from model.idempotencia import ChaveIdempotencia
+from logger import logger
+
+# ==============================================
+# Serviço: Idempotência (cabeçalho Idempotency-Key)
+# ==============================================
+# Torna seguras as repetições de POST /projeto, POST /historico e POST
+# /projeto/recurso feitas por clientes e gateways após um timeout. A primeira
+# requisição com uma chave a reserva (uma linha na tabela `idempotencia`)
+# antes de executar a rota e, depois, guarda a resposta com um único UPDATE;
+# as repetições recebem a resposta guardada sem tocar nas tabelas do domínio:
+# nada de históricos duplicados, nem de IntegrityError seguido de rollback,
+# nem de tempo a mais com o bloqueio de escrita do SQLite.
+#
+# Uma repetição que chega enquanto a primeira ainda está em andamento não
+# executa a rota: aguarda a resposta dela por até IDEMPOTENCIA_ESPERA
+# segundos e a reproduz, ou recebe 409 com Retry-After se o prazo acabar. No
+# mesmo processo, ela é acordada assim que a resposta é guardada; reservas
+# feitas por outros workers são consultadas no banco em intervalos que
+# dobram de _INTERVALO_INICIAL até _INTERVALO_MAXIMO segundos.
+#
+# Respostas 5xx (e exceções) não são guardadas: a reserva é desfeita e a
+# repetição executa a rota de novo. Uma reserva sem resposta há mais de
+# IDEMPOTENCIA_ABANDONO segundos (o processo morreu no meio da requisição)
+# é assumida pela próxima requisição com a chave.
+#
+# As chaves com mais de IDEMPOTENCIA_RETENCAO_HORAS horas são descartadas na
+# mesma transação que guarda uma resposta, no máximo uma vez a cada
+# IDEMPOTENCIA_INTERVALO_LIMPEZA segundos por processo (e também por
+# `flask idempotencia-limpar`).
+# ==============================================
+
+IDEMPOTENCIA_ESPERA = float(os.getenv("IDEMPOTENCIA_ESPERA", "5"))  # segundos que uma repetição aguarda a primeira requisição
+IDEMPOTENCIA_ABANDONO = float(os.getenv("IDEMPOTENCIA_ABANDONO", "60"))  # segundos até uma reserva sem resposta ser assumida por outra requisição
+IDEMPOTENCIA_RETENCAO_HORAS = int(os.getenv("IDEMPOTENCIA_RETENCAO_HORAS", "24"))  # horas em que as respostas ficam guardadas
+IDEMPOTENCIA_INTERVALO_LIMPEZA = float(os.getenv("IDEMPOTENCIA_INTERVALO_LIMPEZA", "3600"))  # segundos entre limpezas (0: só pela CLI)
+TAMANHO_MAXIMO_CHAVE = 255
+
+_INTERVALO_INICIAL = 0.05  # primeira consulta ao banco enquanto aguarda uma reserva de outro worker
+_INTERVALO_MAXIMO = 0.5  # maior intervalo entre as consultas
+
+Resposta = Tuple[str, int]  # (corpo, status) guardados
+
+
+class ChaveInvalida(ValueError):
+    """O cabeçalho Idempotency-Key está vazio ou é longo demais."""
+
+
+class ChaveReutilizada(ValueError):
+    """A chave já foi usada em uma requisição com outros parâmetros ou outro corpo."""
+
+
+class ChaveEmAndamento(Exception):
+    """A primeira requisição com a chave não terminou dentro de IDEMPOTENCIA_ESPERA segundos."""
+
+
+def impressao_da_requisicao(metodo: str, caminho: str, parametros: bytes, corpo: bytes) -> str:
+    """SHA-256 do que define a requisição: a mesma chave com outro conteúdo é um erro do cliente."""
+    resumo = hashlib.sha256()
+    for parte in (metodo.encode(), caminho.encode(), parametros, corpo):
+        resumo.update(len(parte).to_bytes(8, "big"))
+        resumo.update(parte)
+    return resumo.hexdigest()
+
+
+class RegistroIdempotencia:
+    """Reservas e respostas guardadas por (rota, chave), compartilhadas entre processos pelo banco."""
+
+    def __init__(self, fabrica=None, espera: float = IDEMPOTENCIA_ESPERA, abandono: float = IDEMPOTENCIA_ABANDONO,
+                 retencao_horas: int = IDEMPOTENCIA_RETENCAO_HORAS,
+                 intervalo_limpeza: float = IDEMPOTENCIA_INTERVALO_LIMPEZA):
+        self._fabrica = fabrica  # fábrica de sessões (padrão: model.Session)
+        self.espera = espera
+        self.abandono = abandono
+        self.retencao_horas = retencao_horas
+        self.intervalo_limpeza = intervalo_limpeza
+        self._proxima_limpeza = 0.0  # instante (monotônico) a partir do qual a próxima resposta limpa as chaves
+        self._condicao = threading.Condition()  # avisa as repetições do processo que uma resposta foi guardada
+        self.reproduzidas = 0  # respostas devolvidas a partir do registro
+        self.aguardadas = 0  # repetições que chegaram com a primeira requisição em andamento
+        self.em_andamento = 0  # repetições recusadas com 409 ao fim da espera
+        self.observadores = []  # funções (ocorrencia) chamadas a cada repetição reproduzida, aguardada ou recusada (ex: /metrics)
+
+    def estatisticas(self) -> dict:
+        return {"reproduzidas": self.reproduzidas, "aguardadas": self.aguardadas, "em_andamento": self.em_andamento}
+
+    def _notificar(self, ocorrencia: str):
+        for observador in self.observadores:
+            observador(ocorrencia)
+
+    def _sessao(self):
+        if self._fabrica is None:
+            from model import Session
+            return Session()
+        return self._fabrica()
+
+    # ========== Ciclo de uma requisição ==========
+    def reservar(self, rota: str, chave: str, impressao: str) -> Optional[Resposta]:
+        """
+        Reserva `chave` para a requisição atual ou devolve a resposta guardada.
+
+        None: a reserva é desta requisição, que deve executar a rota e chamar
+        concluir() ou liberar(). Se outra requisição com a chave estiver em
+        andamento, aguarda a resposta dela. Levanta ChaveInvalida,
+        ChaveReutilizada ou ChaveEmAndamento.
+        """
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            raise ChaveInvalida(f"O cabeçalho Idempotency-Key deve ter de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres.")
+
+        limite = time.monotonic() + self.espera
+        intervalo = _INTERVALO_INICIAL
+        aguardou = False
+        while True:
+            session = self._sessao()
+            try:
+                linha = session.get(ChaveIdempotencia, (rota, chave))
+                if linha is None:
+                    session.add(ChaveIdempotencia(rota=rota, chave=chave, impressao=impressao))
+                    try:
+                        session.commit()
+                        return None
+                    except IntegrityError:
+                        # Outra requisição reservou a chave entre a leitura e o INSERT
+                        session.rollback()
+                        continue
+
+                if linha.impressao != impressao:
+                    raise ChaveReutilizada("A chave de idempotência já foi usada em uma requisição diferente.")
+                if linha.status is not None:
+                    with self._condicao:
+                        self.reproduzidas += 1
+                    self._notificar("reproduzida")
+                    return linha.corpo, linha.status
+                if linha.criado_em < datetime.now() - timedelta(seconds=self.abandono):
+                    # Só uma das requisições que chegarem juntas assume a reserva
+                    assumida = session.execute(
+                        update(ChaveIdempotencia)
+                        .where(ChaveIdempotencia.rota == rota, ChaveIdempotencia.chave == chave,
+                               ChaveIdempotencia.status.is_(None), ChaveIdempotencia.criado_em == linha.criado_em)
+                        .values(criado_em=datetime.now())
+                    )
+                    session.commit()
+                    if assumida.rowcount:
+                        logger.warning("Reserva abandonada da chave de idempotência '%s' (%s) assumida.", chave, rota)
+                        return None
+                    continue
+            finally:
+                session.close()
+
+            if not aguardou:
+                aguardou = True
+                with self._condicao:
+                    self.aguardadas += 1
+                self._notificar("aguardada")
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                with self._condicao:
+                    self.em_andamento += 1
+                self._notificar("em_andamento")
+                raise ChaveEmAndamento("Uma requisição com esta chave de idempotência ainda está em andamento.")
+            with self._condicao:
+                self._condicao.wait(min(intervalo, restante))
+            intervalo = min(intervalo * 2, _INTERVALO_MAXIMO)
+
+    def concluir(self, rota: str, chave: str, corpo: str, status: int):
+        """Guarda a resposta da requisição que reservou a chave e acorda as repetições."""
+        self._gravar(update(ChaveIdempotencia)
+                     .where(ChaveIdempotencia.rota == rota, ChaveIdempotencia.chave == chave)
+                     .values(status=status, corpo=corpo), limpar=True)
+
+    def liberar(self, rota: str, chave: str):
+        """Desfaz a reserva (resposta 5xx ou exceção): a próxima requisição com a chave executa a rota."""
+        self._gravar(delete(ChaveIdempotencia)
+                     .where(ChaveIdempotencia.rota == rota, ChaveIdempotencia.chave == chave,
+                            ChaveIdempotencia.status.is_(None)))
+
+    def _gravar(self, comando, limpar: bool = False):
+        session = self._sessao()
+        try:
+            session.execute(comando)
+            if limpar:
+                self._limpar_se_preciso(session)
+            session.commit()
+        except Exception as e:
+            # A resposta da rota já existe: ela segue para o cliente mesmo sem o registro
+            session.rollback()
+            logger.error("Erro ao gravar a chave de idempotência: %s", e)
+        finally:
+            session.close()
+        with self._condicao:
+            self._condicao.notify_all()
+
+    def _limpar_se_preciso(self, session):
+        """Descarta as chaves vencidas na mesma transação, no máximo uma vez por intervalo_limpeza."""
+        agora = time.monotonic()
+        if self.intervalo_limpeza <= 0 or agora < self._proxima_limpeza:
+            return
+        self._proxima_limpeza = agora + self.intervalo_limpeza
+        limite = datetime.now() - timedelta(hours=self.retencao_horas)
+        session.execute(delete(ChaveIdempotencia).where(ChaveIdempotencia.criado_em < limite))
+
+
+def limpar_chaves(session, horas: int = IDEMPOTENCIA_RETENCAO_HORAS) -> int:
+    """Descarta as chaves com mais de `horas` horas; devolve quantas foram removidas."""
+    limite = datetime.now() - timedelta(hours=horas)
+    removidas = session.execute(delete(ChaveIdempotencia).where(ChaveIdempotencia.criado_em < limite)).rowcount
+    session.commit()
+    logger.info("%s chave(s) de idempotência anteriores a %s descartada(s).", removidas, limite.isoformat())
+    return removidas
+
+
+# Instância única do processo (usada pelas rotas e pelas métricas)
+idempotencia = RegistroIdempotencia()
@@ -0,0 +1,328 @@
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import Future
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from model.cobertura_serie import CoberturaSerie
+from model.cotacao_diaria import CotacaoDiaria
+from service.cambio import CambioIndisponivel
+from service.cliente_cambio import cliente_cambio, MoedaInvalida
+from logger import logger
+
+# ==============================================
+# Serviço: Série Histórica de Câmbio
+# ==============================================
+# Guarda localmente as taxas diárias do BCE (base EUR) para converter valores
+# na cotação de uma data específica sem consultar a API externa a cada vez.
+# A série fica na tabela 'cotacao_diaria' e, em memória, em arrays ordenados
+# por data para cada moeda, consultados com busca binária. Períodos ainda não
+# cobertos são baixados em bloco com as consultas por intervalo da API.
+#
+# A cobertura é uma lista de períodos disjuntos, gravada na tabela
+# 'cobertura_serie' junto com as cotações de cada consulta: dois workers
+# podem baixar trechos distantes, e o intervalo entre eles não pode parecer
+# coberto só porque há cotações antes e depois dele.
+#
+# O lock protege só o estado em memória: o download e a gravação no banco
+# acontecem fora dele, e requisições simultâneas que precisam do mesmo
+# período aguardam o download já em andamento em vez de repeti-lo.
+# ==============================================
+
+BASE_SERIE = "EUR"
+
+# Primeira data publicada pelo BCE
+INICIO_SERIE = date(1999, 1, 4)
+
+# Tamanho máximo de cada consulta por intervalo à API
+DIAS_POR_CONSULTA = 366
+
+# Fins de semana e feriados usam a publicação anterior: toda consulta cobre
+# também alguns dias antes do período pedido (o maior recesso do BCE é de 4 dias).
+MARGEM_DIAS = timedelta(days=7)
+
+# A cotação do dia só é publicada à tarde: o dia corrente nunca é dado como
+# coberto, mas é consultado novamente no máximo uma vez por este intervalo.
+INTERVALO_CONSULTA_HOJE = 3600
+
+
+class DataInvalida(ValueError):
+    """A data pedida está fora do período coberto pelas publicações do BCE."""
+
+
+class SerieCambio:
+    """Série diária de taxas (base EUR) em memória e no banco, com busca binária por data."""
+
+    def __init__(self, buscar_intervalo: Callable[[str, str, str], dict] = cliente_cambio.intervalo,
+                 session_factory: Optional[Callable] = None,
+                 hoje: Callable[[], date] = date.today):
+        self._buscar_intervalo = buscar_intervalo
+        self._session_factory = session_factory
+        self._hoje = hoje
+        self._lock = threading.Lock()
+        self._carregada = False
+        # moeda -> (datas como ordinais, taxas), ambos ordenados por data
+        self._series: Dict[str, Tuple[array, array]] = {}
+        # períodos já consultados, disjuntos e ordenados (incluem fins de semana e feriados)
+        self._cobertura: List[Tuple[date, date]] = []
+        self._hoje_consultado_em = float("-inf")
+        self._em_voo: Dict[Tuple[date, date], Future] = {}  # períodos sendo baixados -> resultado
+
+    def _sessao(self):
+        if self._session_factory is None:
+            from model import Session
+            self._session_factory = Session
+        return self._session_factory()
+
+    # ========== Consultas ==========
+    def taxa(self, moeda: str, dia: date) -> Tuple[float, date]:
+        """
+        Taxa EUR → `moeda` vigente em `dia` e a data da publicação usada.
+
+        Em fins de semana e feriados vale a última publicação anterior.
+        """
+        if moeda == BASE_SERIE:
+            return 1.0, dia
+        serie = self._series.get(moeda)
+        if serie is None:
+            raise MoedaInvalida(f"Moeda '{moeda}' não suportada.")
+        datas, taxas = serie
+        indice = bisect_right(datas, dia.toordinal()) - 1
+        if indice < 0:
+            raise DataInvalida(f"Não há cotação de '{moeda}' em {dia.isoformat()}.")
+        return taxas[indice], date.fromordinal(datas[indice])
+
+    def taxa_cruzada(self, de: str, para: str, dia: date) -> Tuple[float, date]:
+        """Taxa `de` → `para` vigente em `dia` e a data da publicação usada."""
+        taxa_de, data_de = self.taxa(de, dia)
+        taxa_para, data_para = self.taxa(para, dia)
+        # O EUR não tem publicação própria: a data vem da(s) outra(s) moeda(s)
+        datas = [data for moeda, data in ((de, data_de), (para, data_para)) if moeda != BASE_SERIE]
+        return taxa_para / taxa_de, max(datas, default=dia)
+
+    def converter_lote(self, conversoes: List[Tuple[float, str, str, date]]) -> Tuple[List[Tuple[float, float, date]], bool]:
+        """
+        Converte uma lista de (valor, de, para, dia), cada um na cotação do seu dia.
+
+        Garante a cobertura do período inteiro com no máximo uma rodada de
+        consultas à API e retorna [(valor_convertido, taxa, data_cotacao)] e
+        se a série estava atualizada.
+        """
+        if not conversoes:
+            return [], True
+        dias = [dia for _, _, _, dia in conversoes]
+        atualizada = self.garantir(min(dias), max(dias))
+
+        taxas = {}
+        resultados = []
+        for valor, de, para, dia in conversoes:
+            chave = (de, para, dia)
+            if chave not in taxas:
+                taxas[chave] = self.taxa_cruzada(de, para, dia)
+            taxa, data_cotacao = taxas[chave]
+            resultados.append((round(valor * taxa, 2), taxa, data_cotacao))
+        return resultados, atualizada
+
+    # ========== Preenchimento ==========
+    def garantir(self, inicio: date, fim: date) -> bool:
+        """
+        Garante que a série cubra o período [inicio, fim], baixando o que faltar.
+
+        Retorna falso se a API falhou e o período foi coberto só em parte; nesse
+        caso as datas descobertas usam a última cotação conhecida. Se nada
+        anterior a `fim` estiver disponível, lança CambioIndisponivel.
+        """
+        hoje = self._hoje()
+        if inicio < INICIO_SERIE or fim > hoje:
+            raise DataInvalida(f"Datas devem estar entre {INICIO_SERIE.isoformat()} e {hoje.isoformat()}.")
+        inicio = max(INICIO_SERIE, inicio - MARGEM_DIAS)
+
+        with self._lock:
+            self._carregar()
+            downloads = [self._reservar(de, ate) for de, ate in self._faltantes(inicio, fim, hoje)]
+
+        try:
+            # Primeiro os downloads desta chamada, depois os das outras: ninguém espera em círculo
+            for (de, ate), futuro, proprio in sorted(downloads, key=lambda d: not d[2]):
+                if proprio:
+                    self._executar(de, ate, futuro)
+                futuro.result()
+        except MoedaInvalida:
+            raise
+        except Exception as e:
+            if not self._cobertura or self._cobertura[0][0] > fim:
+                logger.error("Falha ao baixar série de câmbio sem dados locais: %s", e)
+                raise CambioIndisponivel(str(e))
+            logger.warning("Falha ao completar série de câmbio de %s a %s: %s", inicio, fim, e)
+            return False
+        finally:
+            # Um download reservado e não iniciado (falha em um anterior) não pode prender os demais
+            for (de, ate), futuro, proprio in downloads:
+                if proprio and not futuro.done():
+                    self._executar(de, ate, futuro, cancelar=True)
+        return True
+
+    def preencher(self, inicio: date, fim: Optional[date] = None) -> int:
+        """Preenche a série em bloco de `inicio` até `fim` (padrão: hoje). Retorna o total de dias cobertos."""
+        fim = fim or self._hoje()
+        self.garantir(inicio, fim)
+        return sum((ate - de).days + 1 for de, ate in self._cobertura)
+
+    def _faltantes(self, inicio: date, fim: date, hoje: date) -> List[Tuple[date, date]]:
+        """Períodos de [inicio, fim] fora da cobertura atual (chamado com o lock)."""
+        faltantes = []
+        proximo = inicio
+        for de, ate in self._cobertura:
+            if ate < proximo:
+                continue
+            if de > fim:
+                break
+            if de > proximo:
+                faltantes.append((proximo, de - timedelta(days=1)))
+            proximo = ate + timedelta(days=1)
+        if proximo <= fim:
+            faltantes.append((proximo, fim))
+        if faltantes and faltantes[-1] == (hoje, hoje):
+            if time.monotonic() - self._hoje_consultado_em < INTERVALO_CONSULTA_HOJE:
+                faltantes.pop()
+        return faltantes
+
+    def _cobrir(self, inicio: date, fim: date):
+        """Acrescenta [inicio, fim] à cobertura, unindo períodos sobrepostos ou vizinhos (chamado com o lock)."""
+        cobertura = []
+        for de, ate in sorted([*self._cobertura, (inicio, fim)]):
+            if cobertura and de <= cobertura[-1][1] + timedelta(days=1):
+                cobertura[-1] = (cobertura[-1][0], max(cobertura[-1][1], ate))
+            else:
+                cobertura.append((de, ate))
+        self._cobertura = cobertura
+
+    def _reservar(self, inicio: date, fim: date) -> Tuple[Tuple[date, date], Future, bool]:
+        """
+        Devolve o download em andamento que já cobre o período ou reserva um
+        novo (chamado com o lock). O terceiro valor diz se o download é desta
+        chamada, que deve executá-lo com _executar().
+        """
+        for (de, ate), futuro in self._em_voo.items():
+            if de <= inicio and fim <= ate:
+                return (de, ate), futuro, False
+        futuro = self._em_voo[(inicio, fim)] = Future()
+        return (inicio, fim), futuro, True
+
+    def _executar(self, inicio: date, fim: date, futuro: Future, cancelar: bool = False):
+        """Executa (ou cancela) um download reservado e avisa quem o aguarda."""
+        try:
+            if cancelar:
+                futuro.set_exception(CambioIndisponivel("Download da série de câmbio interrompido."))
+                return
+            try:
+                self._baixar(inicio, fim)
+            except BaseException as e:
+                futuro.set_exception(e)
+            else:
+                futuro.set_result(None)
+        finally:
+            with self._lock:
+                self._em_voo.pop((inicio, fim), None)
+
+    def _baixar(self, inicio: date, fim: date):
+        """Baixa o período em consultas por intervalo (sem o lock) e incorpora ao banco e à memória."""
+        hoje = self._hoje()
+        trechos = []
+        trecho = inicio
+        while trecho <= fim:
+            ate = min(fim, trecho + timedelta(days=DIAS_POR_CONSULTA - 1))
+            trechos.append((trecho, ate))
+            trecho = ate + timedelta(days=1)
+
+        for trecho, ate in trechos:
+            dados = self._buscar_intervalo(trecho.isoformat(), ate.isoformat(), BASE_SERIE)
+            registros = [
+                (date.fromisoformat(dia), moeda, taxa)
+                for dia, taxas in dados.get("rates", {}).items()
+                for moeda, taxa in taxas.items()
+            ]
+            # O dia corrente ainda pode ganhar a publicação da tarde: não entra na cobertura
+            coberto_ate = min(ate, hoje - timedelta(days=1))
+            coberto = (trecho, coberto_ate) if trecho <= coberto_ate else None
+            self._persistir(registros, coberto)
+            with self._lock:
+                self._incorporar(registros)
+                if ate >= hoje:
+                    self._hoje_consultado_em = time.monotonic()
+                if coberto is not None:
+                    self._cobrir(*coberto)
+            logger.info("Série de câmbio: %d cotação(ões) baixada(s) de %s a %s.", len(registros), trecho, ate)
+
+    def _incorporar(self, registros: Iterable[Tuple[date, str, float]]):
+        """Mescla novos registros aos arrays ordenados de cada moeda."""
+        novos: Dict[str, Dict[int, float]] = {}
+        for dia, moeda, taxa in registros:
+            novos.setdefault(moeda, {})[dia.toordinal()] = taxa
+
+        for moeda, pontos in novos.items():
+            datas, taxas = self._series.get(moeda, (array("l"), array("d")))
+            pontos = {**dict(zip(datas, taxas)), **pontos}
+            ordenadas = sorted(pontos)
+            # Substitui a referência inteira: leitores concorrentes nunca veem arrays pela metade
+            self._series[moeda] = (array("l", ordenadas), array("d", (pontos[d] for d in ordenadas)))
+
+    # ========== Persistência ==========
+    def _carregar(self):
+        """Carrega a série salva no banco na primeira utilização."""
+        if self._carregada:
+            return
+        session = self._sessao()
+        try:
+            linhas = session.query(CotacaoDiaria.data, CotacaoDiaria.moeda, CotacaoDiaria.taxa).all()
+            periodos = session.query(CoberturaSerie.inicio, CoberturaSerie.fim).all()
+        finally:
+            session.close()
+        self._incorporar(linhas)
+        for de, ate in periodos:
+            self._cobrir(de, ate)
+        self._carregada = True
+
+    def _persistir(self, registros: List[Tuple[date, str, float]], coberto: Optional[Tuple[date, date]] = None):
+        """
+        Insere os registros e o período consultado em uma transação, ignorando
+        as linhas que já existem (outro worker pode tê-las gravado).
+        """
+        if not registros and coberto is None:
+            return
+        session = self._sessao()
+        try:
+            dialeto = session.get_bind().dialect.name
+            if dialeto in ("sqlite", "postgresql"):
+                inserir = sqlite.insert if dialeto == "sqlite" else postgresql.insert
+                comando = inserir(CotacaoDiaria.__table__).on_conflict_do_nothing()
+                comando_cobertura = inserir(CoberturaSerie.__table__).on_conflict_do_nothing()
+            else:
+                # Sem ON CONFLICT no dialeto: descarta antes as chaves que já estão no banco
+                if registros:
+                    existentes = set(session.query(CotacaoDiaria.data, CotacaoDiaria.moeda).filter(
+                        CotacaoDiaria.data.between(min(r[0] for r in registros), max(r[0] for r in registros))))
+                    registros = [r for r in registros if (r[0], r[1]) not in existentes]
+                if coberto is not None and session.get(CoberturaSerie, coberto) is not None:
+                    coberto = None
+                comando = insert(CotacaoDiaria.__table__)
+                comando_cobertura = insert(CoberturaSerie.__table__)
+            if registros:
+                session.execute(comando, [{"data": dia, "moeda": moeda, "taxa": taxa} for dia, moeda, taxa in registros])
+            if coberto is not None:
+                session.execute(comando_cobertura, {"inicio": coberto[0], "fim": coberto[1]})
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+# Instância compartilhada pela aplicação
+serie_cambio = SerieCambio()
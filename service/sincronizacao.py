@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple, Union
+
+from sqlalchemy import func, select
+
+from model.alteracao import Alteracao, REMOVIDO
+from logger import logger
+
+# ==============================================
+# Serviço: Sincronização Incremental (?since=)
+# ==============================================
+# Responde "o que mudou desde X" a partir do registro de alterações
+# (model/alteracao.py), com custo proporcional ao número de alterações e não
+# ao tamanho da tabela. X pode ser:
+#   - um cursor (inteiro): o `cursor` devolvido pela consulta anterior.
+#     0 é a carga inicial (todos os registros atuais);
+#   - uma data e hora: usa o índice de `data_atualizacao` e as lápides do
+#     período. Sujeito a diferenças de relógio entre servidores; prefira o cursor.
+#
+# O cursor é lido antes dos registros. Uma alteração concorrente pode então
+# aparecer nesta resposta e novamente na próxima, mas nunca é perdida (no
+# SQLite há um único escritor, e os IDs seguem a ordem dos commits).
+# ==============================================
+
+Desde = Union[int, datetime]
+
+
+class CursorExpirado(ValueError):
+    """O ponto pedido é anterior às alterações ainda guardadas: é preciso refazer a carga (since=0)."""
+
+
+def cursor_atual(session) -> int:
+    """Sequência da última alteração registrada (0 se não houver nenhuma)."""
+    return session.execute(select(func.max(Alteracao.id))).scalar() or 0
+
+
+def alteracoes_desde(session, modelo, tabela: str, desde: Desde, *opcoes) -> Tuple[list, List[int], int]:
+    """
+    Registros de `modelo` criados ou alterados depois de `desde` e IDs removidos desde então.
+
+    `opcoes` são repassadas à consulta (ex: selectinload). Devolve
+    (registros, removidos, cursor). Levanta CursorExpirado se `desde` for
+    anterior ao registro de alterações que ainda é mantido.
+    """
+    cursor = cursor_atual(session)
+    _verificar_horizonte(session, desde)
+
+    consulta = session.query(modelo).options(*opcoes)
+    lapides = select(Alteracao.registro_id).where(Alteracao.tabela == tabela, Alteracao.operacao == REMOVIDO)
+    if isinstance(desde, datetime):
+        registros = consulta.filter(modelo.data_atualizacao > desde).order_by(modelo.id).all()
+        lapides = lapides.where(Alteracao.momento > desde)
+    elif desde == 0:
+        return consulta.order_by(modelo.id).all(), [], cursor
+    else:
+        alterados = select(Alteracao.registro_id).where(Alteracao.tabela == tabela, Alteracao.id > desde)
+        registros = consulta.filter(modelo.id.in_(alterados)).order_by(modelo.id).all()
+        lapides = lapides.where(Alteracao.id > desde)
+
+    # Um ID removido e depois reutilizado por um registro novo volta como alterado
+    presentes = {registro.id for registro in registros}
+    removidos = sorted({registro_id for (registro_id,) in session.execute(lapides)} - presentes)
+    return registros, removidos, cursor
+
+
+def _verificar_horizonte(session, desde: Desde):
+    primeira = session.execute(
+        select(Alteracao.id, Alteracao.momento).order_by(Alteracao.id).limit(1)
+    ).first()
+    # O registro começa no ID 1 (AUTOINCREMENT); um primeiro ID maior indica limpeza
+    if primeira is None or primeira.id == 1:
+        return
+    if isinstance(desde, datetime):
+        if desde < primeira.momento:
+            raise CursorExpirado(f"Alterações anteriores a {primeira.momento.isoformat()} já foram descartadas; "
+                                 f"refaça a carga com since=0.")
+    elif 0 < desde < primeira.id - 1:
+        raise CursorExpirado(f"O cursor {desde} já foi descartado; refaça a carga com since=0.")
+
+
+def limpar_alteracoes(session, dias: int) -> int:
+    """Descarta as alterações com mais de `dias` dias, mantendo sempre a mais recente (referência do cursor)."""
+    limite = datetime.now() - timedelta(days=dias)
+    ultima = cursor_atual(session)
+    removidas = session.query(Alteracao).filter(
+        Alteracao.momento < limite, Alteracao.id < ultima
+    ).delete(synchronize_session=False)
+    session.commit()
+    logger.info("%s alteração(ões) anteriores a %s descartada(s).", removidas, limite.isoformat())
+    return removidas
@@ -0,0 +1,20 @@
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import app
+from model.base import Base
+
+
+@pytest.fixture
+def sessao(monkeypatch, tmp_path):
+    """Fábrica de sessões de um banco SQLite em arquivo, usada pelas rotas no lugar do banco da aplicação."""
+    # Em arquivo e sem check_same_thread: threads de teste, do difusor e do asgi.py usam o mesmo banco
+    engine = create_engine(f"sqlite:///{tmp_path / 'teste.sqlite3'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(bind=engine)
+    monkeypatch.setattr(app_module, "Session", fabrica)
+    app.config['TESTING'] = True
+    yield fabrica
+    engine.dispose()
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+import asgi
+from app import app
+from middleware import admissao
+from middleware.admissao import Compartimento, ControleAdmissao, LimiteTaxa, Sobrecarga
+from model.historico import Historico
+from model.projeto import Projeto
+
+
+def teste_compartimento_com_fila_limitada():
+    compartimento = Compartimento("escrita", limite=1, fila=1, espera_maxima=5.0)
+    assert compartimento.entrar() == 0.0
+
+    esperas = []
+    na_fila = threading.Thread(target=lambda: esperas.append(compartimento.entrar()))
+    na_fila.start()
+    while compartimento.na_fila == 0:
+        time.sleep(0.001)
+    with pytest.raises(Sobrecarga) as erro:
+        compartimento.entrar()  # fila cheia: recusa imediata
+    assert (erro.value.motivo, erro.value.retry_after) == ("fila", 5)
+
+    time.sleep(0.05)
+    compartimento.sair()
+    na_fila.join()
+    assert esperas[0] >= 0.05 and compartimento.estatisticas() == {"em_andamento": 1, "na_fila": 0}
+
+    compartimento.espera_maxima = 0.05
+    with pytest.raises(Sobrecarga) as erro:
+        compartimento.entrar()
+    assert erro.value.motivo == "espera" and compartimento.na_fila == 0
+
+
+def teste_limite_de_taxa_por_cliente():
+    limite = LimiteTaxa(taxa=20.0, rajada=2, max_clientes=2)
+    assert [limite.consumir("a"), limite.consumir("a")] == [0.0, 0.0]
+    assert 0 < limite.consumir("a") <= 0.05
+    assert limite.consumir("b") == 0.0  # cada cliente tem o seu balde
+    time.sleep(0.06)
+    assert limite.consumir("a") == 0.0
+
+    limite.consumir("c")  # acima de max_clientes, o inativo há mais tempo é esquecido
+    assert set(limite._baldes) == {"a", "c"}
+
+
+def teste_cliente_pelo_x_forwarded_for_dos_proxies_confiaveis(monkeypatch, sessao):
+    controle = ControleAdmissao(proxies=1)
+    assert controle.cliente("10.0.0.2", "203.0.113.9") == "203.0.113.9"
+    assert controle.cliente("10.0.0.2", "1.2.3.4, 203.0.113.9") == "203.0.113.9"  # o da esquerda é forjável
+    assert ControleAdmissao(proxies=2).cliente("10.0.0.2", "1.2.3.4, 203.0.113.9, 10.0.0.1") == "203.0.113.9"
+    assert ControleAdmissao(proxies=2).cliente("10.0.0.2", "203.0.113.9") == "10.0.0.2"
+    assert ControleAdmissao().cliente("10.0.0.2", "203.0.113.9") == "10.0.0.2"  # sem proxies, o cabeçalho é ignorado
+    assert ControleAdmissao().limite_taxa is None  # desligado por padrão
+
+    # Atrás do balanceador, cada cliente tem o próprio balde
+    monkeypatch.setattr(admissao, "controle", ControleAdmissao(taxa=1.0, rajada=1, proxies=1))
+    with app.test_client() as client:
+        assert client.get("/recursos", headers={"X-Forwarded-For": "203.0.113.1"}).status_code == 200
+        assert client.get("/recursos", headers={"X-Forwarded-For": "203.0.113.2"}).status_code == 200
+        assert client.get("/recursos", headers={"X-Forwarded-For": "203.0.113.1"}).status_code == 429
+
+    async def requisitar(endereco):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.aplicacao), base_url="http://teste") as cliente:
+            return await cliente.get("/recursos", headers={"X-Forwarded-For": endereco})
+    assert asyncio.run(requisitar("203.0.113.2")).status_code == 429
+    assert asyncio.run(requisitar("203.0.113.3")).status_code == 200
+
+
+def teste_escritas_recusadas_sem_afetar_leituras(monkeypatch, sessao):
+    s = sessao()
+    s.add(Projeto(nome="Projeto ADM", sigla="ADM", descricao="d", tipo="Interno", custo=1.0, status="A iniciar"))
+    s.commit()
+    s.close()
+    controle = ControleAdmissao(escritas=1, fila_escritas=0, taxa=0)
+    monkeypatch.setattr(admissao, "controle", controle)
+    segurando, liberar = threading.Event(), threading.Event()
+
+    @event.listens_for(sessao, "before_commit")
+    def segurar_historico(session):
+        # A escrita fica com a vaga, como se esperasse o bloqueio de escrita do SQLite
+        if any(isinstance(obj, Historico) for obj in session.new):
+            segurando.set()
+            liberar.wait(5)
+
+    respostas = []
+    escrita = threading.Thread(target=lambda: respostas.append(
+        app.test_client().post("/historico?id=1", json={"descricao": "Lenta"})))
+    escrita.start()
+    assert segurando.wait(5)
+
+    with app.test_client() as client:
+        recusada = client.post("/historico?id=1", json={"descricao": "Excedente"})
+        assert recusada.status_code == 503 and recusada.headers["Retry-After"] == "2"
+        assert client.get("/recursos").status_code == 200
+        assert client.post("/conversao/lote", json={}).status_code != 503  # POST de leitura
+        liberar.set()
+        escrita.join()
+        assert respostas[0].status_code == 200 and controle.estatisticas()["escrita"] == {"em_andamento": 0, "na_fila": 0}
+
+        metricas = client.get("/metrics").get_data(as_text=True)
+        assert 'admissao_rejeicoes_total{classe="escrita",motivo="fila"}' in metricas
+        assert 'admissao_espera_segundos_count{classe="leitura"}' in metricas
+
+
+def teste_limite_de_taxa_nas_rotas_flask_e_asgi(monkeypatch, sessao):
+    monkeypatch.setattr(admissao, "controle", ControleAdmissao(taxa=1.0, rajada=2))
+    with app.test_client() as client:
+        assert [client.get("/recursos").status_code for _ in range(3)] == [200, 200, 429]
+        recusada = client.get("/projetos")
+        assert recusada.headers["Retry-After"] == "1" and "mensagem" in recusada.get_json()
+        assert client.get("/healthz").status_code == 200  # rotas de operação ficam de fora
+
+    # Nas rotas assíncronas do asgi.py, o mesmo cliente (127.0.0.1) continua sem fichas
+    async def requisitar():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.aplicacao), base_url="http://teste") as cliente:
+            return await cliente.get("/recursos")
+    resposta = asyncio.run(requisitar())
+    assert resposta.status_code == 429 and resposta.headers["retry-after"] == "1"
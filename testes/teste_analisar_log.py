@@ -0,0 +1,45 @@
+import gzip
+import json
+
+from scripts.analisar_log import analisar, arquivos_em_ordem, interpretar, ler_acessos
+
+LINHA = ("[2026-10-19 10:00:{seg:02d},100] INFO [abc] registrar_medicao() L150  GET /projetos {status} "
+         "total_ms={ms} bytes=512 consultas=2 db_ms=0.41 serializacao_ms=1.34 rota=/projetos - call_trace=/app/x.py L150")
+
+
+def teste_interpretar_texto_json_e_outras_linhas():
+    acesso = interpretar(LINHA.format(seg=1, status=200, ms="14.28"))
+    assert (acesso.metodo, acesso.rota, acesso.status, acesso.duracao_ms, acesso.tamanho) == ("GET", "/projetos", 200, 14.28, 512)
+
+    json_linha = json.dumps({"ts": "2026-10-19 10:00:01,100", "logger": "instrumentacao", "metodo": "POST",
+                             "rota": "/projeto", "status": 409, "total_ms": 3.5, "bytes": 80})
+    assert interpretar(json_linha).rota == "/projeto"
+
+    assert interpretar("[2026-10-19 10:00:01,100] INFO [-] listar_projetos() L258  11 projeto(s) encontrados.") is None
+
+
+def teste_rotacionados_em_ordem_e_agregacao(tmp_path):
+    atual = tmp_path / "gunicorn.detailed.log"
+    atual.write_text("\n".join(LINHA.format(seg=s, status=200, ms="10") for s in range(10, 20)) + "\n")
+    (tmp_path / "gunicorn.detailed.log.1").write_text(LINHA.format(seg=5, status=500, ms="100") + "\n")
+    with gzip.open(tmp_path / "gunicorn.detailed.log.2.gz", "wt") as arquivo:
+        arquivo.write(LINHA.format(seg=0, status=200, ms="1") + "\n")
+
+    arquivos = arquivos_em_ordem([str(tmp_path / "gunicorn.detailed.log*")])
+    assert [a.rsplit("/", 1)[1] for a in arquivos] == ["gunicorn.detailed.log.2.gz", "gunicorn.detailed.log.1", "gunicorn.detailed.log"]
+
+    relatorio = analisar(ler_acessos(arquivos))
+    rota = relatorio["janelas"][0]["rotas"]["GET /projetos"]
+    assert rota["n"] == 12
+    assert rota["taxa_erro_5xx"] == round(1 / 12, 4)
+    assert abs(rota["p50_ms"] - 10) < 0.5
+    assert rota["max_ms"] == 100
+    assert rota["bytes_medio"] == 512
+
+    # Sob o gunicorn, cada worker tem os próprios arquivos: o padrão pega todos
+    (tmp_path / "gunicorn.detailed.w2.log").write_text(LINHA.format(seg=30, status=200, ms="10") + "\n")
+    (tmp_path / "gunicorn.detailed.w2.log.1").write_text(LINHA.format(seg=25, status=200, ms="10") + "\n")
+    arquivos = arquivos_em_ordem([str(tmp_path / "gunicorn.detailed*.log*")])
+    assert len(arquivos) == 5 and arquivos.index(str(tmp_path / "gunicorn.detailed.w2.log.1")) < \
+        arquivos.index(str(tmp_path / "gunicorn.detailed.w2.log"))
+    assert analisar(ler_acessos(arquivos))["janelas"][0]["rotas"]["GET /projetos"]["n"] == 14
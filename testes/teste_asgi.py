@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import asgi
+from app import app
+from model.base import Base
+from model.projeto import Projeto
+from model.recurso import Recurso
+from service.cambio import CacheCambio
+from service.cliente_cambio import ClienteCambio, Disjuntor, ErroCambioUpstream, RequisicaoRecusada
+from service.cliente_cambio_async import ClienteCambioAsync
+
+
+@pytest.fixture
+def ambiente(monkeypatch, tmp_path):
+    """Banco em arquivo (as rotas assíncronas usam várias threads) e API de câmbio simulada."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'teste.sqlite3'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    sessao = sessionmaker(bind=engine)
+    s = sessao()
+    projeto = Projeto(nome="Projeto ASGI", sigla="ASG", descricao="d", tipo="Interno", custo=1000.0, status="A iniciar")
+    projeto.recursos.append(Recurso(nome="Ana", papel="Dev", alocacao="100%"))
+    s.add_all([projeto, Recurso(nome="Bia", papel="QA", alocacao="50%")])
+    s.commit()
+    s.close()
+
+    chamadas = []
+
+    async def responder(requisicao: httpx.Request):
+        chamadas.append(str(requisicao.url))
+        await asyncio.sleep(0.05)
+        if requisicao.url.params["from"] == "XXX":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"base": requisicao.url.params["from"], "date": "2026-10-16",
+                                         "rates": {"USD": 0.2, "EUR": 0.18}})
+
+    cliente = ClienteCambio(url_base="http://cambio.teste", tentativas=1)
+    monkeypatch.setattr(app_module, "Session", sessao)
+    monkeypatch.setattr(app_module, "cliente_cambio", cliente)
+    monkeypatch.setattr(app_module, "cache_cambio", CacheCambio(buscar=cliente.ultimas_taxas, session_factory=sessao))
+    monkeypatch.setattr(asgi, "_cliente_async", ClienteCambioAsync(cliente, transporte=httpx.MockTransport(responder)))
+    app.config['TESTING'] = True
+    yield chamadas
+    engine.dispose()
+
+
+def _requisitar(*caminhos, concorrente=False):
+    async def executar():
+        transporte = httpx.ASGITransport(app=asgi.aplicacao)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+            if concorrente:
+                return await asyncio.gather(*(cliente.get(caminho) for caminho in caminhos))
+            return [await cliente.get(caminho) for caminho in caminhos]
+    return asyncio.run(executar())
+
+
+def teste_respostas_iguais_as_do_flask(ambiente):
+    caminhos = ["/projetos", "/projeto?id=1", "/projeto?id=99", "/projeto?id=abc", "/historico?id=1", "/historico",
+                "/recursos", "/recurso?id=2", "/recurso", "/recursos-disponiveis?id=1", "/projeto/recursos?id=1",
+                "/conversao?valor=x"]
+    flask = app.test_client()
+    for caminho, resposta in zip(caminhos, _requisitar(*caminhos)):
+        esperado = flask.get(caminho)
+        assert (resposta.status_code, resposta.content) == (esperado.status_code, esperado.data), caminho
+        assert resposta.headers.get("ETag") == esperado.headers.get("ETag"), caminho
+        assert resposta.headers["X-Request-ID"]
+        assert "total;dur=" in resposta.headers["Server-Timing"]
+
+
+def teste_conversao_consulta_api_sem_bloquear_e_coalesce(ambiente):
+    respostas = _requisitar(*["/conversao?valor=100&de=BRL&para=USD"] * 10, concorrente=True)
+    assert {r.status_code for r in respostas} == {200}
+    assert respostas[0].json()["valor_convertido"] == 20.0
+    # Dez requisições simultâneas com o cache frio geram uma única chamada à API
+    assert len(ambiente) == 1
+    assert app_module.cliente_cambio.coalescidas == 9
+
+    # A tabela obtida pelo caminho assíncrono fica no cache compartilhado com o Flask
+    assert app.test_client().get("/conversao?valor=100&de=BRL&para=EUR").get_json()["valor_convertido"] == 18.0
+    assert len(ambiente) == 1
+
+
+def teste_erros_da_api_de_cambio(ambiente):
+    moeda_invalida, projetos = _requisitar("/conversao?valor=1&de=XXX", "/projetos?moeda=USD")
+    assert moeda_invalida.status_code == 400
+    assert projetos.status_code == 200
+    assert projetos.json()["projetos"][0]["custo"] == 200.0
+
+
+def teste_demais_rotas_seguem_para_o_flask(ambiente):
+    healthz, status = _requisitar("/healthz", "/conversao/status")
+    assert healthz.status_code == 200 and healthz.json()["status"] == "ok"
+    assert status.json()["api"]["requisicoes"] == 0
+
+
+def teste_cliente_assincrono_registra_resultado_da_chamada_de_teste():
+    agora = [0.0]
+    respostas = iter([httpx.Response(503), httpx.Response(400), httpx.Response(200, content=b"<html>")])
+    cliente = ClienteCambio(url_base="http://cambio.teste", tentativas=1,
+                            disjuntor=Disjuntor(limite_falhas=1, tempo_reset=10, relogio=lambda: agora[0]))
+    assincrono = ClienteCambioAsync(cliente, transporte=httpx.MockTransport(lambda requisicao: next(respostas)))
+
+    async def consultar(base):
+        try:
+            await assincrono.ultimas_taxas(base)
+        except ErroCambioUpstream as e:
+            return type(e)
+
+    assert asyncio.run(consultar("BRL")) is ErroCambioUpstream and cliente.disjuntor.estado == Disjuntor.ABERTO
+    agora[0] = 11
+    # Mesma classificação do cliente síncrono: 400 fecha o circuito, corpo inválido o abre de novo
+    assert asyncio.run(consultar("BRL")) is RequisicaoRecusada and cliente.disjuntor.estado == Disjuntor.FECHADO
+    assert asyncio.run(consultar("EUR")) is ErroCambioUpstream and cliente.disjuntor.estado == Disjuntor.ABERTO
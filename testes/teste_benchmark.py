@@ -0,0 +1,60 @@
+import json
+
+import pytest
+import app as app_module
+
+from middleware import admissao
+from middleware.admissao import ControleAdmissao
+from scripts import fake_cambio
+from scripts.benchmark import comparar, main
+from scripts.estatistica import percentil, resumo
+from service.cliente_cambio import ClienteCambio, ErroCambioUpstream
+
+
+def teste_percentis():
+    assert percentil([], 50) is None
+    dados = resumo(range(1, 101))
+    assert (dados["p50"], dados["p95"], dados["p99"], dados["max"]) == (50, 95, 99, 100)
+
+
+def teste_comparar_detecta_regressao_acima_do_limite():
+    baseline = {"cliente 1k | GET /projetos": {"p95": 10.0}, "cliente 1k | GET /recursos": {"p95": 10.0}}
+    resultados = [
+        {"execucao": "cliente 1k", "cenario": "GET /projetos", "p95": 14.0},
+        {"execucao": "cliente 1k", "cenario": "GET /recursos", "p95": 12.0},
+    ]
+    regressoes = comparar(resultados, baseline, limite=0.25, piso_ms=1.0)
+    assert len(regressoes) == 1 and "GET /projetos" in regressoes[0]
+
+
+def teste_api_cambio_falsa():
+    servidor, url = fake_cambio.iniciar_em_segundo_plano()
+    try:
+        cliente = ClienteCambio(url_base=url, tentativas=1)
+        assert cliente.ultimas_taxas("BRL")["rates"]["EUR"] == round(1 / 5.40, 6)
+        assert len(cliente.intervalo("2024-01-01", "2024-01-07")["rates"]) == 5  # só dias úteis
+    finally:
+        servidor.shutdown()
+
+    servidor, url = fake_cambio.iniciar_em_segundo_plano(taxa_erro=1.0)
+    try:
+        with pytest.raises(ErroCambioUpstream):
+            ClienteCambio(url_base=url, tentativas=1).ultimas_taxas("BRL")
+    finally:
+        servidor.shutdown()
+
+
+def teste_benchmark_sem_recusas_do_controle_de_admissao(monkeypatch, tmp_path):
+    # preparar_aplicacao troca as dependências globais da aplicação: o monkeypatch as restaura
+    for nome in ("Session", "cliente_cambio", "cache_cambio", "serie_cambio"):
+        monkeypatch.setattr(app_module, nome, getattr(app_module, nome))
+    # Um controle apertado como em produção; o benchmark deve trocá-lo por um sem limites
+    monkeypatch.setattr(admissao, "controle", ControleAdmissao(leituras=1, fila_leituras=0, escritas=1,
+                                                               fila_escritas=0, taxa=1.0, rajada=1))
+    saida = tmp_path / "resultados.json"
+    assert main(["--escalas", "50", "--modos", "cliente", "--cenarios", "GET /recursos,POST /historico",
+                 "--requisicoes", "40", "--concorrencia", "8", "--manter-logs", "--json", str(saida)]) == 0
+
+    resultados = json.loads(saida.read_text())
+    assert [r["cenario"] for r in resultados] == ["GET /recursos", "GET /recursos-disponiveis", "POST /historico"]
+    assert all(r["requisicoes"] == 40 and r["recusadas"] == 0 for r in resultados)
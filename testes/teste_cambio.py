@@ -0,0 +1,380 @@
+import pytest
+import threading
+import time
+import requests
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from model.base import Base
+from model.cotacao_diaria import CotacaoDiaria
+from model.taxa_cambio import TaxaCambio
+from service.cambio import CacheCambio, CambioIndisponivel, MoedaInvalida, proxima_publicacao
+from service.serie_cambio import SerieCambio, DataInvalida
+from service.cliente_cambio import ClienteCambio, Disjuntor, CircuitoAberto, ErroCambioUpstream, RequisicaoRecusada
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+class Relogio:
+    """Relógio controlável pelos testes."""
+
+    def __init__(self, momento: datetime):
+        self.momento = momento
+
+    def __call__(self):
+        return self.momento
+
+
+class FakeFrankfurter:
+    """Substitui a API externa, contando chamadas e simulando falhas."""
+
+    def __init__(self):
+        self.chamadas = 0
+        self.falhar = False
+
+    def __call__(self, base):
+        self.chamadas += 1
+        if self.falhar:
+            raise ConnectionError("API fora do ar")
+        return {"base": base, "date": "2025-04-11", "rates": {"USD": 0.17, "EUR": 0.15}}
+
+
+@pytest.fixture
+def api():
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    return FakeFrankfurter()
+
+
+def test_proxima_publicacao_pula_fim_de_semana():
+    sexta_noite = datetime(2025, 4, 11, 20, 0)
+    assert proxima_publicacao(sexta_noite) == datetime(2025, 4, 14, 16, 0)
+    assert proxima_publicacao(datetime(2025, 4, 14, 9, 0)) == datetime(2025, 4, 14, 16, 0)
+
+
+def test_conversao_usa_cache_ate_proxima_publicacao(api):
+    relogio = Relogio(datetime(2025, 4, 14, 9, 0))
+    cache = CacheCambio(buscar=api, session_factory=TestSession, relogio=relogio)
+
+    tabela, atualizada = cache.obter("BRL")
+    assert atualizada
+    assert tabela.converter(1000, "USD") == 170.0
+    assert tabela.converter(1000, "BRL") == 1000.0
+
+    relogio.momento = datetime(2025, 4, 14, 15, 59)
+    cache.obter("brl")
+    assert api.chamadas == 1
+
+    relogio.momento = datetime(2025, 4, 14, 16, 1)
+    cache.obter("BRL")
+    assert api.chamadas == 2
+
+
+def test_tabela_persistida_e_reaproveitada_por_outra_instancia(api):
+    relogio = Relogio(datetime(2025, 4, 14, 9, 0))
+    CacheCambio(buscar=api, session_factory=TestSession, relogio=relogio).obter("BRL")
+
+    session = TestSession()
+    assert session.query(TaxaCambio).filter_by(base="BRL").count() == 3
+    session.close()
+
+    outro = CacheCambio(buscar=api, session_factory=TestSession, relogio=relogio)
+    tabela, atualizada = outro.obter("BRL")
+    assert atualizada
+    assert tabela.taxa("EUR") == 0.15
+    assert api.chamadas == 1
+
+
+def test_falha_da_api_serve_tabela_desatualizada(api):
+    relogio = Relogio(datetime(2025, 4, 14, 9, 0))
+    cache = CacheCambio(buscar=api, session_factory=TestSession, relogio=relogio)
+    cache.obter("BRL")
+
+    api.falhar = True
+    relogio.momento = datetime(2025, 4, 15, 9, 0)
+    tabela, atualizada = cache.obter("BRL")
+    assert not atualizada
+    assert tabela.converter(100, "USD") == 17.0
+
+
+def test_falha_sem_cache_e_moeda_invalida(api):
+    api.falhar = True
+    cache = CacheCambio(buscar=api, session_factory=TestSession, relogio=Relogio(datetime(2025, 4, 14, 9, 0)))
+    with pytest.raises(CambioIndisponivel):
+        cache.obter("BRL")
+
+    api.falhar = False
+    tabela, _ = cache.obter("BRL")
+    with pytest.raises(MoedaInvalida):
+        tabela.converter(10, "XYZ")
+
+
+# ======================= Cliente da API de Câmbio =======================
+class FakeResposta:
+    def __init__(self, status_code, dados=None):
+        self.status_code = status_code
+        self._dados = dados or {}
+
+    def json(self):
+        return self._dados
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+class FakeSessao:
+    """Substitui requests.Session, devolvendo as respostas programadas em ordem."""
+
+    def __init__(self, respostas, atraso=0.0):
+        self.respostas = list(respostas)
+        self.atraso = atraso
+        self.chamadas = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.chamadas += 1
+        time.sleep(self.atraso)
+        resposta = self.respostas.pop(0) if len(self.respostas) > 1 else self.respostas[0]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+
+def test_cliente_repete_falhas_transitorias():
+    sessao = FakeSessao([requests.ConnectionError("reset"), FakeResposta(503), FakeResposta(200, {"date": "2025-04-11"})])
+    cliente = ClienteCambio(sessao=sessao, dormir=lambda s: None)
+
+    assert cliente.ultimas_taxas("BRL") == {"date": "2025-04-11"}
+    assert sessao.chamadas == 3
+    assert cliente.estatisticas()["erros"] == 2
+
+
+def test_disjuntor_abre_apos_falhas_seguidas_e_fecha_apos_reset():
+    agora = [0.0]
+    sessao = FakeSessao([FakeResposta(500)])
+    cliente = ClienteCambio(sessao=sessao, tentativas=1, dormir=lambda s: None,
+                            disjuntor=Disjuntor(limite_falhas=2, tempo_reset=10, relogio=lambda: agora[0]))
+
+    for _ in range(2):
+        with pytest.raises(ErroCambioUpstream):
+            cliente.ultimas_taxas("BRL")
+    with pytest.raises(CircuitoAberto):
+        cliente.ultimas_taxas("BRL")
+    assert sessao.chamadas == 2
+
+    agora[0] = 11
+    sessao.respostas = [FakeResposta(200, {"date": "2025-04-11"})]
+    assert cliente.ultimas_taxas("BRL")["date"] == "2025-04-11"
+    assert cliente.disjuntor.estado == Disjuntor.FECHADO
+
+
+class FakeRespostaCorpoInvalido(FakeResposta):
+    def json(self):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+
+def test_chamada_de_teste_sempre_registra_resultado_no_disjuntor():
+    agora = [0.0]
+    sessao = FakeSessao([FakeResposta(500)])
+    cliente = ClienteCambio(sessao=sessao, tentativas=1, dormir=lambda s: None,
+                            disjuntor=Disjuntor(limite_falhas=1, tempo_reset=10, relogio=lambda: agora[0]))
+    with pytest.raises(ErroCambioUpstream):
+        cliente.ultimas_taxas("BRL")
+
+    # 400 na chamada de teste: a API respondeu, o circuito fecha e o erro é de domínio
+    agora[0] = 11
+    sessao.respostas = [FakeResposta(400)]
+    with pytest.raises(RequisicaoRecusada):
+        cliente.ultimas_taxas("BRL")
+    assert cliente.disjuntor.estado == Disjuntor.FECHADO
+
+    # Corpo inválido conta como falha: o circuito volta a abrir em vez de ficar semiaberto
+    sessao.respostas = [FakeRespostaCorpoInvalido(200)]
+    with pytest.raises(ErroCambioUpstream):
+        cliente.ultimas_taxas("EUR")
+    assert cliente.disjuntor.estado == Disjuntor.ABERTO
+    agora[0] = 22
+    sessao.respostas = [FakeResposta(200, {"date": "2025-04-11"})]
+    assert cliente.ultimas_taxas("USD")["date"] == "2025-04-11"
+    assert cliente.disjuntor.estado == Disjuntor.FECHADO
+
+
+def test_requisicoes_simultaneas_identicas_sao_coalescidas():
+    sessao = FakeSessao([FakeResposta(200, {"date": "2025-04-11"})], atraso=0.2)
+    cliente = ClienteCambio(sessao=sessao)
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(cliente.ultimas_taxas("BRL"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(resultados) == 5
+    assert sessao.chamadas == 1
+    assert cliente.estatisticas()["coalescidas"] == 4
+
+
+# ======================= Conversão em Lote =======================
+def test_conversao_em_lote_com_taxas_cruzadas(api):
+    cache = CacheCambio(buscar=api, session_factory=TestSession, relogio=Relogio(datetime(2025, 4, 14, 9, 0)))
+    tabela, _ = cache.obter("BRL")
+
+    resultados = tabela.converter_lote([
+        (1000, "BRL", "USD"),
+        (2000, "BRL", "USD"),
+        (170, "USD", "EUR"),
+        (150, "EUR", "BRL"),
+    ])
+
+    assert [convertido for convertido, _ in resultados] == [170.0, 340.0, 150.0, 1000.0]
+    assert api.chamadas == 1
+
+
+# ======================= Portfólio Convertido =======================
+def test_listar_projetos_com_custos_convertidos(api, monkeypatch):
+    import app as app_module
+    from model.projeto import Projeto
+
+    session = TestSession()
+    session.add_all([
+        Projeto(nome="Projeto A", sigla="PRJA", descricao="", tipo="Interno", custo=1000, status="A iniciar"),
+        Projeto(nome="Projeto B", sigla="PRJB", descricao="", tipo="Interno", custo=2000, status="A iniciar"),
+    ])
+    session.commit()
+    session.close()
+
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    monkeypatch.setattr(app_module, "cache_cambio", CacheCambio(
+        buscar=api, session_factory=TestSession, relogio=Relogio(datetime(2025, 4, 14, 9, 0))))
+
+    response = app_module.app.test_client().get("/projetos?moeda=usd")
+    assert response.status_code == 200
+    assert response.json["cotacao"]["taxa"] == 0.17
+    assert response.json["cotacao"]["data_cotacao"] == "2025-04-11"
+    assert [p["custo"] for p in response.json["projetos"]] == [170.0, 340.0]
+    assert [p["custo_original"] for p in response.json["projetos"]] == [1000.0, 2000.0]
+    assert api.chamadas == 1
+
+
+# ======================= Série Histórica =======================
+class FakeIntervalo:
+    """Simula GET /inicio..fim da Frankfurter: publica em dias úteis, USD e BRL com base EUR."""
+
+    def __init__(self):
+        self.chamadas = []
+
+    def __call__(self, inicio, fim, base):
+        self.chamadas.append((inicio, fim))
+        dia, ate = date.fromisoformat(inicio), date.fromisoformat(fim)
+        rates = {}
+        while dia <= ate:
+            if dia.weekday() < 5:
+                rates[dia.isoformat()] = {"USD": 1.0 + dia.day / 100, "BRL": 6.0}
+            dia += timedelta(days=1)
+        return {"base": base, "rates": rates}
+
+
+def test_serie_historica_consulta_local_com_busca_binaria(api):
+    intervalo = FakeIntervalo()
+    serie = SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=lambda: date(2025, 4, 20))
+
+    serie.garantir(date(2025, 4, 1), date(2025, 4, 18))
+    taxa, data_cotacao = serie.taxa("USD", date(2025, 4, 10))
+    assert (taxa, data_cotacao) == (1.10, date(2025, 4, 10))
+
+    # Sábado usa a publicação de sexta-feira
+    assert serie.taxa("USD", date(2025, 4, 12)) == (1.11, date(2025, 4, 11))
+
+    # Taxa cruzada BRL → USD na data
+    resultados, atualizada = serie.converter_lote([(600, "BRL", "USD", date(2025, 4, 10))])
+    assert atualizada
+    assert resultados[0][0] == 110.0
+
+    # Período já coberto não consulta a API de novo
+    serie.garantir(date(2025, 4, 3), date(2025, 4, 15))
+    assert len(intervalo.chamadas) == 1
+
+
+def test_serie_historica_preenche_incrementalmente_e_persiste(api):
+    intervalo = FakeIntervalo()
+    serie = SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=lambda: date(2025, 4, 20))
+    serie.garantir(date(2025, 4, 7), date(2025, 4, 11))
+    serie.garantir(date(2025, 4, 1), date(2025, 4, 15))
+    assert intervalo.chamadas == [("2025-03-31", "2025-04-11"), ("2025-03-25", "2025-03-30"), ("2025-04-12", "2025-04-15")]
+
+    outra = SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=lambda: date(2025, 4, 20))
+    outra.garantir(date(2025, 4, 2), date(2025, 4, 14))
+    assert outra.converter_lote([(1, "EUR", "USD", date(2025, 4, 12))])[0] == [(1.11, 1.11, date(2025, 4, 11))]
+    assert len(intervalo.chamadas) == 3
+    assert outra.taxa("USD", date(2025, 4, 2)) == (1.02, date(2025, 4, 2))
+
+    with pytest.raises(DataInvalida):
+        outra.garantir(date(2025, 4, 1), date(2025, 4, 21))
+
+
+def test_serie_historica_nao_trata_intervalo_entre_trechos_como_coberto(api):
+    # Dois workers baixam trechos distantes no mesmo banco
+    intervalo = FakeIntervalo()
+    hoje = lambda: date(2025, 6, 20)
+    SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=hoje).garantir(
+        date(2020, 1, 2), date(2020, 1, 10))
+    SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=hoje).garantir(
+        date(2025, 6, 2), date(2025, 6, 6))
+
+    # Após o reinício, só o período pedido entre os dois é baixado
+    reiniciada = SerieCambio(buscar_intervalo=intervalo, session_factory=TestSession, hoje=hoje)
+    resultados, atualizada = reiniciada.converter_lote([(1, "EUR", "USD", date(2022, 6, 1))])
+    assert atualizada and resultados == [(1.01, 1.01, date(2022, 6, 1))]
+    assert intervalo.chamadas[2:] == [("2022-05-25", "2022-06-01")]
+    reiniciada.garantir(date(2020, 1, 3), date(2025, 6, 5))
+    assert intervalo.chamadas[3] == ("2020-01-11", "2021-01-10")  # o restante do intervalo, em blocos
+    assert ("2022-05-25", "2022-06-01") not in intervalo.chamadas[3:]
+
+
+def test_serie_historica_baixa_fora_do_lock_e_coalesce_periodos(tmp_path):
+    # Banco em arquivo: os downloads simultâneos gravam de threads diferentes
+    engine = create_engine(f"sqlite:///{tmp_path / 'serie.sqlite3'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(bind=engine)
+    baixando, liberar = threading.Event(), threading.Event()
+    intervalo = FakeIntervalo()
+
+    def lento(inicio, fim, base):
+        if inicio == "2025-04-12":
+            baixando.set()
+            liberar.wait(5)
+            s = fabrica()
+            s.add(CotacaoDiaria(data=date(2025, 4, 14), moeda="USD", taxa=1.14))  # gravada por outro worker
+            s.commit()
+            s.close()
+        return intervalo(inicio, fim, base)
+
+    serie = SerieCambio(buscar_intervalo=lento, session_factory=fabrica, hoje=lambda: date(2025, 4, 20))
+    serie.garantir(date(2025, 4, 7), date(2025, 4, 11))
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(serie.garantir(date(2025, 4, 8), date(2025, 4, 15))))
+               for _ in range(3)]
+    threads[0].start()
+    assert baixando.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Com o download em andamento, o período já coberto é atendido sem esperar
+    inicio = time.monotonic()
+    assert serie.garantir(date(2025, 4, 8), date(2025, 4, 10)) and time.monotonic() - inicio < 1
+    time.sleep(0.05)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    assert resultados == [True, True, True]
+    assert intervalo.chamadas == [("2025-03-31", "2025-04-11"), ("2025-04-12", "2025-04-15")]
+    assert serie.taxa("USD", date(2025, 4, 14)) == (pytest.approx(1.14), date(2025, 4, 14))
+    s = fabrica()
+    assert s.query(CotacaoDiaria).filter_by(moeda="USD").count() == 12  # a cotação que já existia foi ignorada
+    s.close()
+    engine.dispose()
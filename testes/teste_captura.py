@@ -0,0 +1,78 @@
+import json
+import time
+
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from werkzeug.serving import make_server
+import threading
+
+from app import app
+from model.base import Base
+from middleware import captura
+from scripts.replay import Reproducao, diferencas
+
+# Banco de dados temporário (isolado da aplicação real), compartilhado entre threads pelo servidor
+test_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    monkeypatch.setattr(captura, "CAPTURA_AMOSTRAGEM", 1.0)
+    monkeypatch.setattr(captura, "CAPTURA_ARQUIVO", str(tmp_path / "captura.jsonl"))
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _ler(caminho, quantidade):
+    """Aguarda a thread de escrita gravar `quantidade` linhas."""
+    for _ in range(100):
+        if caminho.exists() and len(caminho.read_text().splitlines()) >= quantidade:
+            break
+        time.sleep(0.02)
+    return [json.loads(linha) for linha in caminho.read_text().splitlines()]
+
+
+def teste_redacao():
+    dados = {"nome": "x", "Senha": "123", "itens": [{"token": "abc", "valor": 1}]}
+    assert captura.redigir(dados) == {"nome": "x", "Senha": "***", "itens": [{"token": "***", "valor": 1}]}
+
+
+def teste_diferencas_ignora_campos_volateis():
+    esperado = {"id": 1, "nome": "A", "lista": [1, 2]}
+    assert diferencas(esperado, {"id": 9, "nome": "A", "lista": [1, 2]}, {"id"}) == []
+    assert diferencas(esperado, {"id": 1, "nome": "B", "lista": [1]}, set()) == [
+        "$.lista: 2 item(ns) esperado(s), 1 obtido(s)", "$.nome: esperado 'A', obtido 'B'"]
+
+
+def teste_captura_e_replay_sem_divergencias(client, tmp_path):
+    client.post("/recurso", json={"nome": "Ana", "papel": "QA", "alocacao": "50%", "token": "segredo"})
+    client.get("/recursos?token=abc")
+    client.get("/metrics")  # rotas operacionais não são capturadas
+
+    registros = _ler(tmp_path / "captura.jsonl", 2)
+    assert [r["caminho"] for r in registros] == ["/recurso", "/recursos"]
+    assert registros[0]["corpo"]["token"] == "***"
+    assert registros[1]["query"] == {"token": "***"}
+    assert registros[1]["status"] == 200 and registros[1]["resposta"][0]["nome"] == "Ana"
+
+    # Replay em um banco limpo reproduz as mesmas respostas
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        reproducao = Reproducao(f"http://127.0.0.1:{servidor.server_port}", velocidade=None, concorrencia=1,
+                                ignorar={"id"})
+        relatorio = reproducao.relatorio(reproducao.executar(registros))
+    finally:
+        servidor.shutdown()
+    assert relatorio["requisicoes"] == 2
+    assert relatorio["divergencias"] == 0, relatorio["exemplos_divergencia"]
@@ -0,0 +1,88 @@
+import pytest
+
+from app import app
+from model.projeto import Projeto
+from model.recurso import Recurso
+
+
+@pytest.fixture
+def client(sessao):
+    with app.test_client() as client:
+        yield client
+
+
+def _projeto(client, **campos):
+    dados = {"nome": "Projeto OCC", "sigla": "OCC", "descricao": "d", "tipo": "Interno", "custo": 1000.0,
+             "status": "A iniciar", **campos}
+    return dados
+
+
+def teste_put_projeto_com_if_match_e_versao_no_corpo(client):
+    projeto_id = client.post("/projeto", json=_projeto(client)).get_json()["id"]
+    lido = client.get(f"/projeto?id={projeto_id}")
+    assert lido.headers["ETag"] == '"1"' and lido.get_json()["versao"] == 1
+
+    editado = client.put("/projeto", json=_projeto(client, id=projeto_id, custo=2000.0), headers={"If-Match": '"1"'})
+    assert editado.status_code == 200 and editado.headers["ETag"] == '"2"' and editado.get_json()["versao"] == 2
+
+    # Edições baseadas na versão 1, que já não é a atual
+    obsoleta = client.put("/projeto", json=_projeto(client, id=projeto_id, custo=3000.0), headers={"If-Match": '"1"'})
+    assert obsoleta.status_code == 412 and obsoleta.get_json()["versao"] == 2
+    assert client.put("/projeto", json=_projeto(client, id=projeto_id, custo=3000.0, versao=1)).status_code == 409
+    assert client.get(f"/projeto?id={projeto_id}").get_json()["custo"] == 2000.0
+
+    # Sem versão (ou If-Match: *) a edição vale sobre a versão atual
+    assert client.put("/projeto", json=_projeto(client, id=projeto_id, status="Em andamento")).get_json()["versao"] == 3
+    assert client.put("/projeto", json=_projeto(client, id=projeto_id), headers={"If-Match": "*"}).status_code == 200
+    assert "ETag" not in client.get(f"/projeto?id={projeto_id}&moeda=USD").headers
+
+
+def teste_put_recurso_com_versao(client):
+    recurso_id = client.post("/recurso", json={"nome": "Ana", "papel": "Dev", "alocacao": "100%"}).get_json()["id"]
+    assert client.get(f"/recurso?id={recurso_id}").headers["ETag"] == '"1"'
+
+    dados = {"id": recurso_id, "nome": "Ana", "papel": "Tech Lead", "alocacao": "100%"}
+    assert client.put("/recurso", json={**dados, "versao": 1}).get_json() == {
+        "mensagem": "Recurso atualizado com sucesso.", "versao": 2}
+    assert client.put("/recurso", json={**dados, "versao": 1}).status_code == 409
+    assert client.put("/recurso", json=dados, headers={"If-Match": 'W/"2"'}).status_code == 412  # comparação forte
+
+
+def teste_escrita_concorrente_entre_leitura_e_update(client, sessao, monkeypatch):
+    projeto_id = client.post("/projeto", json=_projeto(client)).get_json()["id"]
+    validar_custo = Projeto.validar_custo
+
+    def outra_requisicao_grava_antes(projeto):
+        # Simula outra requisição que grava o projeto depois da leitura e antes do commit desta
+        s = sessao()
+        s.get(Projeto, projeto_id).status = "Concluído"
+        s.commit()
+        s.close()
+        monkeypatch.setattr(Projeto, "validar_custo", validar_custo)
+        validar_custo(projeto)
+
+    monkeypatch.setattr(Projeto, "validar_custo", outra_requisicao_grava_antes)
+    resposta = client.put("/projeto", json=_projeto(client, id=projeto_id, custo=5000.0), headers={"If-Match": '"1"'})
+    assert resposta.status_code == 412
+
+    atual = client.get(f"/projeto?id={projeto_id}").get_json()
+    assert (atual["status"], atual["custo"], atual["versao"]) == ("Concluído", 1000.0, 2)
+
+
+def teste_historico_e_vinculo_nao_mudam_a_versao(client, sessao):
+    projeto_id = client.post("/projeto", json=_projeto(client)).get_json()["id"]
+    recurso_id = client.post("/recurso", json={"nome": "Ana", "papel": "Dev", "alocacao": "100%"}).get_json()["id"]
+    s = sessao()
+    antes = s.get(Projeto, projeto_id).data_atualizacao
+    s.close()
+
+    client.post(f"/historico?id={projeto_id}", json={"descricao": "Kickoff"})
+    client.post(f"/projeto/recurso?id_projeto={projeto_id}&id_recurso={recurso_id}")
+
+    s = sessao()
+    projeto, recurso = s.get(Projeto, projeto_id), s.get(Recurso, recurso_id)
+    assert (projeto.versao, recurso.versao) == (1, 1)
+    assert projeto.data_atualizacao > antes
+    s.close()
+    # Quem leu a versão 1 antes do histórico ainda pode editar os campos do projeto
+    assert client.put("/projeto", json=_projeto(client, id=projeto_id, versao=1)).status_code == 200
@@ -0,0 +1,68 @@
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import app
+from model.base import Base
+from model.projeto import Projeto
+from model.recurso import Recurso
+from middleware import consultas_lentas as modulo
+from middleware.consultas_lentas import consultas_lentas, impressao_digital
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    monkeypatch.setenv("ADMIN_TOKEN", "admin")
+    # Limite zero: todo comando é tratado como lento
+    monkeypatch.setattr(modulo, "SQL_LENTO_MS", 0)
+    consultas_lentas.limpar()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    consultas_lentas.limpar()
+
+
+def teste_impressao_digital_ignora_literais_e_listas_in():
+    assert impressao_digital("SELECT * FROM recurso WHERE id NOT IN (?, ?, ?)") == \
+        impressao_digital("SELECT * FROM recurso WHERE id NOT IN (?)")
+    assert impressao_digital("SELECT * FROM projeto WHERE id = 1") == \
+        impressao_digital("SELECT  *  FROM projeto WHERE id = 42")
+    assert impressao_digital("SELECT * FROM projeto") != impressao_digital("SELECT * FROM recurso")
+
+
+def teste_relatorio_com_rota_parametros_e_plano(client):
+    session = TestSession()
+    projeto = Projeto(nome="P", sigla="P1", descricao="", tipo="Interno", custo=1, status="A iniciar")
+    session.add(projeto)
+    session.add_all([Recurso(nome=f"R{i}", papel="Dev", alocacao="100%") for i in range(3)])
+    session.commit()
+    projeto_id = projeto.id
+    session.close()
+
+    client.get(f"/recursos-disponiveis?id={projeto_id}")
+    client.get(f"/recursos-disponiveis?id={projeto_id}")
+
+    assert client.get("/admin/consultas-lentas").status_code == 401
+    resposta = client.get("/admin/consultas-lentas?ordenar=execucoes", headers={"X-Admin-Token": "admin"})
+    assert resposta.status_code == 200
+    consultas = resposta.json["consultas"]
+    recursos = [c for c in consultas if "FROM recurso" in c["sql"]]
+    assert recursos
+    consulta = recursos[0]
+    assert consulta["execucoes"] == 2
+    assert consulta["rotas"] == {"/recursos-disponiveis": 2}
+    assert consulta["ultimos_parametros"] is not None
+    assert consulta["plano"] and any("recurso" in linha for linha in consulta["plano"])
+
+
+def teste_ordenacao_invalida(client):
+    resposta = client.get("/admin/consultas-lentas?ordenar=x", headers={"X-Admin-Token": "admin"})
+    assert resposta.status_code == 400
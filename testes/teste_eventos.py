@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import app as app_module
+
+from app import app
+from model.alteracao import Alteracao
+from model.historico import Historico
+from model.projeto import Projeto
+from model.recurso import Recurso
+from service.eventos import Difusor
+from service.sincronizacao import limpar_alteracoes
+
+
+def _difusor(monkeypatch, sessao, **opcoes) -> Difusor:
+    difusor = Difusor(sessao, **{"intervalo": 5.0, "duracao": 0.5, **opcoes})
+    monkeypatch.setattr(app_module, "difusor", difusor)
+    return difusor
+
+
+def _gravar(sessao, *objetos):
+    s = sessao()
+    s.add_all(objetos)
+    s.commit()
+    ids = [obj.id for obj in objetos]
+    s.close()
+    return ids
+
+
+def _projeto(sigla):
+    return Projeto(nome=f"Projeto {sigla}", sigla=sigla, descricao="d", tipo="Interno", custo=1.0, status="A iniciar")
+
+
+def _eventos(texto: str):
+    """(id, tipo, dados) de cada evento do corpo text/event-stream (ignora retry e comentários)."""
+    eventos = []
+    for bloco in texto.split("\n\n"):
+        campos = dict(linha.split(": ", 1) for linha in bloco.splitlines() if not linha.startswith(":"))
+        if "event" in campos:
+            eventos.append((int(campos["id"]), campos["event"], json.loads(campos["data"])))
+    return eventos
+
+
+def teste_retoma_pelo_last_event_id(monkeypatch, sessao):
+    _difusor(monkeypatch, sessao)
+    projeto_id, recurso_id = _gravar(sessao, _projeto("EVT"), Recurso(nome="Ana", papel="Dev", alocacao="100%"))
+    s = sessao()
+    projeto = s.get(Projeto, projeto_id)
+    s.add(Historico(descricao="Kickoff", projeto_id=projeto_id))
+    projeto.recursos.append(s.get(Recurso, recurso_id))
+    s.commit()
+    s.close()
+
+    with app.test_client() as client:
+        resposta = client.get("/eventos", headers={"Last-Event-ID": "0"})
+        assert resposta.status_code == 200 and resposta.mimetype == "text/event-stream"
+        eventos = _eventos(resposta.get_data(as_text=True))
+        # O s.get() do recurso descarregou o histórico antes (autoflush): dois flushes, cada um tocando o projeto
+        assert [tipo for _, tipo, _ in eventos] == [
+            "projeto.criado", "recurso.criado", "historico.criado", "projeto.atualizado",
+            "vinculo.criado", "projeto.atualizado", "recurso.atualizado"]
+        assert eventos[2][2] == {"id": 1, "projeto_id": projeto_id}
+        assert eventos[4][2] == {"projeto_id": projeto_id, "recurso_id": recurso_id}
+
+        # Reconexão: só o que veio depois do último evento recebido
+        _gravar(sessao, _projeto("NOV"))
+        resposta = client.get("/eventos?ultimo_id=0", headers={"Last-Event-ID": str(eventos[-1][0])})
+        assert [tipo for _, tipo, _ in _eventos(resposta.get_data(as_text=True))] == ["projeto.criado"]
+
+
+def teste_tempo_real_acordado_pelo_commit(monkeypatch, sessao):
+    # Intervalo de 5 s e conexão de 1 s: o evento só chega a tempo se o commit acordar o difusor
+    difusor = _difusor(monkeypatch, sessao, duracao=1.0)
+    with app.test_client() as client:
+        resposta = client.get("/eventos?tipos=historico", buffered=False)
+        recebido = []
+        leitor = threading.Thread(target=lambda: recebido.extend(resposta.response))
+        leitor.start()
+        limite = time.monotonic() + 1
+        while difusor.estatisticas()["conexoes"] == 0 and time.monotonic() < limite:
+            time.sleep(0.01)
+
+        projeto_id, = _gravar(sessao, _projeto("RTM"))
+        _gravar(sessao, Historico(descricao="Ao vivo", projeto_id=projeto_id))
+        leitor.join()
+        resposta.close()
+
+    eventos = _eventos(b"".join(recebido).decode())
+    assert [(tipo, dados["projeto_id"]) for _, tipo, dados in eventos] == [("historico.criado", projeto_id)]
+    assert difusor.estatisticas() == {"conexoes": 0, "enviados": 1, "descartados": 0}
+
+
+def teste_cliente_lento_e_desconectado(sessao):
+    difusor = Difusor(sessao, intervalo=60.0, capacidade=2, keepalive=0.01)
+    conexao = difusor.fluxo()
+    fluxo = iter(conexao)
+    assert next(fluxo).startswith("retry:")
+    assert next(fluxo) == ": keep-alive\n\n"  # recuperação pelo banco concluída, aguardando a fila
+
+    _gravar(sessao, *[_projeto(f"L{indice}") for indice in range(5)])
+    difusor.distribuir()  # a thread não acorda a tempo: o cliente não leu nada e a fila enche
+
+    # Os eventos que couberam na fila são entregues e a conexão termina; o resto vem na reconexão
+    assert [tipo for _, tipo, _ in _eventos("".join(fluxo))] == ["projeto.criado", "projeto.criado"]
+    conexao.close()
+    assert difusor.estatisticas() == {"conexoes": 0, "enviados": 2, "descartados": 1}
+
+
+def teste_limite_de_conexoes_e_eventos_descartados(monkeypatch, sessao):
+    difusor = _difusor(monkeypatch, sessao, max_conexoes=1)
+    _gravar(sessao, _projeto("VEL"), _projeto("NOV"))
+    s = sessao()
+    s.query(Alteracao).filter(Alteracao.id == 1).update({"momento": datetime.now() - timedelta(days=60)})
+    s.commit()
+    limpar_alteracoes(s, 30)
+    s.close()
+
+    with app.test_client() as client:
+        ocupada = difusor.fluxo()
+        recusada = client.get("/eventos")
+        assert recusada.status_code == 503 and recusada.headers["Retry-After"] == "3"
+        ocupada.close()
+
+        # O evento 1 foi descartado: o cliente é avisado para refazer a carga e segue do cursor atual
+        eventos = _eventos(client.get("/eventos", headers={"Last-Event-ID": "0"}).get_data(as_text=True))
+        assert [(id_, tipo) for id_, tipo, _ in eventos] == [(2, "reinicio")]
+
+        assert client.get("/eventos", headers={"Last-Event-ID": "abc"}).status_code == 400
+        assert client.get("/eventos?tipos=projeto,foo").status_code == 422
@@ -0,0 +1,31 @@
+import re
+
+from sqlalchemy import create_engine, text
+
+from scripts.gerar_dados import gerar
+
+
+def _contagens_e_amostra(engine):
+    with engine.connect() as conn:
+        siglas = [linha[0] for linha in conn.execute(text("SELECT sigla FROM projeto ORDER BY id"))]
+        vinculos = conn.execute(text("SELECT projeto_id, recurso_id FROM projeto_recurso ORDER BY 1, 2")).fetchall()
+    return siglas, vinculos
+
+
+def teste_gera_escala_pedida_com_siglas_validas():
+    engine = create_engine("sqlite://")
+    totais = gerar(engine, 1000, semente=7)
+
+    assert totais["historico"] == 1000
+    assert totais["projeto"] == 100
+    siglas, vinculos = _contagens_e_amostra(engine)
+    assert len(set(siglas)) == len(siglas)
+    assert all(len(sigla) <= 10 and re.match("^[A-Z0-9]+$", sigla) for sigla in siglas)
+    assert len(vinculos) == totais["projeto_recurso"] >= totais["projeto"]
+
+
+def teste_mesma_semente_gera_mesmos_dados():
+    primeiro, segundo = create_engine("sqlite://"), create_engine("sqlite://")
+    gerar(primeiro, 1000, semente=3)
+    gerar(segundo, 1000, semente=3)
+    assert _contagens_e_amostra(primeiro) == _contagens_e_amostra(segundo)
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import app as app_module
+from sqlalchemy import event
+
+from app import app
+from middleware import admissao
+from middleware.admissao import ControleAdmissao
+from middleware.instrumentacao import limite_consultas
+from model.historico import Historico
+from model.idempotencia import ChaveIdempotencia
+from model.projeto import Projeto
+from service.idempotencia import RegistroIdempotencia, impressao_da_requisicao, limpar_chaves
+
+
+@pytest.fixture
+def registro(monkeypatch, sessao):
+    registro = RegistroIdempotencia(sessao, espera=5.0)
+    monkeypatch.setattr(app_module, "idempotencia", registro)
+    return registro
+
+
+PROJETO = {"nome": "Projeto IDP", "sigla": "IDP", "descricao": "d", "tipo": "Interno", "custo": 1.0, "status": "A iniciar"}
+
+
+def _contar(sessao, modelo) -> int:
+    s = sessao()
+    total = s.query(modelo).count()
+    s.close()
+    return total
+
+
+def teste_repeticao_reproduz_a_resposta_sem_tocar_no_dominio(registro, sessao):
+    with app.test_client() as client:
+        primeira = client.post("/projeto", json=PROJETO, headers={"Idempotency-Key": "a1"})
+        assert primeira.status_code == 200 and "Idempotent-Replayed" not in primeira.headers
+
+        with limite_consultas(1) as contador:
+            repetida = client.post("/projeto", json=PROJETO, headers={"Idempotency-Key": "a1"})
+        assert "idempotencia" in contador.comandos[0]
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+        assert (repetida.status_code, repetida.get_json()) == (200, primeira.get_json())
+
+        # Sem a chave (ou com outra), a rota é executada: nome e sigla repetidos
+        assert client.post("/projeto", json=PROJETO).status_code == 409
+        conflito = client.post("/projeto", json=PROJETO, headers={"Idempotency-Key": "a2"})
+        assert conflito.status_code == 409
+        assert client.post("/projeto", json=PROJETO, headers={"Idempotency-Key": "a2"}).get_json() == conflito.get_json()
+
+        # A mesma chave com outro corpo é erro do cliente; chaves valem por rota
+        assert client.post("/projeto", json={**PROJETO, "sigla": "OUT"}, headers={"Idempotency-Key": "a1"}).status_code == 422
+        assert client.post("/projeto", json=PROJETO, headers={"Idempotency-Key": "x" * 256}).status_code == 400
+        projeto_id = primeira.get_json()["id"]
+        assert client.post(f"/historico?id={projeto_id}", json={"descricao": "K"},
+                           headers={"Idempotency-Key": "a1"}).status_code == 200
+
+    assert _contar(sessao, Projeto) == 1
+    assert registro.estatisticas() == {"reproduzidas": 2, "aguardadas": 0, "em_andamento": 0}
+
+
+def teste_repeticao_simultanea_aguarda_a_primeira(registro, sessao, monkeypatch):
+    # Sem limite de escritas simultâneas, como se cada requisição chegasse a um worker diferente
+    # (no mesmo processo, a repetição esperaria antes, na fila de escritas do controle de admissão)
+    monkeypatch.setattr(admissao, "controle", ControleAdmissao(escritas=0))
+    projeto_id = app.test_client().post("/projeto", json=PROJETO).get_json()["id"]
+    historico = f"/historico?id={projeto_id}"
+    impressao = impressao_da_requisicao("POST", "/historico", f"id={projeto_id}".encode(), json.dumps({"descricao": "Kickoff"}).encode())
+    segurando, liberar = threading.Event(), threading.Event()
+
+    @event.listens_for(sessao, "before_commit")
+    def segurar_historico(session):
+        # A primeira requisição fica parada antes do commit até as repetições chegarem
+        if any(isinstance(obj, Historico) for obj in session.new):
+            segurando.set()
+            liberar.wait(5)
+
+    respostas = []
+
+    def enviar():
+        with app.test_client() as client:
+            respostas.append(client.post(historico, json={"descricao": "Kickoff"}, headers={"Idempotency-Key": "h1"}))
+
+    primeira = threading.Thread(target=enviar)
+    primeira.start()
+    assert segurando.wait(5)
+
+    # Acabou o prazo sem resposta: 409, e a rota não foi executada de novo
+    registro.espera = 0.1
+    with app.test_client() as client:
+        recusada = client.post(historico, json={"descricao": "Kickoff"}, headers={"Idempotency-Key": "h1"})
+    assert recusada.status_code == 409 and recusada.headers["Retry-After"] == "1"
+
+    # Dentro do prazo, a repetição do mesmo processo e a de outro worker aguardam a primeira
+    registro.espera = 5.0
+    outro_worker = RegistroIdempotencia(sessao, espera=5.0)
+    guardadas = []
+    repeticao = threading.Thread(target=enviar)
+    repeticao.start()
+    outra = threading.Thread(target=lambda: guardadas.append(outro_worker.reservar("/historico", "h1", impressao)))
+    outra.start()
+    limite = time.monotonic() + 5
+    while (registro.estatisticas()["aguardadas"] < 2 or outro_worker.estatisticas()["aguardadas"] == 0) \
+            and time.monotonic() < limite:
+        time.sleep(0.01)
+    liberar.set()
+    for thread in (primeira, repeticao, outra):
+        thread.join()
+
+    assert [r.status_code for r in respostas] == [200, 200]
+    assert respostas[0].get_json() == respostas[1].get_json()
+    assert respostas[1].headers["Idempotent-Replayed"] == "true"
+    assert guardadas == [(respostas[0].get_data(as_text=True), 200)]
+    assert _contar(sessao, Historico) == 1
+    assert registro.estatisticas() == {"reproduzidas": 1, "aguardadas": 2, "em_andamento": 1}
+
+
+def teste_falha_libera_a_chave_e_reserva_abandonada(registro, sessao):
+    with app.test_client() as client:
+        projeto_id = client.post("/projeto", json=PROJETO).get_json()["id"]
+        recurso_id = client.post("/recurso", json={"nome": "Ana", "papel": "Dev", "alocacao": "100%"}).get_json()["id"]
+        vincular = f"/projeto/recurso?id_projeto={projeto_id}&id_recurso={recurso_id}"
+
+        falhas = iter([True])
+
+        @event.listens_for(sessao, "before_commit")
+        def falhar_uma_vez(session):
+            # Só o commit da rota (o projeto ganhou o recurso), não o da reserva da chave
+            if any(isinstance(obj, Projeto) for obj in session.dirty) and next(falhas, False):
+                raise RuntimeError("banco indisponível")
+
+        # 5xx não é guardado: a repetição executa a rota de novo
+        assert client.post(vincular, headers={"Idempotency-Key": "v1"}).status_code == 500
+        assert _contar(sessao, ChaveIdempotencia) == 0
+        assert client.post(vincular, headers={"Idempotency-Key": "v1"}).status_code == 200
+
+        # Reserva de um processo que morreu no meio da requisição: 409 até passar IDEMPOTENCIA_ABANDONO
+        impressao = impressao_da_requisicao("POST", "/projeto/recurso", vincular.split("?")[1].encode(), b"")
+        assert registro.reservar("/projeto/recurso", "v2", impressao) is None
+        registro.espera = 0.1
+        em_andamento = client.post(vincular, headers={"Idempotency-Key": "v2"})
+        assert em_andamento.status_code == 409 and em_andamento.headers["Retry-After"] == "1"
+        s = sessao()
+        s.query(ChaveIdempotencia).filter_by(chave="v2").update({"criado_em": datetime.now() - timedelta(hours=2)})
+        s.commit()
+        assert client.post(vincular, headers={"Idempotency-Key": "v2"}).get_json() == {
+            "mensagem": "Recurso já está vinculado a este projeto."}
+
+        # A gravação de uma resposta descarta as chaves vencidas, no máximo uma vez por intervalo
+        s.query(ChaveIdempotencia).filter_by(chave="v1").update({"criado_em": datetime.now() - timedelta(hours=2)})
+        s.commit()
+        registro.retencao_horas = 1
+        assert client.post(f"/historico?id={projeto_id}", json={"descricao": "K"},
+                           headers={"Idempotency-Key": "v3"}).status_code == 200
+        assert _contar(sessao, ChaveIdempotencia) == 3
+        registro._proxima_limpeza = 0.0
+        assert client.post(f"/historico?id={projeto_id}", json={"descricao": "L"},
+                           headers={"Idempotency-Key": "v4"}).status_code == 200
+        assert sorted(c.chave for c in s.query(ChaveIdempotencia)) == ["v2", "v3", "v4"]
+
+    # A CLI (flask idempotencia-limpar) continua disponível; ao assumir a reserva, v2 recomeçou
+    s.query(ChaveIdempotencia).filter_by(chave="v3").update({"criado_em": datetime.now() - timedelta(hours=2)})
+    s.commit()
+    assert limpar_chaves(s, 1) == 1
+    assert sorted((c.chave, c.status) for c in s.query(ChaveIdempotencia)) == [("v2", 200), ("v4", 200)]
+    s.close()
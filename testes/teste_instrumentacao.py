@@ -0,0 +1,82 @@
+import time
+
+import pytest
+import app as app_module
+from flask.testing import FlaskClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import app
+from model.base import Base
+from model.historico import Historico
+from model.projeto import Projeto
+from model.recurso import Recurso
+from middleware.instrumentacao import Medicao, limite_consultas, medicao_atual
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def portfolio():
+    """Cria 20 projetos com 3 históricos cada e 5 recursos."""
+    session = TestSession()
+    for i in range(20):
+        projeto = Projeto(nome=f"Projeto {i}", sigla=f"PRJ{i}", descricao="", tipo="Interno", custo=1000 + i, status="A iniciar")
+        projeto.historico = [Historico(descricao=f"Ação {j}", projeto_id=None) for j in range(3)]
+        session.add(projeto)
+    session.add_all([Recurso(nome=f"Recurso {i}", papel="Dev", alocacao="100%") for i in range(5)])
+    session.commit()
+    session.close()
+
+
+def test_resposta_traz_server_timing(client: FlaskClient, portfolio):
+    response = client.get("/recursos")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert 'db;dur=' in timing and '1 consulta(s)' in timing
+    assert "json;dur=" in timing and "total;dur=" in timing
+
+
+# Orçamento de consultas por rota: não pode crescer com o número de linhas
+@pytest.mark.parametrize("rota, limite", [
+    ("/projetos", 2),
+    ("/projeto?id=1", 2),
+    ("/recursos", 1),
+    ("/recursos-disponiveis?id=1", 1),
+    ("/historico?id=1", 2),
+    ("/projeto/recursos?id=1", 2),
+])
+def test_orcamento_de_consultas_por_rota(client: FlaskClient, portfolio, rota, limite):
+    with limite_consultas(limite):
+        response = client.get(rota)
+    assert response.status_code == 200
+
+
+def test_comando_com_erro_nao_distorce_o_proximo():
+    engine = create_engine("sqlite://")
+    medicao = Medicao()
+    token = medicao_atual.set(medicao)
+    try:
+        with engine.connect() as conexao:
+            with pytest.raises(OperationalError):
+                conexao.exec_driver_sql("SELECT * FROM tabela_inexistente")
+            assert not conexao.info.get("inicio_consulta")  # nenhum início órfão preso à conexão do pool
+            time.sleep(0.2)
+            conexao.exec_driver_sql("SELECT 1")
+    finally:
+        medicao_atual.reset(token)
+    # Só o comando concluído conta, com a própria duração (e não desde o comando que falhou)
+    assert medicao.consultas == 1 and medicao.tempo_db < 0.1
@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import asgi
+from app import app
+from model.base import Base
+from middleware.metricas import Registro, agregar, exposicao
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def teste_metrics_formato_prometheus(client):
+    client.get("/projetos")
+    client.get("/projetos")
+    client.get("/rota-inexistente")
+
+    resposta = client.get("/metrics")
+    assert resposta.status_code == 200
+    assert resposta.content_type.startswith("text/plain")
+    texto = resposta.get_data(as_text=True)
+
+    assert "# TYPE http_requisicoes_total counter" in texto
+    assert "# TYPE http_requisicao_duracao_segundos histogram" in texto
+    assert 'http_requisicoes_total{metodo="GET",rota="/projetos",status="200"}' in texto
+    assert 'rota="<nao_encontrada>",status="404"' in texto
+    assert 'http_requisicao_duracao_segundos_bucket{metodo="GET",rota="/projetos",le="+Inf"}' in texto
+    assert "cambio_cache_taxa_acerto" in texto
+    assert "http_requisicoes_em_andamento 1" in texto  # a própria requisição do /metrics
+
+
+def teste_requisicoes_em_andamento_no_asgi(client):
+    """As rotas do asgi.py contam as requisições em andamento no mesmo gauge, publicado uma única vez."""
+    async def requisitar():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.aplicacao), base_url="http://teste") as cliente:
+            assert (await cliente.get("/conversao")).status_code == 400  # atendida pelo asgi.py, sem o banco
+            return (await cliente.get("/metrics")).text
+
+    linhas = [linha for linha in asyncio.run(requisitar()).splitlines()
+              if linha.startswith("http_requisicoes_em_andamento")]
+    assert linhas == ["http_requisicoes_em_andamento 1"]
+
+
+def teste_contadores_dos_servicos_vem_dos_eventos(client):
+    """Contadores publicados com somar() não recomeçam do zero quando um worker é reciclado."""
+    from middleware.metricas import registro
+    from service.cambio import cache_cambio
+
+    antes = registro.snapshot()["valores"].get('["cambio_cache_total", [["resultado", "obsoleta"]]]', 0)
+    for observador in cache_cambio.observadores:
+        observador("obsoleta")
+    snapshot = registro.snapshot()
+    assert snapshot["valores"]['["cambio_cache_total", [["resultado", "obsoleta"]]]'] == antes + 1
+    assert not any("_total" in chave for chave in snapshot["instantaneos"])
+
+
+def teste_histograma_acumulado():
+    registro = Registro()
+    registro.declarar("latencia", "histogram", "Latência.", buckets=(0.1, 1.0))
+    for valor in (0.05, 0.5, 0.5, 3.0):
+        registro.observar("latencia", valor, rota="/x")
+
+    texto = exposicao(registro, registro.snapshot())
+    assert 'latencia_bucket{rota="/x",le="0.1"} 1' in texto
+    assert 'latencia_bucket{rota="/x",le="1"} 3' in texto
+    assert 'latencia_bucket{rota="/x",le="+Inf"} 4' in texto
+    assert 'latencia_count{rota="/x"} 4' in texto
+
+
+def teste_agregacao_entre_processos():
+    """Contadores de workers encerrados continuam somando; instantâneos só de processos vivos."""
+    registro = Registro()
+    registro.declarar("total", "counter", "Total.")
+    registro.declarar("conexoes", "gauge", "Conexões.")
+    registro.declarar("em_andamento", "gauge", "Em andamento.")
+    registro.somar("total", 2)
+    registro.coletor(lambda: [("conexoes", {}, 3)])
+    registro.ajustar("em_andamento", 1)  # requisição que o worker morto não chegou a terminar
+    proprio = registro.snapshot()
+    assert list(proprio["valores"]) == ['["total", []]']
+
+    morto = {"pid": 2 ** 22 + 1, "valores": dict(proprio["valores"]), "histogramas": {},
+             "instantaneos": dict(proprio["instantaneos"])}
+    assert morto["pid"] != os.getpid()
+
+    texto = exposicao(registro, agregar([proprio, morto]))
+    assert "total 4" in texto
+    assert "conexoes 3" in texto
+    assert "em_andamento 1" in texto
@@ -0,0 +1,59 @@
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import app
+from model.base import Base
+from middleware import profiler
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    Base.metadata.drop_all(test_engine)
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    monkeypatch.setattr(profiler, "PROFILER_DIR", str(tmp_path))
+    monkeypatch.setattr(profiler, "PROFILER_TOKEN", "segredo")
+    monkeypatch.setenv("ADMIN_TOKEN", "admin")
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def teste_perfila_apenas_com_token(client, tmp_path):
+    assert "X-Profile-Arquivo" not in client.get("/projetos").headers
+    assert "X-Profile-Arquivo" not in client.get("/projetos", headers={"X-Profile": "errado"}).headers
+
+    resposta = client.get("/projetos", headers={"X-Profile": "segredo", "X-Request-ID": "../abc"})
+    arquivo = resposta.headers["X-Profile-Arquivo"]
+    assert arquivo.endswith("_GET_projetos_abc.prof")
+    assert (tmp_path / arquivo).exists()
+
+
+def teste_amostragem(client, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILER_AMOSTRAGEM", 1.0)
+    assert "X-Profile-Arquivo" in client.get("/recursos").headers
+
+
+def teste_rotacao(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler, "PROFILER_MAX_ARQUIVOS", 2)
+    for _ in range(4):
+        client.get("/projetos", headers={"X-Profile": "segredo"})
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+
+
+def teste_listar_profiles(client):
+    client.get("/projetos", headers={"X-Profile": "segredo"})
+
+    assert client.get("/admin/profiles").status_code == 401
+    resposta = client.get("/admin/profiles?top=5", headers={"X-Admin-Token": "admin"})
+    assert resposta.status_code == 200
+    perfil = resposta.json["perfis"][0]
+    assert perfil["rota"] == "projetos"
+    assert 0 < len(perfil["funcoes"]) <= 5
+    assert {"funcao", "chamadas", "tempo_proprio_ms", "tempo_acumulado_ms"} <= set(perfil["funcoes"][0])
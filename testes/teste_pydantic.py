@@ -3,6 +3,7 @@ from flask.testing import FlaskClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+import app as app_module
 from app import app
 from model.base import Base
 from model.projeto import Projeto
@@ -13,10 +14,10 @@ test_engine = create_engine("sqlite:///:memory:", echo=False)
 TestSession = sessionmaker(bind=test_engine)
 
 @pytest.fixture
-def client():
+def client(monkeypatch):
     Base.metadata.create_all(test_engine)
     app.config['TESTING'] = True
-    app.session = TestSession
+    monkeypatch.setattr(app_module, "Session", TestSession)
     with app.test_client() as client:
         yield client
 
@@ -0,0 +1,132 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import app as app_module
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import logger as logger_module
+import model
+from app import app, create_app
+from middleware import metricas
+from service.cliente_cambio import cliente_cambio
+
+# Banco de dados temporário (isolado da aplicação real)
+test_engine = create_engine("sqlite:///:memory:", echo=False)
+TestSession = sessionmaker(bind=test_engine)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "Session", TestSession)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def teste_healthz_ok(client):
+    resposta = client.get("/healthz")
+    assert resposta.status_code == 200
+    assert resposta.get_json()["status"] == "ok"
+
+
+def teste_healthz_banco_indisponivel(client, monkeypatch):
+    quebrado = sessionmaker(bind=create_engine("sqlite:////diretorio/inexistente/db.sqlite3"))
+    monkeypatch.setattr(app_module, "Session", quebrado)
+    resposta = client.get("/healthz")
+    assert resposta.status_code == 503
+    assert resposta.get_json()["status"] == "indisponivel"
+
+
+def teste_logs_continuam_apos_reinicio(monkeypatch):
+    # Simula o post_fork: filas novas e threads reiniciadas, sem perder registros
+    threads_antes = [listener._thread for _, listener in logger_module._listeners]
+    logger_module.reiniciar_logs_apos_fork()
+    for (_, listener), anterior in zip(logger_module._listeners, threads_antes):
+        assert listener._thread is not anterior and listener._thread.is_alive()
+
+    capturados = []
+    captura = logging.Handler(logging.WARNING)
+    captura.emit = capturados.append
+    _, listener_raiz = logger_module._listeners[0]  # o primeiro é o do logger raiz
+    monkeypatch.setattr(listener_raiz, "handlers", listener_raiz.handlers + (captura,))
+
+    logging.getLogger("teste_servidor").warning("depois do fork")
+    limite = time.monotonic() + 5
+    while not capturados and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert [r.getMessage() for r in capturados] == ["depois do fork"]
+
+
+def teste_workers_rotacionam_os_proprios_arquivos_de_log(tmp_path):
+    # Como no gunicorn com preload: logs configurados no mestre, 4 workers criados por fork
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = """
+import logging, os, logger
+logger.configurar_logs()
+logging.getLogger("mestre").info("mestre pronto")
+filhos = []
+for vaga in range(1, 5):
+    pid = os.fork()
+    if pid == 0:
+        logger.separar_arquivos_por_processo(f"w{vaga}")
+        logger.reiniciar_logs_apos_fork()
+        for i in range(200):
+            logging.getLogger("worker").info("linha %03d do worker %d", i, vaga)
+        logger.encerrar_logs()
+        os._exit(0)
+    filhos.append(pid)
+for pid in filhos:
+    os.waitpid(pid, 0)
+"""
+    env = {**os.environ, "PYTHONPATH": raiz, "LOG_DIR": str(tmp_path), "LOG_MAX_BYTES": "8000", "LOG_BACKUPS": "20"}
+    subprocess.run([sys.executable, "-c", codigo], cwd=tmp_path, check=True, env=env, capture_output=True)
+
+    for vaga in range(1, 5):
+        arquivos = list(tmp_path.glob(f"gunicorn.detailed.w{vaga}.log*"))
+        linhas = [l for a in arquivos for l in a.read_text().splitlines() if f"do worker {vaga}" in l]
+        assert len(linhas) == 200  # nenhuma linha perdida em rotações cruzadas
+        assert all(a.stat().st_size <= 8000 for a in arquivos)
+    assert "mestre pronto" in (tmp_path / "gunicorn.detailed.log").read_text()
+
+
+@pytest.fixture
+def banco_padrao():
+    yield
+    # create_app com outro DATABASE_URL religa a fábrica de sessões do processo
+    model.configurar_banco()
+
+
+def teste_import_nao_cria_banco(tmp_path):
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Nem a instância do módulo, nem os logs (diretório e thread de escrita), nem o engine
+    codigo = ("import threading, model, logger, app; "
+              "assert 'app' not in vars(app) and model._engine is None and threading.active_count() == 1; "
+              "assert app.app is app.app")
+    subprocess.run([sys.executable, "-c", codigo], cwd=tmp_path, check=True,
+                   env={**os.environ, "PYTHONPATH": raiz}, capture_output=True)
+    assert not (tmp_path / "database").exists()
+
+
+def teste_create_app_e_init_db(tmp_path, banco_padrao):
+    arquivo = tmp_path / "novo" / "db.sqlite3"
+    nova = create_app({"TESTING": True, "DATABASE_URL": f"sqlite:///{arquivo}"})
+    assert not arquivo.exists()
+
+    resultado = nova.test_cli_runner().invoke(args=["init-db"])
+    assert resultado.exit_code == 0 and arquivo.exists()
+    # Tabelas criadas e vazias
+    assert nova.test_client().get("/recursos").get_json() == {"mensagem": "Nenhum recurso encontrado."}
+    # Observadores do processo não são duplicados por uma segunda aplicação
+    assert cliente_cambio.observadores.count(metricas._observar_api_cambio) == 1
+
+
+def teste_documento_openapi_em_cache(client):
+    primeira = client.get("/openapi/openapi.json")
+    assert primeira.status_code == 200
+    assert app.api_doc is app.api_doc
+    assert client.get("/openapi/openapi.json").data == primeira.data
@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import app
+from model import init_db
+from model.alteracao import Alteracao
+from service.sincronizacao import limpar_alteracoes
+
+
+@pytest.fixture
+def client(sessao):
+    with app.test_client() as client:
+        yield client
+
+
+def _criar_projeto(client, sigla):
+    resposta = client.post("/projeto", json={"nome": f"Projeto {sigla}", "sigla": sigla, "descricao": "d",
+                                             "tipo": "Interno", "custo": 1000.0, "status": "A iniciar"})
+    return resposta.get_json()["id"]
+
+
+def _desde(client, rota, since):
+    resposta = client.get(f"/{rota}?since={since}")
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+
+def teste_carga_inicial_e_alteracoes_por_cursor(client):
+    primeiro, segundo = _criar_projeto(client, "AAA"), _criar_projeto(client, "BBB")
+    carga = _desde(client, "projetos", 0)
+    assert [p["id"] for p in carga["projetos"]] == [primeiro, segundo] and carga["removidos"] == []
+
+    client.put("/projeto", json={"id": primeiro, "nome": "Projeto AAA", "sigla": "AAA", "descricao": "nova",
+                                 "tipo": "Interno", "custo": 2000.0, "status": "Em andamento"})
+    delta = _desde(client, "projetos", carga["cursor"])
+    assert [(p["id"], p["custo"]) for p in delta["projetos"]] == [(primeiro, 2000.0)]
+
+    client.delete(f"/projeto?id={segundo}")
+    delta = _desde(client, "projetos", delta["cursor"])
+    assert delta["projetos"] == [] and delta["removidos"] == [segundo]
+
+    # O histórico faz parte do projeto na listagem: o projeto volta como alterado
+    client.post(f"/historico?id={primeiro}", json={"descricao": "Kickoff"})
+    delta = _desde(client, "projetos", delta["cursor"])
+    assert [p["historico"] for p in delta["projetos"]] == [[{"descricao": "Kickoff"}]]
+
+    assert _desde(client, "projetos", delta["cursor"]) == {"projetos": [], "removidos": [], "cursor": delta["cursor"]}
+
+
+def teste_vinculo_altera_projeto_e_recurso(client, sessao):
+    projeto = _criar_projeto(client, "VIN")
+    recurso = client.post("/recurso", json={"nome": "Ana", "papel": "Dev", "alocacao": "100%"}).get_json()["id"]
+    cursor = _desde(client, "recursos", 0)["cursor"]
+
+    client.post(f"/projeto/recurso?id_projeto={projeto}&id_recurso={recurso}")
+    assert [r["id"] for r in _desde(client, "recursos", cursor)["recursos"]] == [recurso]
+    assert [p["id"] for p in _desde(client, "projetos", cursor)["projetos"]] == [projeto]
+
+    client.delete(f"/projeto/recurso?id_projeto={projeto}&id_recurso={recurso}")
+    s = sessao()
+    vinculos = s.query(Alteracao).filter_by(tabela="projeto_recurso").order_by(Alteracao.id).all()
+    assert [(v.registro_id, v.operacao, json.loads(v.dados)) for v in vinculos] == [
+        (projeto, "criado", {"recurso_id": recurso}), (projeto, "removido", {"recurso_id": recurso})]
+    s.close()
+
+    client.delete(f"/recurso?id={recurso}")
+    delta = _desde(client, "recursos", cursor)
+    assert delta["recursos"] == [] and delta["removidos"] == [recurso]
+
+
+def teste_since_por_data(client):
+    antes = datetime.now() - timedelta(seconds=1)
+    projeto = _criar_projeto(client, "DAT")
+    assert [p["id"] for p in _desde(client, "projetos", antes.isoformat())["projetos"]] == [projeto]
+    depois = (datetime.now() + timedelta(seconds=1)).isoformat()
+    assert _desde(client, "projetos", depois)["projetos"] == []
+
+
+def teste_formato_do_since_no_openapi(client):
+    esquemas = client.get("/openapi/openapi.json").get_json()["components"]["schemas"]
+    for nome, listagem, alterados in (("ProjetosOuAlteradosSchema", "ListagemProjetoSchema", "ProjetosAlteradosSchema"),
+                                      ("RecursosOuAlteradosSchema", "ListagemRecursoSchema", "RecursosAlteradosSchema")):
+        assert [opcao["$ref"].rsplit("/", 1)[1] for opcao in esquemas[nome]["anyOf"]] == [listagem, alterados]
+        assert {"removidos", "cursor"} <= set(esquemas[alterados]["properties"])
+
+
+def teste_cursor_descartado_e_invalido(client, sessao):
+    for sigla in ("VEL", "NOV"):
+        _criar_projeto(client, sigla)
+    s = sessao()
+    s.query(Alteracao).filter(Alteracao.id == 1).update({"momento": datetime.now() - timedelta(days=60)})
+    s.commit()
+    assert limpar_alteracoes(s, 30) == 1
+    s.close()
+
+    assert client.get("/projetos?since=0").status_code == 200
+    assert client.get("/projetos?since=1").status_code == 200
+    expirado = client.get("/recursos?since=2020-01-01T00:00:00")
+    assert expirado.status_code == 410 and "since=0" in expirado.get_json()["mensagem"]
+    assert client.get("/projetos?since=-1").status_code == 422
+
+
+def teste_init_db_adiciona_colunas_em_banco_antigo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.sqlite3'}")
+    with engine.begin() as conexao:
+        conexao.execute(text("CREATE TABLE recurso (id INTEGER PRIMARY KEY, nome VARCHAR(100) NOT NULL, "
+                             "papel VARCHAR(50) NOT NULL, alocacao VARCHAR(50))"))
+        conexao.execute(text("INSERT INTO recurso (nome, papel) VALUES ('Ana', 'Dev')"))
+
+    init_db(engine)
+    init_db(engine)  # idempotente
+    assert "ix_recurso_data_atualizacao" in {i["name"] for i in inspect(engine).get_indexes("recurso")}
+    with engine.begin() as conexao:
+        assert conexao.execute(text("SELECT data_atualizacao FROM recurso")).scalar() is not None
+        # Colunas com default no banco valem também para inserções por SQL direto
+        conexao.execute(text("INSERT INTO recurso (nome, papel) VALUES ('Bia', 'QA')"))
+        assert conexao.execute(text("SELECT versao FROM recurso")).scalars().all() == [1, 1]
+    engine.dispose()